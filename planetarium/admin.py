@@ -6,6 +6,8 @@ from planetarium.models import (
     AstronomyShow,
     ShowSession,
     Reservation,
+    SeatHold,
+    SlowQuery,
     Ticket
 )
 
@@ -15,3 +17,12 @@ admin.site.register(AstronomyShow)
 admin.site.register(ShowSession)
 admin.site.register(Reservation)
 admin.site.register(Ticket)
+admin.site.register(SeatHold)
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ("view", "count", "worst_ms", "mean_ms", "last_seen")
+    list_filter = ("view",)
+    search_fields = ("sql",)
+    readonly_fields = [field.name for field in SlowQuery._meta.fields]
@@ -0,0 +1,432 @@
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, FloatField, Sum
+from django.db.models.functions import Cast, Greatest, NullIf, TruncDate
+from django.utils import timezone
+
+from planetarium.models import (
+    AstronomyShow,
+    DomeDailySales,
+    PlanetariumDome,
+    ShowDailySales,
+    ShowSellThrough,
+    ShowSession,
+    ThemeDailySales,
+    Ticket,
+)
+
+DEFAULT_ANALYTICS = {
+    # keep the rollups up to date on every write; rebuild_analytics
+    # catches up after bulk loads run with this off
+    "ENABLED": True,
+    # rows written per INSERT when rollups are recomputed
+    "BATCH_SIZE": 2000,
+    "TOP_SHOWS": 10,
+}
+# group_by -> (rollup, key field, label of the key's model)
+ROLLUPS = {
+    "show": (ShowDailySales, "astronomy_show", "title"),
+    "dome": (DomeDailySales, "planetarium_dome", "name"),
+    "theme": (ThemeDailySales, "show_theme", "name"),
+}
+
+
+def _config():
+    return {
+        **DEFAULT_ANALYTICS,
+        **getattr(settings, "PLANETARIUM_ANALYTICS", {}),
+    }
+
+
+def analytics_enabled() -> bool:
+    return _config()["ENABLED"]
+
+
+def _day(value):
+    if settings.USE_TZ and timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.date()
+
+
+def _day_start(day):
+    start = datetime.combine(day, time.min)
+    if settings.USE_TZ:
+        start = timezone.make_aware(start)
+    return start
+
+
+def _show_themes(show_ids):
+    through = AstronomyShow.show_theme.through
+    themes = defaultdict(list)
+    for show_id, theme_id in through.objects.filter(
+            astronomyshow_id__in=show_ids
+    ).values_list("astronomyshow_id", "showtheme_id"):
+        themes[show_id].append(theme_id)
+    return themes
+
+
+def _add(model, keys, deltas):
+    values = {
+        field: F(field) + delta if delta > 0
+        else Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+        if delta
+    }
+    if not values:
+        return
+    rows = model.objects.filter(**keys)
+    if rows.update(**values) or all(delta <= 0 for delta in deltas.values()):
+        return
+    # first write of the key: writers racing to create it meet on the
+    # unique constraint and both land in the update
+    model.objects.bulk_create([model(**keys)], ignore_conflicts=True)
+    rows.update(**values)
+
+
+def _record(entries):
+    """Add (show id, dome id, day, deltas) to the daily rollups.
+
+    Each touched rollup row costs one UPDATE, plus one query for the
+    shows' themes.
+    """
+    show_days = defaultdict(Counter)
+    dome_days = defaultdict(Counter)
+    for show_id, dome_id, day, deltas in entries:
+        show_days[show_id, day].update(deltas)
+        dome_days[dome_id, day].update(deltas)
+    if not show_days:
+        return
+    themes = _show_themes({show_id for show_id, _ in show_days})
+    theme_days = defaultdict(Counter)
+    for (show_id, day), deltas in show_days.items():
+        for theme_id in themes[show_id]:
+            theme_days[theme_id, day].update(deltas)
+    for model, field, totals in (
+            (ShowDailySales, "astronomy_show_id", show_days),
+            (DomeDailySales, "planetarium_dome_id", dome_days),
+            (ThemeDailySales, "show_theme_id", theme_days),
+    ):
+        for (key, day), deltas in totals.items():
+            _add(model, {field: key, "day": day}, deltas)
+
+
+def record_ticket_sales(sales, sign=1):
+    """Add (or with ``sign`` -1 remove) sold tickets to the rollups.
+
+    ``sales`` are (astronomy show id, planetarium dome id, show time,
+    reserved at, tickets) tuples.
+    """
+    if not analytics_enabled():
+        return
+    entries = []
+    lead_days = Counter()
+    for show_id, dome_id, show_time, reserved_at, tickets in sales:
+        day = _day(show_time)
+        entries.append(
+            (show_id, dome_id, day, {"tickets_sold": sign * tickets})
+        )
+        lead_days[show_id, max((day - _day(reserved_at)).days, 0)] += tickets
+    _record(entries)
+    for (show_id, days_before), tickets in lead_days.items():
+        _add(
+            ShowSellThrough,
+            {"astronomy_show_id": show_id, "days_before": days_before},
+            {"tickets_sold": sign * tickets},
+        )
+
+
+def _session_entries(sessions, sign):
+    for show_id, dome_id, show_time, seats, tickets_sold in sessions:
+        yield show_id, dome_id, _day(show_time), {
+            "sessions": sign,
+            "seats": sign * seats,
+            "tickets_sold": sign * tickets_sold,
+        }
+
+
+def record_sessions(added=(), removed=()):
+    """Add and remove show sessions in the rollups.
+
+    Sessions are (astronomy show id, planetarium dome id, show time,
+    seats, tickets sold) tuples; a moved session is removed with its
+    old values and added with the new ones.
+    """
+    if not analytics_enabled():
+        return
+    _record([
+        *_session_entries(removed, -1),
+        *_session_entries(added, 1),
+    ])
+
+
+def ticket_sales(tickets):
+    """``record_ticket_sales`` tuples of saved tickets, one per ticket."""
+    return [
+        (
+            ticket.show_session.astronomy_show_id,
+            ticket.show_session.planetarium_dome_id,
+            ticket.show_session.show_time,
+            ticket.reservation.created_at,
+            1,
+        )
+        for ticket in tickets
+    ]
+
+
+def reservation_sales(reservation_ids):
+    """``record_ticket_sales`` tuples of the reservations' tickets."""
+    return list(
+        Ticket.objects.filter(
+            reservation_id__in=reservation_ids
+        ).values_list(
+            "show_session__astronomy_show_id",
+            "show_session__planetarium_dome_id",
+            "show_session__show_time",
+            "reservation__created_at",
+        ).annotate(tickets=Count("id")).order_by()
+    )
+
+
+def _insert(model, rows):
+    batch_size = _config()["BATCH_SIZE"]
+    model.objects.bulk_create(
+        (model(**row) for row in rows), batch_size=batch_size
+    )
+
+
+def _refresh_daily(model, field, ids, days):
+    rows = model.objects.all()
+    sessions = ShowSession.objects.all()
+    if ids is not None:
+        rows = rows.filter(**{f"{field}_id__in": ids})
+        sessions = sessions.filter(**{f"{field}_id__in": ids})
+    if days is not None:
+        rows = rows.filter(day__range=days)
+        sessions = sessions.filter(
+            show_time__gte=_day_start(days[0]),
+            show_time__lt=_day_start(days[1] + timedelta(days=1)),
+        )
+    # rollups have no dependants or delete signals, so this is a
+    # single DELETE
+    rows.delete()
+    _insert(
+        model,
+        sessions.annotate(day=TruncDate("show_time")).values(
+            f"{field}_id", "day"
+        ).annotate(
+            sessions=Count("id"),
+            seats=Sum(PlanetariumDome.capacity_expression(
+                "planetarium_dome__"
+            )),
+            tickets_sold=Sum("tickets_sold"),
+        ).order_by(),
+    )
+
+
+def _refresh_themes(theme_ids, days):
+    rows = ThemeDailySales.objects.all()
+    shows = ShowDailySales.objects.annotate(
+        show_theme_id=F("astronomy_show__show_theme")
+    ).filter(show_theme_id__isnull=False)
+    if theme_ids is not None:
+        rows = rows.filter(show_theme_id__in=theme_ids)
+        shows = shows.filter(show_theme_id__in=theme_ids)
+    if days is not None:
+        rows = rows.filter(day__range=days)
+        shows = shows.filter(day__range=days)
+    rows.delete()
+    _insert(
+        ThemeDailySales,
+        shows.values("show_theme_id", "day").annotate(
+            sessions=Sum("sessions"),
+            seats=Sum("seats"),
+            tickets_sold=Sum("tickets_sold"),
+        ).order_by(),
+    )
+
+
+def refresh_rollups(show_ids=(), dome_ids=(), days=None):
+    """Recompute the daily rows of some shows and domes from sessions.
+
+    ``days`` is an inclusive (first, last) range, None for every day.
+    Theme rows of the shows' themes are recomputed after them. Used
+    for bulk schedule changes and resized domes, where recounting a
+    range beats a write per session.
+    """
+    if not analytics_enabled():
+        return
+    show_ids = set(show_ids)
+    dome_ids = set(dome_ids)
+    if show_ids:
+        _refresh_daily(ShowDailySales, "astronomy_show", show_ids, days)
+        theme_ids = {
+            theme_id
+            for theme_ids in _show_themes(show_ids).values()
+            for theme_id in theme_ids
+        }
+        if theme_ids:
+            _refresh_themes(theme_ids, days)
+    if dome_ids:
+        _refresh_daily(DomeDailySales, "planetarium_dome", dome_ids, days)
+
+
+def refresh_session_rollups(sessions):
+    """``refresh_rollups`` over the shows, domes and days of sessions."""
+    sessions = list(sessions)
+    if not sessions:
+        return
+    days = [_day(session.show_time) for session in sessions]
+    refresh_rollups(
+        {session.astronomy_show_id for session in sessions},
+        {session.planetarium_dome_id for session in sessions},
+        (min(days), max(days)),
+    )
+
+
+def refresh_theme_rollups(theme_ids):
+    """Recompute theme rows from the show rows of the themes' shows."""
+    if analytics_enabled() and theme_ids:
+        _refresh_themes(set(theme_ids), None)
+
+
+def _refresh_sell_through(show_ids):
+    rows = ShowSellThrough.objects.all()
+    tickets = Ticket.objects.all()
+    if show_ids is not None:
+        rows = rows.filter(astronomy_show_id__in=show_ids)
+        tickets = tickets.filter(
+            show_session__astronomy_show_id__in=show_ids
+        )
+    lead_days = Counter()
+    # grouped by calendar days in the database, so rows are shows times
+    # distinct (show day, sale day) pairs rather than tickets
+    for show_id, show_day, sale_day, count in tickets.values_list(
+            "show_session__astronomy_show_id",
+            TruncDate("show_session__show_time"),
+            TruncDate("reservation__created_at"),
+    ).annotate(tickets=Count("id")).order_by().iterator():
+        lead_days[show_id, max((show_day - sale_day).days, 0)] += count
+    rows.delete()
+    _insert(
+        ShowSellThrough,
+        (
+            {
+                "astronomy_show_id": show_id,
+                "days_before": days_before,
+                "tickets_sold": count,
+            }
+            for (show_id, days_before), count in lead_days.items()
+        ),
+    )
+
+
+def refresh_sell_through(show_ids):
+    """Recompute the sell-through rows of some shows from their tickets."""
+    if analytics_enabled() and show_ids:
+        _refresh_sell_through(set(show_ids))
+
+
+def rebuild_rollups():
+    """Recompute every rollup from sessions and tickets."""
+    _refresh_daily(ShowDailySales, "astronomy_show", None, None)
+    _refresh_daily(DomeDailySales, "planetarium_dome", None, None)
+    _refresh_themes(None, None)
+    _refresh_sell_through(None)
+
+
+def _filter_days(queryset, date_from=None, date_to=None):
+    # rows left empty by moved or deleted sessions
+    queryset = queryset.exclude(sessions=0)
+    if date_from is not None:
+        queryset = queryset.filter(day__gte=date_from)
+    if date_to is not None:
+        queryset = queryset.filter(day__lte=date_to)
+    return queryset
+
+
+def _with_fill_rate(row):
+    row["fill_rate"] = (
+        round(row["tickets_sold"] / row["seats"], 4) if row["seats"] else 0.0
+    )
+    return row
+
+
+def fill_rates(group_by, date_from=None, date_to=None, by_day=False):
+    """Seats offered and sold per show, dome or theme, optionally daily."""
+    model, field, label = ROLLUPS[group_by]
+    names = [f"{field}_id", f"{field}__{label}"]
+    if by_day:
+        names.append("day")
+    rows = _filter_days(model.objects.all(), date_from, date_to).values(
+        *names
+    ).annotate(
+        total_sessions=Sum("sessions"),
+        total_seats=Sum("seats"),
+        total_tickets_sold=Sum("tickets_sold"),
+    ).order_by(*names[1:], names[0])
+    return [
+        _with_fill_rate({
+            "id": row[names[0]],
+            "name": row[names[1]],
+            **({"day": row["day"]} if by_day else {}),
+            "sessions": row["total_sessions"],
+            "seats": row["total_seats"],
+            "tickets_sold": row["total_tickets_sold"],
+        })
+        for row in rows
+    ]
+
+
+def top_shows(date_from=None, date_to=None, order="tickets_sold", limit=None):
+    """Best selling shows by tickets sold or by fill rate."""
+    rows = _filter_days(
+        ShowDailySales.objects.all(), date_from, date_to
+    ).values("astronomy_show_id", "astronomy_show__title").annotate(
+        total_sessions=Sum("sessions"),
+        total_seats=Sum("seats"),
+        total_tickets_sold=Sum("tickets_sold"),
+        total_fill_rate=Cast(Sum("tickets_sold"), FloatField())
+        / NullIf(Sum("seats"), 0),
+    )
+    return [
+        _with_fill_rate({
+            "id": row["astronomy_show_id"],
+            "name": row["astronomy_show__title"],
+            "sessions": row["total_sessions"],
+            "seats": row["total_seats"],
+            "tickets_sold": row["total_tickets_sold"],
+        })
+        for row in rows.order_by(
+            F(f"total_{order}").desc(nulls_last=True),
+            "astronomy_show__title",
+        )[:limit or _config()["TOP_SHOWS"]]
+    ]
+
+
+def sell_through(show_ids=None):
+    """Tickets sold by days before the show day, with running totals.
+
+    ``sell_through`` is the share of the shows' seats sold that many
+    days ahead or earlier.
+    """
+    curve = ShowSellThrough.objects.exclude(tickets_sold=0)
+    seats = ShowDailySales.objects.all()
+    if show_ids is not None:
+        curve = curve.filter(astronomy_show_id__in=show_ids)
+        seats = seats.filter(astronomy_show_id__in=show_ids)
+    seats = seats.aggregate(total=Sum("seats"))["total"] or 0
+    rows = []
+    sold = 0
+    for days_before, tickets_sold in curve.values("days_before").annotate(
+            total=Sum("tickets_sold")
+    ).values_list("days_before", "total").order_by("-days_before"):
+        sold += tickets_sold
+        rows.append({
+            "days_before": days_before,
+            "tickets_sold": tickets_sold,
+            "cumulative_tickets_sold": sold,
+            "sell_through": round(sold / seats, 4) if seats else 0.0,
+        })
+    return {"seats": seats, "tickets_sold": sold, "curve": rows}
@@ -0,0 +1,233 @@
+import random
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.validators import UniqueTogetherValidator
+
+from planetarium.analytics import record_ticket_sales
+from planetarium.cache import bump_model_version
+from planetarium.models import Reservation, SeatHold, ShowSession, Ticket
+from planetarium.seat_map import SeatMap
+
+DEFAULT_BOOKING_ATTEMPTS = 5
+DEFAULT_BOOKING_BACKOFF = 0.02
+
+TAKEN_MESSAGE = UniqueTogetherValidator.message.format(
+    field_names="show_session, row, seat"
+)
+HELD_MESSAGE = "This seat is held by another customer."
+
+
+class SoldOut(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The show session is sold out."
+    default_code = "sold_out"
+
+
+class BookingConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The show session is busy, please try again."
+    default_code = "booking_conflict"
+
+
+def booking_attempts() -> int:
+    return getattr(
+        settings, "PLANETARIUM_BOOKING_ATTEMPTS", DEFAULT_BOOKING_ATTEMPTS
+    )
+
+
+def booking_backoff() -> float:
+    return getattr(
+        settings, "PLANETARIUM_BOOKING_BACKOFF", DEFAULT_BOOKING_BACKOFF
+    )
+
+
+def check_capacity(show_session, requested, held=0):
+    available = (
+        show_session.planetarium_dome.capacity
+        - show_session.tickets_sold
+        - held
+    )
+    if available <= 0:
+        raise SoldOut()
+    if requested > available:
+        raise SoldOut(
+            f"Only {available} seats are left for this show session."
+        )
+
+
+def lock_show_sessions(show_session_ids):
+    # a fixed lock order keeps bookings spanning several sessions from
+    # deadlocking each other
+    return {
+        show_session.id: show_session
+        for show_session in ShowSession.objects.select_for_update(
+            of=("self",)
+        ).select_related("planetarium_dome").filter(
+            pk__in=show_session_ids
+        ).order_by("pk")
+    }
+
+
+def taken_places(tickets_data):
+    if not tickets_data:
+        return set()
+    return set(
+        Ticket.objects.filter(
+            show_session__in={
+                ticket_data["show_session"] for ticket_data in tickets_data
+            },
+            row__in={ticket_data["row"] for ticket_data in tickets_data},
+            seat__in={ticket_data["seat"] for ticket_data in tickets_data},
+        ).values_list("show_session_id", "row", "seat").order_by()
+    )
+
+
+def active_holds(show_sessions):
+    """(seat hold id, user id, show session id, seat map) of live holds."""
+    if not show_sessions:
+        return []
+    holds = []
+    for seat_hold_id, user_id, show_session_id, seats in SeatHold.active(
+    ).filter(show_session_id__in=show_sessions).values_list(
+        "id", "user_id", "show_session_id", "seats"
+    ):
+        planetarium_dome = show_sessions[show_session_id].planetarium_dome
+        holds.append((
+            seat_hold_id,
+            user_id,
+            show_session_id,
+            SeatMap(
+                planetarium_dome.rows, planetarium_dome.seats_in_row, seats
+            ),
+        ))
+    return holds
+
+
+def _own_hold(user_id, user):
+    return user is not None and user.is_authenticated and user_id == user.pk
+
+
+def held_places(holds, exclude_user=None):
+    return {
+        (show_session_id, row, seat)
+        for _, user_id, show_session_id, seat_map in holds
+        if not _own_hold(user_id, exclude_user)
+        for row, seat in seat_map.places()
+    }
+
+
+def release_booked_holds(holds, user, booked):
+    """Drop the booked places from the user's own holds.
+
+    Seats booked straight through a reservation would otherwise count as
+    both sold and held until the hold expires.
+    """
+    for seat_hold_id, user_id, show_session_id, seat_map in holds:
+        if not _own_hold(user_id, user):
+            continue
+        places = list(seat_map.places())
+        kept = [
+            (row, seat) for row, seat in places
+            if (show_session_id, row, seat) not in booked
+        ]
+        if len(kept) == len(places):
+            continue
+        if not kept:
+            SeatHold.objects.filter(pk=seat_hold_id).delete()
+            continue
+        remaining = SeatMap(seat_map.rows, seat_map.seats_in_row)
+        remaining.mark_many(kept)
+        SeatHold.objects.filter(pk=seat_hold_id).update(
+            seats=bytes(remaining.bits), seat_count=remaining.taken
+        )
+        bump_model_version(SeatHold)
+
+
+def book_tickets(tickets_data, **reservation_data) -> Reservation:
+    """Reserve ``tickets_data`` without overselling any show session.
+
+    The show sessions are row-locked for the whole booking, so concurrent
+    bookings of one session run one after another; lock failures
+    (deadlocks, lock timeouts, a busy SQLite file) are retried with
+    jittered exponential backoff and end in a 409 once exhausted.
+    """
+    attempts = booking_attempts()
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                return _book_tickets(tickets_data, reservation_data)
+        except OperationalError:
+            if attempt == attempts - 1:
+                raise BookingConflict()
+            time.sleep(booking_backoff() * 2 ** attempt * random.uniform(1, 2))
+
+
+def _book_tickets(tickets_data, reservation_data):
+    show_session_ids = [
+        ticket_data["show_session"].id for ticket_data in tickets_data
+    ]
+    show_sessions = lock_show_sessions(set(show_session_ids))
+    holds = active_holds(show_sessions)
+    held = held_places(holds, reservation_data.get("user"))
+    held_counts = Counter(show_session_id for show_session_id, _, _ in held)
+    for show_session_id, requested in Counter(show_session_ids).items():
+        check_capacity(
+            show_sessions[show_session_id],
+            requested,
+            held_counts[show_session_id]
+        )
+
+    taken = taken_places(tickets_data)
+    errors = []
+    for ticket_data in tickets_data:
+        place = (
+            ticket_data["show_session"].id,
+            ticket_data["row"],
+            ticket_data["seat"],
+        )
+        if place in taken:
+            errors.append({"non_field_errors": [TAKEN_MESSAGE]})
+        elif place in held:
+            errors.append({"non_field_errors": [HELD_MESSAGE]})
+        else:
+            errors.append({})
+    if any(errors):
+        raise ValidationError({"tickets": errors})
+
+    reservation = Reservation.objects.create(**reservation_data)
+    try:
+        Ticket.objects.bulk_create(
+            Ticket(reservation=reservation, **ticket_data)
+            for ticket_data in tickets_data
+        )
+    except IntegrityError:
+        raise ValidationError({"tickets": [TAKEN_MESSAGE]})
+    ShowSession.add_tickets_sold(show_session_ids)
+    release_booked_holds(
+        holds,
+        reservation_data.get("user"),
+        {
+            (ticket_data["show_session"].id, ticket_data["row"],
+             ticket_data["seat"])
+            for ticket_data in tickets_data
+        },
+    )
+    record_ticket_sales(
+        (
+            show_sessions[show_session_id].astronomy_show_id,
+            show_sessions[show_session_id].planetarium_dome_id,
+            show_sessions[show_session_id].show_time,
+            reservation.created_at,
+            tickets,
+        )
+        for show_session_id, tickets in Counter(show_session_ids).items()
+    )
+    bump_model_version(Ticket)
+    for show_session_id in show_sessions:
+        bump_model_version(ShowSession, show_session_id)
+    return reservation
@@ -0,0 +1,348 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.checks import Error, Tags, register
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework.response import Response
+
+VERSION_KEY_PREFIX = "planetarium:version:"
+MODIFIED_KEY_PREFIX = "planetarium:modified:"
+EXPIRY_KEY_PREFIX = "planetarium:expiry:"
+RESPONSE_KEY_PREFIX = "planetarium:response:"
+
+# cache backends whose entries only the writing process can see
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+DEFAULT_RESPONSE_CACHE = {
+    "BACKEND": "planetarium.cache.LocMemResponseCache",
+    "VERSION_CACHE": "default",
+    "OPTIONS": {},
+}
+
+
+def _config():
+    return {
+        **DEFAULT_RESPONSE_CACHE,
+        **getattr(settings, "PLANETARIUM_RESPONSE_CACHE", {}),
+    }
+
+
+def _version_cache():
+    return caches[_config()["VERSION_CACHE"]]
+
+
+@register(Tags.caches)
+def check_version_cache(app_configs, **kwargs):
+    """Versions must be shared, or other workers never see a write."""
+    alias = _config()["VERSION_CACHE"]
+    backend = settings.CACHES.get(alias, {}).get("BACKEND")
+    workers = getattr(settings, "PLANETARIUM_WORKER_PROCESSES", 1)
+    if backend in PROCESS_LOCAL_CACHES and workers > 1:
+        return [
+            Error(
+                f"The {alias!r} cache holding the response cache versions "
+                f"is process-local, so {workers} worker processes would "
+                f"serve stale responses after each other's writes.",
+                hint="Use a shared cache backend, e.g. set REDIS_URL.",
+                id="planetarium.E001",
+            )
+        ]
+    return []
+
+
+def _version_name(target):
+    if isinstance(target, tuple):
+        model, pk = target
+        return f"{model._meta.label_lower}:{pk}"
+    return target._meta.label_lower
+
+
+def _seed(cache, name):
+    cache.add(VERSION_KEY_PREFIX + name, time.time_ns(), timeout=None)
+    cache.add(MODIFIED_KEY_PREFIX + name, time.time(), timeout=None)
+
+
+def model_versions(*targets):
+    """Return the current version of every target, in the given order.
+
+    A target is a model, or a ``(model, pk)`` pair for a single object.
+    Versions are seeded from the clock so a restarted process or a wiped
+    version cache never reuses a version that may still be cached.
+    """
+    cache = _version_cache()
+    keys = [VERSION_KEY_PREFIX + _version_name(target) for target in targets]
+    versions = cache.get_many(keys)
+    for key, target in zip(keys, targets):
+        if key not in versions:
+            _seed(cache, _version_name(target))
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def models_last_modified(*targets) -> float:
+    cache = _version_cache()
+    names = [_version_name(target) for target in targets]
+    modified = cache.get_many([MODIFIED_KEY_PREFIX + name for name in names])
+    for name in names:
+        if MODIFIED_KEY_PREFIX + name not in modified:
+            _seed(cache, name)
+            modified[MODIFIED_KEY_PREFIX + name] = cache.get(
+                MODIFIED_KEY_PREFIX + name
+            )
+    return max(modified.values())
+
+
+def bump_model_version(model, pk=None):
+    cache = _version_cache()
+    name = _version_name(model if pk is None else (model, pk))
+    cache.set(MODIFIED_KEY_PREFIX + name, time.time(), timeout=None)
+    try:
+        return cache.incr(VERSION_KEY_PREFIX + name)
+    except ValueError:
+        _seed(cache, name)
+        return cache.get(VERSION_KEY_PREFIX + name)
+
+
+def extend_expiry_watermark(name, timestamp):
+    """Remember the latest moment something named ``name`` expires."""
+    cache = _version_cache()
+    key = EXPIRY_KEY_PREFIX + name
+    if timestamp > (cache.get(key) or 0):
+        cache.set(key, timestamp, timeout=None)
+
+
+def expiry_watermark(name):
+    return _version_cache().get(EXPIRY_KEY_PREFIX + name)
+
+
+class ResponseCache:
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def get(self, key):
+        value = self._get(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self._set(key, value)
+
+    @property
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, value):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LocMemResponseCache(ResponseCache):
+    def __init__(self, max_entries=1000):
+        super().__init__(max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileResponseCache(ResponseCache):
+    """Pickled entries in one directory; file mtime is the LRU clock."""
+
+    def __init__(self, location=None, max_entries=1000):
+        super().__init__(max_entries)
+        self.location = location or os.path.join(
+            tempfile.gettempdir(), "planetarium-response-cache"
+        )
+        os.makedirs(self.location, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(
+            self.location,
+            hashlib.sha1(key.encode()).hexdigest() + ".cache"
+        )
+
+    def _get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as cache_file:
+                value = pickle.load(cache_file)
+            os.utime(path)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return value
+
+    def _set(self, key, value):
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.location)
+        with os.fdopen(fd, "wb") as cache_file:
+            pickle.dump(value, cache_file, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._evict(keep=path)
+
+    def _entries(self):
+        with os.scandir(self.location) as entries:
+            return [
+                entry for entry in entries if entry.name.endswith(".cache")
+            ]
+
+    def _evict(self, keep):
+        entries = [entry for entry in self._entries() if entry.path != keep]
+        overflow = len(entries) + 1 - self.max_entries
+        if overflow <= 0:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime_ns)
+        for entry in entries[:overflow]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        for entry in self._entries():
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+class DjangoResponseCache(ResponseCache):
+    """Delegates storage and eviction to a configured Django cache."""
+
+    def __init__(self, alias="default", timeout=None):
+        super().__init__(max_entries=None)
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def _cache(self):
+        return caches[self.alias]
+
+    def _get(self, key):
+        return self._cache.get(key)
+
+    def _set(self, key, value):
+        self._cache.set(key, value, timeout=self.timeout)
+
+    def clear(self):
+        self._cache.clear()
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                config = _config()
+                _response_cache = import_string(config["BACKEND"])(
+                    **config["OPTIONS"]
+                )
+    return _response_cache
+
+
+@receiver(setting_changed)
+def reset_response_cache(setting, **kwargs):
+    global _response_cache
+    if setting == "PLANETARIUM_RESPONSE_CACHE":
+        _response_cache = None
+
+
+class CachedResponseMixin:
+    """Serve responses from the response cache.
+
+    Keys cover the absolute path, action, lookup kwargs, query params and
+    the versions of ``cache_models``, so any write to those models makes
+    previously cached responses unreachable.
+    """
+
+    cache_models = ()
+
+    def get_response_cache_key(self, request, **kwargs):
+        params = urlencode(sorted(request.query_params.lists()), doseq=True)
+        versions = ",".join(map(str, model_versions(*self.cache_models)))
+        raw_key = "|".join((
+            request.build_absolute_uri(request.path),
+            self.action,
+            urlencode(sorted(kwargs.items())),
+            params,
+            versions,
+        ))
+        return RESPONSE_KEY_PREFIX + hashlib.sha1(
+            raw_key.encode()
+        ).hexdigest()
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        response_cache = get_response_cache()
+        key = self.get_response_cache_key(request, **kwargs)
+        data = response_cache.get(key)
+        if data is not None:
+            response = Response(data)
+            response["X-Cache"] = "HIT"
+            return response
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            data = response.data
+            response_cache.set(
+                key, list(data) if isinstance(data, list) else dict(data)
+            )
+        response["X-Cache"] = "MISS"
+        return response
+
+
+class CachedListModelMixin(CachedResponseMixin):
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().list, request, *args, **kwargs
+        )
+
+
+class CachedRetrieveModelMixin(CachedResponseMixin):
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
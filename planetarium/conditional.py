@@ -0,0 +1,74 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from planetarium.cache import model_versions, models_last_modified
+
+
+class NotModified(Exception):
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """Answer If-None-Match / If-Modified-Since before any serialization.
+
+    Validators come from the version counters of ``etag_models`` (see
+    ``planetarium.cache``), so they cost a couple of cache reads and no
+    database query.
+    """
+
+    etag_models = ()
+
+    def get_etag_targets(self):
+        return list(self.etag_models)
+
+    def get_etag_parts(self, request):
+        return [
+            request.build_absolute_uri(request.path),
+            self.action or "",
+            request.accepted_renderer.format,
+            urlencode(sorted(request.query_params.lists()), doseq=True),
+        ]
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.etag = self.last_modified = None
+        if request.method not in ("GET", "HEAD"):
+            return
+
+        targets = self.get_etag_targets()
+        if not targets:
+            return
+        parts = self.get_etag_parts(request) + [
+            str(version) for version in model_versions(*targets)
+        ]
+        self.etag = '"{}"'.format(
+            hashlib.sha1("|".join(parts).encode()).hexdigest()
+        )
+        self.last_modified = int(models_last_modified(*targets))
+
+        response = get_conditional_response(
+            request, etag=self.etag, last_modified=self.last_modified
+        )
+        if response is not None:
+            response["ETag"] = self.etag
+            response["Last-Modified"] = http_date(self.last_modified)
+            raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if getattr(self, "etag", None) and response.status_code == 200:
+            response["ETag"] = self.etag
+            response["Last-Modified"] = http_date(self.last_modified)
+        return response
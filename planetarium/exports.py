@@ -0,0 +1,88 @@
+import csv
+import io
+from itertools import islice
+
+import orjson
+from django.conf import settings
+
+from planetarium.models import Ticket
+
+DEFAULT_EXPORT = {
+    # rows per database round trip and per streamed chunk
+    "CHUNK_SIZE": 2000,
+}
+# (column, Ticket lookup)
+TICKET_COLUMNS = (
+    ("ticket_id", "id"),
+    ("row", "row"),
+    ("seat", "seat"),
+    ("reservation_id", "reservation_id"),
+    ("reserved_at", "reservation__created_at"),
+    ("user_email", "reservation__user__email"),
+    ("show_session_id", "show_session_id"),
+    ("show_time", "show_session__show_time"),
+    ("astronomy_show_id", "show_session__astronomy_show_id"),
+    ("astronomy_show_title", "show_session__astronomy_show__title"),
+    ("planetarium_dome_id", "show_session__planetarium_dome_id"),
+    ("planetarium_dome_name", "show_session__planetarium_dome__name"),
+)
+
+
+def _config():
+    return {
+        **DEFAULT_EXPORT,
+        **getattr(settings, "PLANETARIUM_EXPORT", {}),
+    }
+
+
+def ticket_rows(queryset=None, chunk_size=None):
+    """Tuples of ``TICKET_COLUMNS``, one per ticket, in id order.
+
+    Rows come from a server-side cursor ``chunk_size`` at a time, so
+    memory stays flat however many tickets match.
+    """
+    if queryset is None:
+        queryset = Ticket.objects.all()
+    return queryset.order_by("pk").values_list(
+        *(lookup for _, lookup in TICKET_COLUMNS)
+    ).iterator(chunk_size=chunk_size or _config()["CHUNK_SIZE"])
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def csv_chunks(rows, chunk_size=None):
+    chunk_size = chunk_size or _config()["CHUNK_SIZE"]
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow([column for column, _ in TICKET_COLUMNS])
+    for batch in _batches(rows, chunk_size):
+        writer.writerows(batch)
+        yield output.getvalue().encode()
+        output.seek(0)
+        output.truncate()
+    if output.tell():
+        # header of an empty export
+        yield output.getvalue().encode()
+
+
+def ndjson_chunks(rows, chunk_size=None):
+    chunk_size = chunk_size or _config()["CHUNK_SIZE"]
+    columns = [column for column, _ in TICKET_COLUMNS]
+    for batch in _batches(rows, chunk_size):
+        yield b"".join(
+            orjson.dumps(dict(zip(columns, row))) + b"\n" for row in batch
+        )
+
+
+# format -> (chunks, content type)
+EXPORT_FORMATS = {
+    "csv": (csv_chunks, "text/csv; charset=utf-8"),
+    "ndjson": (ndjson_chunks, "application/x-ndjson"),
+}
@@ -0,0 +1,223 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+from rest_framework.relations import (
+    ManyRelatedField,
+    PrimaryKeyRelatedField,
+    SlugRelatedField,
+)
+from rest_framework.response import Response
+
+VALUE, FILE, MANY = range(3)
+FETCH_PREFIX = "fast_"
+
+_compiled = {}
+
+
+def fast_serialization_enabled() -> bool:
+    return getattr(settings, "PLANETARIUM_FAST_SERIALIZATION", True)
+
+
+class Unsupported(Exception):
+    pass
+
+
+class CompiledSerializer:
+    """Read-only ``ModelSerializer`` output built straight from ``.values()``.
+
+    The serializer's fields are resolved once into query paths: model
+    fields through forward foreign keys, ``Meta.fast_values``
+    expressions for properties, and one extra query per to-many
+    slug/pk field. Rows are then dicts turned into output dicts by the
+    fields' own ``to_representation``, skipped where it is the
+    identity, so the JSON is the same as the serializer's.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        serializer = serializer_class()
+        model = serializer.Meta.model
+        self.model = model
+        self.expressions = {}
+        self.file_fields = {}
+        # (output key, fetch key, kind, needs to_representation)
+        self.plan = []
+        self.many = []
+        fast_values = getattr(serializer.Meta, "fast_values", {})
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in fast_values:
+                key = FETCH_PREFIX + name
+                self.expressions[key] = fast_values[name]
+                self.plan.append((name, key, VALUE, True))
+            elif isinstance(field, ManyRelatedField):
+                self.many.append(self._compile_many(name, field))
+                self.plan.append((name, name, MANY, False))
+            else:
+                self.plan.append(self._compile_field(name, field))
+        fetch = [
+            fetch for _, fetch, kind, _ in self.plan
+            if kind != MANY and fetch not in self.expressions
+        ]
+        if self.many:
+            fetch.append(model._meta.pk.attname)
+        self.fetch = list(dict.fromkeys(fetch))
+
+    def _compile_field(self, name, field):
+        if field.source == "*" or isinstance(
+                field, (serializers.SerializerMethodField,
+                        serializers.BaseSerializer)
+        ):
+            raise Unsupported(name)
+        opts = self.model._meta
+        for attr in field.source_attrs[:-1]:
+            relation = self._get_field(opts, attr, name)
+            if not (relation.many_to_one or relation.one_to_one) or (
+                    relation.null or not relation.concrete
+            ):
+                # DRF skips the field when a nullable relation is empty
+                raise Unsupported(name)
+            opts = relation.related_model._meta
+        model_field = self._get_field(opts, field.source_attrs[-1], name)
+        path = "__".join(field.source_attrs)
+        if model_field.is_relation:
+            if not (
+                    isinstance(field, PrimaryKeyRelatedField)
+                    and model_field.many_to_one
+                    and field.pk_field is None
+            ):
+                raise Unsupported(name)
+            return name, path, VALUE, False
+        if isinstance(model_field, models.FileField):
+            self.file_fields[name] = model_field
+            return name, path, FILE, True
+        identity = (
+            type(field) is serializers.CharField
+            and isinstance(model_field, (models.CharField, models.TextField))
+        ) or (
+            type(field) is serializers.IntegerField
+            and isinstance(model_field, models.IntegerField)
+        )
+        return name, path, VALUE, not identity
+
+    @staticmethod
+    def _get_field(opts, attr, name):
+        try:
+            return opts.get_field(attr)
+        except FieldDoesNotExist:
+            raise Unsupported(name)
+
+    def _compile_many(self, name, field):
+        child = field.child_relation
+        if isinstance(child, SlugRelatedField):
+            slug_field = child.slug_field
+        elif isinstance(child, PrimaryKeyRelatedField) and (
+                child.pk_field is None
+        ):
+            slug_field = "pk"
+        else:
+            raise Unsupported(name)
+        if len(field.source_attrs) != 1:
+            raise Unsupported(name)
+        relation = self._get_field(
+            self.model._meta, field.source_attrs[0], name
+        )
+        if not (relation.many_to_many and relation.concrete):
+            raise Unsupported(name)
+        return name, relation, slug_field
+
+    def values(self, queryset):
+        """``queryset`` as the row dicts ``serialize`` expects."""
+        return queryset.prefetch_related(None).values(
+            *self.fetch, **self.expressions
+        )
+
+    def serialize(self, rows, context=None):
+        rows = list(rows)
+        # bound per call: file urls need the request from the context
+        fields = self.serializer_class(context=context or {}).fields
+        plan = [
+            (name, fetch, kind, convert and fields[name].to_representation)
+            for name, fetch, kind, convert in self.plan
+        ]
+        related = self._related_values(rows)
+        pk = self.model._meta.pk.attname
+
+        data = []
+        for row in rows:
+            item = {}
+            for name, fetch, kind, to_representation in plan:
+                if kind == MANY:
+                    item[name] = related[name].get(row[pk], [])
+                    continue
+                value = row[fetch]
+                if not value and kind == FILE:
+                    item[name] = None
+                elif kind == FILE:
+                    model_field = self.file_fields[name]
+                    item[name] = to_representation(
+                        model_field.attr_class(None, model_field, value)
+                    )
+                elif value is None or not to_representation:
+                    item[name] = value
+                else:
+                    item[name] = to_representation(value)
+            data.append(item)
+        return data
+
+    def _related_values(self, rows):
+        related = {}
+        pk = self.model._meta.pk.attname
+        ids = [row[pk] for row in rows]
+        for name, relation, slug_field in self.many:
+            if not ids:
+                related[name] = {}
+                continue
+            # same query and row order as prefetch_related() would give
+            query_name = relation.related_query_name()
+            grouped = defaultdict(list)
+            values = relation.related_model._default_manager.filter(
+                **{f"{query_name}__in": ids}
+            ).values_list(query_name, slug_field)
+            for owner, value in values:
+                grouped[owner].append(value)
+            related[name] = grouped
+        return related
+
+
+def get_compiled_serializer(serializer_class):
+    """Compiled form of ``serializer_class``, or None if unsupported."""
+    try:
+        return _compiled[serializer_class]
+    except KeyError:
+        pass
+    try:
+        compiled = CompiledSerializer(serializer_class)
+    except Unsupported:
+        compiled = None
+    _compiled[serializer_class] = compiled
+    return compiled
+
+
+class FastListModelMixin:
+    """List through ``CompiledSerializer`` when the serializer allows it."""
+
+    def list(self, request, *args, **kwargs):
+        compiled = None
+        if fast_serialization_enabled():
+            compiled = get_compiled_serializer(self.get_serializer_class())
+        if compiled is None:
+            return super().list(request, *args, **kwargs)
+
+        rows = compiled.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        context = self.get_serializer_context()
+        if page is not None:
+            return self.get_paginated_response(
+                compiled.serialize(page, context)
+            )
+        return Response(compiled.serialize(rows, context))
@@ -0,0 +1,159 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from planetarium.cache import extend_expiry_watermark
+from planetarium.models import SeatHold, ShowSession, Ticket
+from planetarium.seat_map import SeatMap
+
+DEFAULT_SEAT_HOLD_TTL = timedelta(minutes=5)
+DEFAULT_SEAT_HOLD_MAX_SEATS = 50
+
+
+def seat_hold_ttl() -> timedelta:
+    return getattr(
+        settings, "PLANETARIUM_SEAT_HOLD_TTL", DEFAULT_SEAT_HOLD_TTL
+    )
+
+
+def seat_hold_max_seats() -> int:
+    return getattr(
+        settings,
+        "PLANETARIUM_SEAT_HOLD_MAX_SEATS",
+        DEFAULT_SEAT_HOLD_MAX_SEATS
+    )
+
+
+def hold_expiry_name(show_session_id=None):
+    if show_session_id is None:
+        return "seat_holds"
+    return f"seat_holds:{show_session_id}"
+
+
+def _lock_show_session(show_session_id):
+    show_session = ShowSession.objects.select_for_update().select_related(
+        "planetarium_dome"
+    ).get(pk=show_session_id)
+    SeatHold.objects.filter(
+        show_session=show_session, expires_at__lte=timezone.now()
+    ).delete()
+    return show_session
+
+
+def _create_hold(show_session, user, held, expires_at):
+    return SeatHold.objects.create(
+        show_session=show_session,
+        user=user,
+        seats=bytes(held.bits),
+        seat_count=held.taken,
+        expires_at=expires_at,
+    )
+
+
+def _extend_hold_expiry(seat_hold):
+    expiry = seat_hold.expires_at.timestamp()
+    extend_expiry_watermark(hold_expiry_name(), expiry)
+    extend_expiry_watermark(
+        hold_expiry_name(seat_hold.show_session_id), expiry
+    )
+
+
+def hold_seats(show_session_id, user, places, ttl=None) -> SeatHold:
+    """Hold free seats of a show session for ``ttl``.
+
+    Holds of one session are created one at a time under a row lock on
+    the session; expired holds of that session are dropped on the way.
+    """
+    if len(places) > seat_hold_max_seats():
+        raise ValidationError(
+            {"seats": f"At most {seat_hold_max_seats()} seats can be held"}
+        )
+    expires_at = timezone.now() + (ttl or seat_hold_ttl())
+
+    with transaction.atomic():
+        show_session = _lock_show_session(show_session_id)
+        taken = SeatMap.for_show_session(show_session)
+        held = SeatMap(taken.rows, taken.seats_in_row)
+        errors = []
+        for place in places:
+            Ticket.validate_ticket(
+                place["row"],
+                place["seat"],
+                show_session.planetarium_dome,
+                ValidationError
+            )
+            if taken.is_taken(place["row"], place["seat"]) or held.is_taken(
+                    place["row"], place["seat"]
+            ):
+                errors.append(place)
+            held.mark(place["row"], place["seat"])
+        if errors:
+            raise ValidationError(
+                {
+                    "seats": [
+                        f"Seat (row: {place['row']}, seat: {place['seat']}) "
+                        f"is not available"
+                        for place in errors
+                    ]
+                }
+            )
+        seat_hold = _create_hold(show_session, user, held, expires_at)
+
+    _extend_hold_expiry(seat_hold)
+    return seat_hold
+
+
+def best_available_places(seat_map, party_size, rows=None, centre=True):
+    """Places of the best free block for the party, side by side."""
+    block = seat_map.best_block(party_size, rows, centre)
+    if block is None:
+        raise ValidationError(
+            {"party_size": [f"No {party_size} adjacent seats are available"]}
+        )
+    row, first_seat = block
+    return [
+        {"row": row, "seat": seat}
+        for seat in range(first_seat, first_seat + party_size)
+    ]
+
+
+def hold_best_available(
+        show_session_id,
+        user,
+        party_size,
+        rows=None,
+        centre=True,
+        ttl=None,
+) -> SeatHold:
+    """Find the best free block for the party and hold it for ``ttl``.
+
+    The block is chosen under the same session lock as ``hold_seats``
+    takes, so concurrent parties never race for the same seats.
+    """
+    if party_size > seat_hold_max_seats():
+        raise ValidationError(
+            {
+                "party_size": [
+                    f"At most {seat_hold_max_seats()} seats can be held"
+                ]
+            }
+        )
+    expires_at = timezone.now() + (ttl or seat_hold_ttl())
+
+    with transaction.atomic():
+        show_session = _lock_show_session(show_session_id)
+        taken = SeatMap.for_show_session(show_session)
+        held = SeatMap(taken.rows, taken.seats_in_row)
+        held.mark_many(
+            (place["row"], place["seat"])
+            for place in best_available_places(
+                taken, party_size, rows, centre
+            )
+        )
+        seat_hold = _create_hold(show_session, user, held, expires_at)
+
+    _extend_hold_expiry(seat_hold)
+    return seat_hold
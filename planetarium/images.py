@@ -0,0 +1,196 @@
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.dispatch import receiver
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IMAGE_VARIANTS = {
+    # longest side in pixels, by variant name
+    "SIZES": {"thumbnail": 320, "medium": 960},
+    # formats Pillow cannot write (AVIF before Pillow 11.2) are skipped
+    "FORMATS": ("jpeg", "webp", "avif"),
+    "QUALITY": 80,
+    "WORKERS": 2,
+}
+THUMBNAIL = "thumbnail"
+EXTENSIONS = {"jpeg": "jpg", "webp": "webp", "avif": "avif"}
+
+
+def _config():
+    return {
+        **DEFAULT_IMAGE_VARIANTS,
+        **getattr(settings, "PLANETARIUM_IMAGE_VARIANTS", {}),
+    }
+
+
+def render_variants(data, sizes, formats, quality):
+    """Encoded copies of image ``data``: {variant: {format: bytes}}.
+
+    Runs in the worker processes, so it only needs Pillow. Images are
+    never scaled up.
+    """
+    Image.init()
+    formats = [name for name in formats if name.upper() in Image.SAVE]
+    source = Image.open(io.BytesIO(data))
+    source = ImageOps.exif_transpose(source)
+    if source.mode not in ("RGB", "RGBA"):
+        source = source.convert(
+            "RGBA" if "transparency" in source.info else "RGB"
+        )
+    variants = {}
+    for variant, size in sorted(
+            sizes.items(), key=lambda item: item[1], reverse=True
+    ):
+        # each size is scaled down from the previous, larger one
+        source.thumbnail((size, size), Image.Resampling.LANCZOS)
+        variants[variant] = {}
+        for name in formats:
+            image = source
+            if name == "jpeg" and image.mode != "RGB":
+                image = image.convert("RGB")
+            output = io.BytesIO()
+            image.save(output, format=name.upper(), quality=quality)
+            variants[variant][name] = output.getvalue()
+    return variants
+
+
+def variant_name(image_name, variant, image_format):
+    directory, filename = os.path.split(image_name)
+    stem, _ = os.path.splitext(filename)
+    return os.path.join(
+        directory,
+        "variants",
+        f"{stem}-{variant}.{EXTENSIONS[image_format]}",
+    )
+
+
+_executors = None
+_executors_lock = threading.Lock()
+
+
+def get_image_executors():
+    """(dispatch threads, render processes), or None to work inline."""
+    global _executors
+    if _executors is None:
+        with _executors_lock:
+            if _executors is None:
+                workers = _config()["WORKERS"]
+                # forked children would inherit the server's threads and
+                # database connections
+                _executors = (
+                    ThreadPoolExecutor(
+                        max_workers=workers,
+                        thread_name_prefix="planetarium-images",
+                    ),
+                    ProcessPoolExecutor(
+                        max_workers=workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    ),
+                ) if workers else False
+    return _executors or None
+
+
+@receiver(setting_changed)
+def reset_image_executors(setting, **kwargs):
+    global _executors
+    if setting == "PLANETARIUM_IMAGE_VARIANTS":
+        if _executors:
+            for executor in _executors:
+                executor.shutdown(wait=False)
+        _executors = None
+
+
+def delete_variants(variants):
+    for formats in variants.values():
+        for name in formats.values():
+            default_storage.delete(name)
+
+
+def generate_image_variants(astronomy_show_id, image_name, stale=None):
+    """Render, store and record the variants of one uploaded image.
+
+    The variants are only recorded while ``image_name`` is still the
+    show's image; ``stale`` variants of the previous image are deleted
+    once the new ones are in place.
+    """
+    from planetarium.cache import bump_model_version
+    from planetarium.models import AstronomyShow
+
+    config = _config()
+    with default_storage.open(image_name, "rb") as image:
+        data = image.read()
+    args = (data, config["SIZES"], config["FORMATS"], config["QUALITY"])
+    executors = get_image_executors()
+    if executors is None:
+        rendered = render_variants(*args)
+    else:
+        rendered = executors[1].submit(render_variants, *args).result()
+
+    variants = {}
+    for variant, formats in rendered.items():
+        variants[variant] = {}
+        for image_format, content in formats.items():
+            variants[variant][image_format] = default_storage.save(
+                variant_name(image_name, variant, image_format),
+                ContentFile(content),
+            )
+    updated = AstronomyShow.objects.filter(
+        pk=astronomy_show_id, image=image_name
+    ).update(image_variants=variants)
+    if not updated:
+        # the image was replaced or removed while this one rendered
+        delete_variants(variants)
+    else:
+        # update() sends no post_save, so cached responses are expired here
+        bump_model_version(AstronomyShow)
+    delete_variants(stale or {})
+    return variants
+
+
+def _run_job(astronomy_show_id, image_name, stale):
+    close_old_connections()
+    try:
+        generate_image_variants(astronomy_show_id, image_name, stale)
+    except Exception:
+        logger.exception(
+            "Rendering variants of %s for astronomy show %s failed",
+            image_name,
+            astronomy_show_id,
+        )
+    finally:
+        close_old_connections()
+
+
+def enqueue_image_variants(astronomy_show, stale=None):
+    """Render the variants of the show's image once the upload commits.
+
+    With ``WORKERS`` set to 0 they are rendered in the committing
+    thread instead.
+    """
+    astronomy_show_id = astronomy_show.pk
+    image_name = astronomy_show.image.name
+
+    def submit():
+        if not image_name:
+            delete_variants(stale or {})
+            return
+        executors = get_image_executors()
+        if executors is None:
+            generate_image_variants(astronomy_show_id, image_name, stale)
+        else:
+            executors[0].submit(
+                _run_job, astronomy_show_id, image_name, stale
+            )
+
+    transaction.on_commit(submit)
@@ -0,0 +1,207 @@
+import json
+import math
+import platform
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+
+from planetarium.models import Reservation
+from planetarium.urls import router
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Call every GET endpoint of the planetarium router through the "
+        "test client and report p50/p95/p99 latency, query count and "
+        "response size. Runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument(
+            "--user",
+            help="Email of the user to authenticate as; defaults to the "
+                 "owner of the latest reservation",
+        )
+        parser.add_argument(
+            "--endpoint",
+            action="append",
+            default=[],
+            help="Only run these url names, e.g. showsession-list",
+        )
+        parser.add_argument("--output", help="Write the results as JSON")
+        parser.add_argument(
+            "--compare",
+            help="Report the difference to a previous --output file",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=20.0,
+            help="p95 growth in percent counted as a regression",
+        )
+        parser.add_argument(
+            "--fail-on-regression",
+            action="store_true",
+            help="Exit with an error when --compare finds a regression",
+        )
+
+    def handle(self, *args, **options):
+        # throttling would start answering 429 after a few hundred
+        # requests and, like the debug toolbar, is not what is being
+        # measured
+        with override_settings(
+                DEBUG=False,
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+        ), mock.patch.object(APIView, "throttle_classes", ()):
+            with transaction.atomic():
+                results = self.run(options)
+                transaction.set_rollback(True)
+
+        report = {
+            "created_at": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "requests": options["requests"],
+            "endpoints": results,
+        }
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<40} {result['status']} "
+                f"p50 {result['p50_ms']:8.2f} ms  "
+                f"p95 {result['p95_ms']:8.2f} ms  "
+                f"p99 {result['p99_ms']:8.2f} ms  "
+                f"{result['queries']:3d} queries  "
+                f"{result['bytes']:8d} bytes"
+            )
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+        if options["compare"]:
+            self.compare(report, options)
+
+    def get_user(self, email):
+        User = get_user_model()
+        if email:
+            try:
+                return User.objects.get(email=email)
+            except User.DoesNotExist:
+                raise CommandError(f"No user with email {email}")
+        reservation = Reservation.objects.select_related("user").first()
+        if reservation is not None:
+            return reservation.user
+        return User.objects.create_superuser(
+            f"bench-{time.time_ns()}@planetarium.local", None
+        )
+
+    def sample_pk(self, viewset, user):
+        if getattr(viewset, "queryset", None) is None:
+            return None
+        queryset = viewset.queryset.model.objects.order_by("pk")
+        if any(
+                field.name == "user"
+                for field in queryset.model._meta.get_fields()
+        ):
+            queryset = queryset.filter(user=user)
+        return queryset.values_list("pk", flat=True).first()
+
+    def targets(self, user, only):
+        for pattern in router.urls:
+            name = pattern.name
+            callback = pattern.callback
+            groups = pattern.pattern.regex.groupindex
+            if "format" in groups or (only and name not in only):
+                continue
+            if name == "api-root":
+                yield name, reverse(f"planetarium:{name}")
+                continue
+            if "get" not in callback.actions:
+                continue
+            if "pk" in groups:
+                pk = self.sample_pk(callback.cls, user)
+                if pk is None:
+                    self.stderr.write(f"{name}: skipped, no sample object")
+                    continue
+                yield name, reverse(f"planetarium:{name}", args=[pk])
+            else:
+                yield name, reverse(f"planetarium:{name}")
+
+    def run(self, options):
+        user = self.get_user(options["user"])
+        client = APIClient()
+        client.force_authenticate(user)
+        results = {}
+        for name, url in self.targets(user, set(options["endpoint"])):
+            for _ in range(options["warmup"]):
+                client.get(url)
+            timings = []
+            queries = 0
+            cache_hits = 0
+            for _ in range(options["requests"]):
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = client.get(url)
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries = max(queries, len(captured))
+                cache_hits += response.get("X-Cache") == "HIT"
+            results[name] = {
+                "url": url,
+                "status": response.status_code,
+                "p50_ms": round(percentile(timings, 50), 3),
+                "p95_ms": round(percentile(timings, 95), 3),
+                "p99_ms": round(percentile(timings, 99), 3),
+                "mean_ms": round(sum(timings) / len(timings), 3),
+                "queries": queries,
+                "bytes": len(response.content),
+                "cache_hits": cache_hits,
+            }
+        return results
+
+    def compare(self, report, options):
+        with open(options["compare"]) as previous_file:
+            previous = json.load(previous_file)["endpoints"]
+        regressions = []
+        for name, result in report["endpoints"].items():
+            before = previous.get(name)
+            if before is None:
+                self.stdout.write(f"{name}: new endpoint")
+                continue
+            growth = (
+                (result["p95_ms"] - before["p95_ms"])
+                / before["p95_ms"] * 100
+                if before["p95_ms"] else 0.0
+            )
+            line = (
+                f"{name:<40} p95 {before['p95_ms']:.2f} -> "
+                f"{result['p95_ms']:.2f} ms ({growth:+.1f}%), "
+                f"queries {before['queries']} -> {result['queries']}, "
+                f"bytes {before['bytes']} -> {result['bytes']}"
+            )
+            if (
+                    growth > options["threshold"]
+                    or result["queries"] > before["queries"]
+            ):
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        if regressions and options["fail_on_regression"]:
+            raise CommandError(
+                f"Regressions in: {', '.join(sorted(regressions))}"
+            )
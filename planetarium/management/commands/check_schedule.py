@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from planetarium.models import ShowSession
+from planetarium.scheduling import find_overlaps, get_schedule_backend
+
+
+class Command(BaseCommand):
+    help = "Report show sessions that overlap in the same planetarium dome"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--install",
+            action="store_true",
+            help="Install the database overlap constraint when none overlap",
+        )
+
+    def handle(self, *args, **options):
+        overlaps = find_overlaps(
+            ShowSession.objects.values_list(
+                "id", "planetarium_dome_id", "show_time", "ends_at"
+            ).iterator()
+        )
+        for first, second in overlaps:
+            self.stdout.write(
+                f"Show sessions {first} and {second} overlap"
+            )
+        if not options["install"]:
+            self.stdout.write(
+                self.style.SUCCESS(f"{len(overlaps)} overlap(s)")
+            )
+            return
+        if overlaps:
+            raise CommandError(
+                "Reschedule the overlapping sessions before installing "
+                "the constraint"
+            )
+        with transaction.atomic(), connection.cursor() as cursor:
+            get_schedule_backend().install(cursor)
+        self.stdout.write(self.style.SUCCESS("Overlap constraint installed"))
@@ -0,0 +1,129 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from planetarium.models import AstronomyShow, PlanetariumDome, ShowSession
+from planetarium.scheduling import get_schedule_backend
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare query plans and timings of the old date-cast schedule "
+        "filter with the half-open range filter on synthetic sessions. "
+        "Everything runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sessions", type=int, default=1_000_000)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="Use EXPLAIN ANALYZE where the database supports it",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            day, show, dome = self.populate(
+                options["sessions"], options["batch_size"]
+            )
+            start = datetime.combine(day, datetime.min.time())
+            end = start + timedelta(days=1)
+            cases = [
+                (
+                    "date cast: show_time__date",
+                    ShowSession.objects.filter(show_time__date=day),
+                ),
+                (
+                    "range: show_time >= day < day + 1",
+                    ShowSession.objects.filter(
+                        show_time__gte=start, show_time__lt=end
+                    ),
+                ),
+                (
+                    "date cast + astronomy_show",
+                    ShowSession.objects.filter(
+                        show_time__date=day, astronomy_show=show
+                    ),
+                ),
+                (
+                    "range + astronomy_show",
+                    ShowSession.objects.filter(
+                        show_time__gte=start,
+                        show_time__lt=end,
+                        astronomy_show=show,
+                    ),
+                ),
+                (
+                    "range + planetarium_dome",
+                    ShowSession.objects.filter(
+                        show_time__gte=start,
+                        show_time__lt=end,
+                        planetarium_dome=dome,
+                    ),
+                ),
+            ]
+            for label, queryset in cases:
+                self.report(label, queryset, options)
+            transaction.set_rollback(True)
+
+    def populate(self, sessions, batch_size):
+        domes = PlanetariumDome.objects.bulk_create(
+            PlanetariumDome(name=f"Bench dome {index}", rows=20,
+                            seats_in_row=30)
+            for index in range(20)
+        )
+        shows = AstronomyShow.objects.bulk_create(
+            AstronomyShow(title=f"Bench show {index}", description="")
+            for index in range(200)
+        )
+        first_day = datetime(2020, 1, 1)
+        span_minutes = 5 * 365 * 24 * 60
+        rng = random.Random(42)
+        self.stdout.write(f"Inserting {sessions} show sessions...")
+        with connection.cursor() as cursor:
+            # the synthetic sessions overlap freely; dropping the
+            # constraint is rolled back with everything else
+            get_schedule_backend().uninstall(cursor)
+        for offset in range(0, sessions, batch_size):
+            show_times = [
+                first_day + timedelta(minutes=rng.randrange(span_minutes))
+                for _ in range(min(batch_size, sessions - offset))
+            ]
+            ShowSession.objects.bulk_create(
+                ShowSession(
+                    astronomy_show=rng.choice(shows),
+                    planetarium_dome=rng.choice(domes),
+                    show_time=show_time,
+                    ends_at=show_time + timedelta(hours=1),
+                )
+                for show_time in show_times
+            )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "ANALYZE"
+                if connection.vendor == "sqlite"
+                else f"ANALYZE {ShowSession._meta.db_table}"
+            )
+        day = (first_day + timedelta(days=rng.randrange(5 * 365))).date()
+        return day, shows[0], domes[0]
+
+    def report(self, label, queryset, options):
+        explain_options = {}
+        if options["analyze"] and connection.vendor == "postgresql":
+            explain_options["analyze"] = True
+        timings = []
+        for _ in range(options["repeat"]):
+            started = time.perf_counter()
+            rows = len(queryset.values_list("id", flat=True))
+            timings.append(time.perf_counter() - started)
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(queryset.explain(**explain_options))
+        self.stdout.write(
+            f"rows: {rows}, best of {options['repeat']}: "
+            f"{min(timings) * 1000:.2f} ms\n"
+        )
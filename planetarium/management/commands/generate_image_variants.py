@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from planetarium.images import generate_image_variants
+from planetarium.models import AstronomyShow
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the resized image variants of astronomy shows uploaded "
+        "before they existed, or of every show with --all"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Render again shows that already have variants",
+        )
+
+    def handle(self, *args, **options):
+        shows = AstronomyShow.objects.exclude(image="").exclude(
+            image__isnull=True
+        ).order_by("pk")
+        if not options["all"]:
+            shows = shows.filter(image_variants={})
+        rendered = 0
+        for astronomy_show in shows.iterator():
+            generate_image_variants(
+                astronomy_show.pk,
+                astronomy_show.image.name,
+                stale=astronomy_show.image_variants,
+            )
+            rendered += 1
+        self.stdout.write(
+            self.style.SUCCESS(f"Rendered variants of {rendered} shows")
+        )
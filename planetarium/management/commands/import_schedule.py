@@ -0,0 +1,68 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from planetarium.schedule_import import (
+    FORMATS,
+    ScheduleImport,
+    ScheduleImportError,
+    read_schedule,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk create show sessions from a CSV or JSON schedule. Nothing "
+        "is created if any row fails unless --partial is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Defaults to the file extension",
+        )
+        parser.add_argument("--batch-size", type=int)
+        parser.add_argument(
+            "--partial",
+            action="store_true",
+            help="Create the valid rows even when others fail",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only validate the schedule",
+        )
+
+    def handle(self, *args, **options):
+        file_format = options["format"] or os.path.splitext(
+            options["path"]
+        )[1].lstrip(".").lower()
+        started = time.perf_counter()
+        try:
+            with open(options["path"], "rb") as file:
+                schedule_import = ScheduleImport(
+                    batch_size=options["batch_size"],
+                    partial=options["partial"],
+                    dry_run=options["dry_run"],
+                ).run(read_schedule(file, file_format))
+        except (OSError, ScheduleImportError) as error:
+            raise CommandError(error)
+        elapsed = time.perf_counter() - started
+
+        for error in schedule_import.errors:
+            for field, messages in error["errors"].items():
+                for message in messages:
+                    self.stderr.write(
+                        f"row {error['row']}: {field}: {message}"
+                    )
+        verb = "Would create" if options["dry_run"] else "Created"
+        summary = (
+            f"{verb} {schedule_import.created} show sessions in "
+            f"{elapsed:.2f}s, {len(schedule_import.errors)} rows failed"
+        )
+        if schedule_import.errors and not schedule_import.created:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from planetarium.analytics import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the sales rollups from show sessions and tickets"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS("Sales rollups rebuilt"))
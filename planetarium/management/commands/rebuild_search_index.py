@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from planetarium.search import index_astronomy_shows
+
+
+class Command(BaseCommand):
+    help = "Rebuild the astronomy show full-text search index"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            index_astronomy_shows()
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt"))
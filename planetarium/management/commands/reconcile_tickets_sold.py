@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from planetarium.analytics import refresh_rollups
+from planetarium.cache import bump_model_version
+from planetarium.models import ShowSession, Ticket
+
+
+class Command(BaseCommand):
+    help = "Recount ShowSession.tickets_sold from the Ticket table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report drifted show sessions",
+        )
+
+    def handle(self, *args, **options):
+        tickets_count = Ticket.objects.filter(
+            show_session=OuterRef("pk")
+        ).order_by().values("show_session").annotate(
+            count=Count("id")
+        ).values("count")
+
+        with transaction.atomic():
+            drifted = ShowSession.objects.select_for_update().annotate(
+                actual_tickets_sold=Coalesce(Subquery(tickets_count), 0)
+            ).exclude(
+                tickets_sold=F("actual_tickets_sold")
+            ).values_list(
+                "id",
+                "tickets_sold",
+                "actual_tickets_sold",
+                "astronomy_show_id",
+                "planetarium_dome_id",
+            )
+
+            fixed = 0
+            show_ids = set()
+            dome_ids = set()
+            for (
+                    show_session_id, tickets_sold, actual, show_id, dome_id
+            ) in drifted:
+                self.stdout.write(
+                    f"Show session {show_session_id}: "
+                    f"{tickets_sold} -> {actual}"
+                )
+                if not options["dry_run"]:
+                    ShowSession.objects.filter(pk=show_session_id).update(
+                        tickets_sold=actual
+                    )
+                    bump_model_version(ShowSession, show_session_id)
+                    show_ids.add(show_id)
+                    dome_ids.add(dome_id)
+                fixed += 1
+            # update() skips the signals that keep the rollups current
+            refresh_rollups(show_ids, dome_ids)
+
+        if fixed and not options["dry_run"]:
+            bump_model_version(ShowSession)
+        self.stdout.write(
+            self.style.SUCCESS(f"{fixed} show session(s) drifted")
+        )
@@ -0,0 +1,300 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from planetarium.analytics import rebuild_rollups
+from planetarium.cache import bump_model_version
+from planetarium.models import (
+    AstronomyShow,
+    PlanetariumDome,
+    Reservation,
+    ShowSession,
+    ShowTheme,
+    Ticket,
+)
+from planetarium.search import index_astronomy_shows
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-generate domes, themes, shows, sessions, reservations and "
+        "tickets for load and benchmark runs. Signals are bypassed; "
+        "tickets_sold, the search index and cache versions are set "
+        "directly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--domes", type=int, default=20)
+        parser.add_argument("--themes", type=int, default=50)
+        parser.add_argument("--shows", type=int, default=500)
+        parser.add_argument("--sessions", type=int, default=20_000)
+        parser.add_argument("--users", type=int, default=1_000)
+        parser.add_argument("--tickets", type=int, default=500_000)
+        parser.add_argument(
+            "--tickets-per-reservation",
+            type=int,
+            default=4,
+            help="Upper bound of tickets in one reservation",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="Spread sessions over this many days around today",
+        )
+        parser.add_argument("--batch-size", type=int, default=5_000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--prefix",
+            default="seed",
+            help="Prefix of generated names and user emails",
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.prefix = options["prefix"]
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            domes = self.step("domes", self.create_domes, options["domes"])
+            themes = self.step(
+                "themes", self.create_themes, options["themes"]
+            )
+            shows = self.step(
+                "shows", self.create_shows, options["shows"], themes
+            )
+            users = self.step("users", self.create_users, options["users"])
+            sold = self.plan_tickets(
+                domes, options["sessions"], options["tickets"]
+            )
+            sessions = self.step(
+                "sessions",
+                self.create_sessions,
+                shows,
+                domes,
+                sold,
+                options["days"],
+            )
+            self.step(
+                "tickets",
+                self.create_tickets,
+                sessions,
+                users,
+                options["tickets_per_reservation"],
+            )
+            index_astronomy_shows()
+            rebuild_rollups()
+
+        for model in (
+                PlanetariumDome,
+                ShowTheme,
+                AstronomyShow,
+                ShowSession,
+                Reservation,
+                Ticket,
+        ):
+            bump_model_version(model)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded in {time.perf_counter() - started:.1f} s"
+            )
+        )
+
+    def step(self, label, create, *args):
+        started = time.perf_counter()
+        created = create(*args)
+        count = created if isinstance(created, int) else len(created)
+        self.stdout.write(
+            f"{label}: {count} in "
+            f"{time.perf_counter() - started:.2f} s"
+        )
+        return created
+
+    def batches(self, objects):
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def create_domes(self, count):
+        return PlanetariumDome.objects.bulk_create(
+            PlanetariumDome(
+                name=f"{self.prefix} dome {index}",
+                rows=self.rng.randint(5, 30),
+                seats_in_row=self.rng.randint(10, 40),
+            )
+            for index in range(count)
+        )
+
+    def create_themes(self, count):
+        names = [f"{self.prefix} theme {index}" for index in range(count)]
+        ShowTheme.objects.bulk_create(
+            (ShowTheme(name=name) for name in names),
+            ignore_conflicts=True,
+        )
+        return list(ShowTheme.objects.filter(name__in=names))
+
+    def create_shows(self, count, themes):
+        shows = []
+        for batch in self.batches(
+                AstronomyShow(
+                    title=f"{self.prefix} show {index}",
+                    description=f"Synthetic astronomy show number {index}",
+                )
+                for index in range(count)
+        ):
+            shows.extend(AstronomyShow.objects.bulk_create(batch))
+        if themes:
+            through = AstronomyShow.show_theme.through
+            for batch in self.batches(
+                    through(astronomyshow_id=show.id, showtheme_id=theme.id)
+                    for show in shows
+                    for theme in self.rng.sample(
+                        themes, min(len(themes), self.rng.randint(1, 3))
+                    )
+            ):
+                through.objects.bulk_create(batch)
+        return shows
+
+    def create_users(self, count):
+        User = get_user_model()
+        password = make_password(None)
+        emails = [
+            f"{self.prefix}-{index}@planetarium.local"
+            for index in range(count)
+        ]
+        for batch in self.batches(
+                User(email=email, password=password) for email in emails
+        ):
+            User.objects.bulk_create(batch, ignore_conflicts=True)
+        return list(
+            User.objects.filter(email__in=emails).values_list("id", flat=True)
+        )
+
+    def plan_tickets(self, domes, sessions, tickets):
+        # decide how many seats each session sells up front, so
+        # tickets_sold is written once with the session row
+        session_domes = [self.rng.choice(domes) for _ in range(sessions)]
+        sold = [0] * sessions
+        capacity = sum(dome.capacity for dome in session_domes)
+        tickets = min(tickets, capacity)
+        for index, dome in enumerate(session_domes):
+            share = tickets * dome.capacity // capacity if capacity else 0
+            sold[index] = min(
+                dome.capacity, self.rng.randint(share // 2, share * 3 // 2)
+            )
+        return list(zip(session_domes, sold))
+
+    def create_sessions(self, shows, domes, sold, days):
+        now = timezone.now().replace(second=0, microsecond=0)
+        # sessions of a dome start on distinct slots as long as the
+        # longest show, so none of them overlap
+        slot = max((show.duration for show in shows), default=60)
+        slots = max(days, 1) * 24 * 60 // slot
+        dome_slots = {}
+        for dome, _ in sold:
+            dome_slots[dome.id] = dome_slots.get(dome.id, 0) + 1
+        if max(dome_slots.values(), default=0) > slots:
+            raise CommandError(
+                f"{max(dome_slots.values())} sessions of one dome do not "
+                f"fit into {days} days; raise --days or --domes"
+            )
+        dome_slots = {
+            dome_id: iter(self.rng.sample(range(slots), count))
+            for dome_id, count in dome_slots.items()
+        }
+        shows = {show.id: show for show in shows}
+        show_ids = list(shows)
+        sessions = []
+        for dome, tickets_sold in sold:
+            show_id = self.rng.choice(show_ids)
+            show_time = now + timedelta(
+                minutes=(next(dome_slots[dome.id]) - slots // 2) * slot
+            )
+            sessions.append(ShowSession(
+                astronomy_show_id=show_id,
+                planetarium_dome_id=dome.id,
+                show_time=show_time,
+                ends_at=show_time + shows[show_id].session_duration,
+                tickets_sold=tickets_sold,
+            ))
+        # bulk_create sets the pk of every object, so ids stay paired
+        # with their rows; raw multi-row RETURNING makes no such promise
+        ShowSession.objects.bulk_create(
+            sessions, batch_size=self.batch_size
+        )
+        return [
+            (show_session.id, dome, tickets_sold)
+            for show_session, (dome, tickets_sold) in zip(sessions, sold)
+        ]
+
+    def reservation_plan(self, sessions, users, per_reservation):
+        for show_session_id, dome, tickets_sold in sessions:
+            places = self.rng.sample(range(dome.capacity), tickets_sold)
+            start = 0
+            while start < len(places):
+                size = self.rng.randint(1, per_reservation)
+                yield show_session_id, self.rng.choice(users), [
+                    (index // dome.seats_in_row + 1,
+                     index % dome.seats_in_row + 1)
+                    for index in places[start:start + size]
+                ]
+                start += size
+
+    def insert_rows(self, model, columns, rows):
+        # tickets are the bulk of the data; plain multi-row INSERTs skip
+        # building a model instance per row, which dominates bulk_create
+        ops = connection.ops
+        table = ops.quote_name(model._meta.db_table)
+        names = ", ".join(ops.quote_name(column) for column in columns)
+        placeholders = "({})".format(", ".join(["%s"] * len(columns)))
+        fields = [model._meta.get_field(column) for column in columns]
+        size = min(self.batch_size, ops.bulk_batch_size(fields, rows))
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), size):
+                chunk = rows[start:start + size]
+                cursor.execute(
+                    f"INSERT INTO {table} ({names}) VALUES "
+                    + ", ".join([placeholders] * len(chunk)),
+                    [value for row in chunk for value in row],
+                )
+
+    def create_tickets(self, sessions, users, per_reservation):
+        if not users:
+            return 0
+        created_at = timezone.now()
+        created = 0
+        for plan in self.batches(
+                self.reservation_plan(
+                    sessions, users, max(per_reservation, 1)
+                )
+        ):
+            reservations = Reservation.objects.bulk_create(
+                Reservation(created_at=created_at, user_id=user_id)
+                for _, user_id, _ in plan
+            )
+            tickets = [
+                (row, seat, show_session_id, reservation.id)
+                for reservation, (show_session_id, _, places) in zip(
+                    reservations, plan
+                )
+                for row, seat in places
+            ]
+            self.insert_rows(
+                Ticket,
+                ["row", "seat", "show_session_id", "reservation_id"],
+                tickets,
+            )
+            created += len(tickets)
+        return created
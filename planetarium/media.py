@@ -0,0 +1,204 @@
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote, urlsplit
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.urls import path
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+DEFAULT_MEDIA = {
+    # "django" streams the file itself (os.sendfile under gunicorn);
+    # "x-accel" (nginx) and "x-sendfile" (Apache, lighttpd) hand the
+    # transfer to the proxy in front
+    "BACKEND": "django",
+    # nginx ``internal`` location aliased to MEDIA_ROOT
+    "ACCEL_PREFIX": "/protected-media/",
+    "MAX_AGE": 3600,
+    "IMMUTABLE_MAX_AGE": 365 * 24 * 3600,
+}
+BACKENDS = ("django", "x-accel", "x-sendfile")
+# upload names carry a uuid4 (see astronomy_show_image_file_path), so
+# a name is never reused for different content
+IMMUTABLE_NAME_RE = re.compile(
+    r"[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}"
+)
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _config():
+    config = {
+        **DEFAULT_MEDIA,
+        **getattr(settings, "PLANETARIUM_MEDIA", {}),
+    }
+    if config["BACKEND"] not in BACKENDS:
+        raise ValueError(
+            f"PLANETARIUM_MEDIA BACKEND must be one of {', '.join(BACKENDS)}"
+        )
+    return config
+
+
+class FileRange:
+    """The ``length`` bytes of ``file`` from ``start``.
+
+    ``fileno()`` is kept, so gunicorn still sends the range with
+    os.sendfile from the current offset for Content-Length bytes.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """(start, length) of a single byte range, None to send it all.
+
+    Raises ValueError when the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        # malformed or multiple ranges: the whole file is a valid answer
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start = max(size - int(last), 0)
+        end = size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end - start + 1
+
+
+def _etag(stat_result):
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve a file under MEDIA_ROOT with validators and cache headers.
+
+    Single byte ranges are answered with 206 when no proxy takes the
+    transfer over.
+    """
+    config = _config()
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404()
+    try:
+        stat_result = os.stat(full_path)
+    except (OSError, ValueError):
+        raise Http404()
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404()
+
+    etag = _etag(stat_result)
+    last_modified = int(stat_result.st_mtime)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = _file_response(
+            request, full_path, path, stat_result, etag, config
+        )
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    if IMMUTABLE_NAME_RE.search(os.path.basename(path)):
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=config["IMMUTABLE_MAX_AGE"],
+            immutable=True,
+        )
+    else:
+        patch_cache_control(response, public=True, max_age=config["MAX_AGE"])
+    return response
+
+
+def _file_response(request, full_path, path, stat_result, etag, config):
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or "application/octet-stream"
+    if config["BACKEND"] != "django":
+        response = HttpResponse(content_type=content_type)
+        if config["BACKEND"] == "x-accel":
+            # nginx answers ranges and HEAD for the internal location
+            response["X-Accel-Redirect"] = (
+                config["ACCEL_PREFIX"].rstrip("/") + "/" + quote(path)
+            )
+        else:
+            response["X-Sendfile"] = full_path
+        if encoding:
+            response["Content-Encoding"] = encoding
+        return response
+
+    size = stat_result.st_size
+    byte_range = None
+    header = request.headers.get("Range")
+    if_range = request.headers.get("If-Range")
+    if header and (
+            if_range is None
+            or if_range in (etag, http_date(int(stat_result.st_mtime)))
+    ):
+        try:
+            byte_range = parse_range(header, size)
+        except ValueError:
+            response = HttpResponse(status=416, content_type=content_type)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    file = open(full_path, "rb")
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, length = byte_range
+        response = FileResponse(
+            FileRange(file, start, length),
+            status=206,
+            content_type=content_type,
+        )
+        response["Content-Length"] = str(length)
+        response["Content-Range"] = (
+            f"bytes {start}-{start + length - 1}/{size}"
+        )
+    if encoding:
+        response["Content-Encoding"] = encoding
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+def media_urlpatterns():
+    """MEDIA_URL routes, unless media lives on another host."""
+    prefix = settings.MEDIA_URL
+    if not prefix or urlsplit(prefix).netloc:
+        return []
+    return [
+        path(
+            f"{prefix.strip('/')}/<path:path>",
+            serve_media,
+            name="media",
+        ),
+    ]
@@ -0,0 +1,350 @@
+import atexit
+import glob
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.files import locks
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.dispatch import receiver
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+UNRESOLVED_VIEW = "unresolved"
+
+DEFAULT_METRICS = {
+    "DIRECTORY": None,
+    "FLUSH_INTERVAL": 5.0,
+    "BUCKETS": (
+        0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+    ),
+}
+
+# per series: requests, seconds, queries, query seconds, then one
+# non-cumulative counter per bucket
+REQUESTS, SECONDS, QUERIES, QUERY_SECONDS, FIRST_BUCKET = range(5)
+
+PROCESS_FILE_RE = re.compile(r"^metrics-(\d+)-[0-9a-f]+\.json$")
+# totals of the processes that have exited, and the lock guarding it
+EXITED_FILE = "metrics-exited.json"
+LOCK_FILE = "metrics.lock"
+
+
+def _config():
+    return {**DEFAULT_METRICS, **getattr(settings, "PLANETARIUM_METRICS", {})}
+
+
+class MetricsRegistry:
+    """Request metrics of this process keyed by (view, method, status).
+
+    With a ``directory`` each process dumps its totals into its own file
+    there every ``flush_interval`` seconds and ``collect`` sums all the
+    files, so counters add up across worker processes. The files of
+    exited processes are folded into a single total, on exit or, for
+    processes that were killed, by the next ``collect``; the directory
+    must therefore only be shared by processes of one host.
+    """
+
+    def __init__(self, buckets, directory=None, flush_interval=5.0):
+        self.buckets = tuple(sorted(buckets))
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self._reset()
+        if directory:
+            atexit.register(self.close)
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.series = {}
+        self.flushed_at = time.monotonic()
+        self.path = None
+        if self.directory:
+            self.path = os.path.join(
+                self.directory, f"metrics-{self.pid}-{uuid.uuid4().hex}.json"
+            )
+
+    def observe(self, view, method, status, seconds, queries, query_seconds):
+        key = (view, method, f"{status // 100}xx")
+        bucket = FIRST_BUCKET + bisect_left(self.buckets, seconds)
+        with self.lock:
+            if self.pid != os.getpid():
+                # forked after the registry was created: start clean so
+                # the parent's requests are not counted twice
+                self._reset()
+            values = self.series.get(key)
+            if values is None:
+                values = self.series[key] = [0, 0.0, 0, 0.0] + [0] * (
+                    len(self.buckets) + 1
+                )
+            values[REQUESTS] += 1
+            values[SECONDS] += seconds
+            values[QUERIES] += queries
+            values[QUERY_SECONDS] += query_seconds
+            values[bucket] += 1
+            flush = (
+                self.path is not None
+                and time.monotonic() - self.flushed_at > self.flush_interval
+            )
+            if flush:
+                self.flushed_at = time.monotonic()
+        if flush:
+            self.flush()
+
+    def snapshot(self):
+        with self.lock:
+            return {key: list(values) for key, values in self.series.items()}
+
+    def flush(self):
+        if self.path is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._write(self.path, self.snapshot())
+
+    def close(self):
+        """Fold this process's totals into the exited total."""
+        if (
+                self.path is None
+                or self.pid != os.getpid()
+                or not os.path.isdir(self.directory)
+        ):
+            return
+        self.flush()
+        self._fold_exited([self.path])
+
+    def collect(self):
+        if self.path is None:
+            return self.snapshot()
+        self.flush()
+        paths = glob.glob(os.path.join(self.directory, "metrics-*.json"))
+        dead = [path for path in paths if _is_dead_process_file(path)]
+        if dead:
+            self._fold_exited(dead)
+            paths = glob.glob(os.path.join(self.directory, "metrics-*.json"))
+        return self._sum(paths)
+
+    def _fold_exited(self, paths):
+        exited_path = os.path.join(self.directory, EXITED_FILE)
+        with open(os.path.join(self.directory, LOCK_FILE), "a") as lock_file:
+            locks.lock(lock_file, locks.LOCK_EX)
+            try:
+                # another process may have folded them in meanwhile
+                paths = [path for path in paths if os.path.exists(path)]
+                if not paths:
+                    return
+                self._write(exited_path, self._sum([exited_path, *paths]))
+                for path in paths:
+                    os.remove(path)
+            finally:
+                locks.unlock(lock_file)
+
+    def _write(self, path, series):
+        payload = {
+            "buckets": self.buckets,
+            "series": [[list(key), values] for key, values in series.items()],
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as tmp:
+            json.dump(payload, tmp)
+        os.replace(tmp_path, path)
+
+    def _sum(self, paths):
+        series = {}
+        for path in paths:
+            try:
+                with open(path) as metrics_file:
+                    payload = json.load(metrics_file)
+            except (OSError, ValueError):
+                continue
+            if tuple(payload["buckets"]) != self.buckets:
+                continue
+            for key, values in payload["series"]:
+                merged = series.setdefault(tuple(key), [0] * len(values))
+                for index, value in enumerate(values):
+                    merged[index] += value
+        return series
+
+    def render(self):
+        series = sorted(self.collect().items())
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        family(
+            "planetarium_http_requests_total",
+            "counter",
+            "Requests handled, by view action, method and status class.",
+        )
+        for key, values in series:
+            lines.append(
+                f"planetarium_http_requests_total{{{_labels(key)}}} "
+                f"{values[REQUESTS]}"
+            )
+        family(
+            "planetarium_http_request_duration_seconds",
+            "histogram",
+            "Time spent handling a request.",
+        )
+        for key, values in series:
+            labels = _labels(key)
+            cumulative = 0
+            bounds = [_number(bound) for bound in self.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, values[FIRST_BUCKET:]):
+                cumulative += count
+                lines.append(
+                    f"planetarium_http_request_duration_seconds_bucket"
+                    f'{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(
+                f"planetarium_http_request_duration_seconds_sum{{{labels}}} "
+                f"{_number(values[SECONDS])}"
+            )
+            lines.append(
+                f"planetarium_http_request_duration_seconds_count"
+                f"{{{labels}}} {values[REQUESTS]}"
+            )
+        family(
+            "planetarium_db_queries_total",
+            "counter",
+            "Database queries issued while handling requests.",
+        )
+        for key, values in series:
+            lines.append(
+                f"planetarium_db_queries_total{{{_labels(key)}}} "
+                f"{values[QUERIES]}"
+            )
+        family(
+            "planetarium_db_query_duration_seconds_total",
+            "counter",
+            "Time spent in database queries while handling requests.",
+        )
+        for key, values in series:
+            lines.append(
+                f"planetarium_db_query_duration_seconds_total"
+                f"{{{_labels(key)}}} {_number(values[QUERY_SECONDS])}"
+            )
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+def _labels(key):
+    view, method, status = key
+    return (
+        f'view="{_escape(view)}",method="{_escape(method)}",'
+        f'status="{_escape(status)}"'
+    )
+
+
+def _number(value):
+    return repr(float(value))
+
+
+def _is_dead_process_file(path):
+    match = PROCESS_FILE_RE.match(os.path.basename(path))
+    if match is None or os.name != "posix":
+        # os.kill() terminates the process on Windows
+        return False
+    try:
+        os.kill(int(match.group(1)), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass
+    return False
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                config = _config()
+                _registry = MetricsRegistry(
+                    config["BUCKETS"],
+                    directory=config["DIRECTORY"],
+                    flush_interval=config["FLUSH_INTERVAL"],
+                )
+    return _registry
+
+
+@receiver(setting_changed)
+def reset_metrics_registry(setting, **kwargs):
+    global _registry
+    if setting == "PLANETARIUM_METRICS":
+        _registry = None
+
+
+def view_name(request, view_func):
+    """``<basename>-<action>`` for viewsets, the url name otherwise."""
+    actions = getattr(view_func, "actions", None)
+    basename = getattr(view_func, "initkwargs", {}).get("basename")
+    if actions and basename:
+        action = actions.get(request.method.lower())
+        if action:
+            return f"{basename}-{action}"
+    match = request.resolver_match
+    return match.view_name if match is not None else UNRESOLVED_VIEW
+
+
+class QueryTimer:
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.seconds += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        # connection.execute_wrapper() without the contextmanager overhead
+        wrappers = connections[DEFAULT_DB_ALIAS].execute_wrappers
+        wrappers.append(timer)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            wrappers.pop()
+        get_metrics_registry().observe(
+            getattr(request, "metrics_view", UNRESOLVED_VIEW),
+            request.method,
+            response.status_code,
+            time.perf_counter() - started,
+            timer.queries,
+            timer.seconds,
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = view_name(request, view_func)
@@ -0,0 +1,56 @@
+# Generated by Django 4.0.4 on 2026-10-18 02:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models.functions import Coalesce
+
+
+def count_tickets_sold(apps, schema_editor):
+    ShowSession = apps.get_model('planetarium', 'ShowSession')
+    Ticket = apps.get_model('planetarium', 'Ticket')
+    tickets_count = Ticket.objects.filter(
+        show_session=models.OuterRef('pk')
+    ).order_by().values('show_session').annotate(
+        count=models.Count('id')
+    ).values('count')
+    ShowSession.objects.update(
+        tickets_sold=Coalesce(
+            models.Subquery(tickets_count), 0
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planetarium', '0002_alter_planetariumdome_rows'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='showsession',
+            name='tickets_sold',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='showsession',
+            name='astronomy_show',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='show_sessions', to='planetarium.astronomyshow'),
+        ),
+        migrations.AlterField(
+            model_name='showsession',
+            name='planetarium_dome',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='show_sessions', to='planetarium.planetariumdome'),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='reservation',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tickets', to='planetarium.reservation'),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='show_session',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tickets', to='planetarium.showsession'),
+        ),
+        migrations.RunPython(count_tickets_sold, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.0.4 on 2026-10-18 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planetarium', '0003_showsession_tickets_sold'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='reservation_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='showsession',
+            index=models.Index(fields=['-show_time', '-id'], name='showsession_show_time_id_idx'),
+        ),
+    ]
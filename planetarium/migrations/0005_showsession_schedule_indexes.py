@@ -0,0 +1,21 @@
+# Generated by Django 4.0.4 on 2026-10-18 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planetarium', '0004_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='showsession',
+            index=models.Index(fields=['astronomy_show', 'show_time'], name='showsession_show_time_show_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='showsession',
+            index=models.Index(fields=['planetarium_dome', 'show_time'], name='showsession_show_time_dome_idx'),
+        ),
+    ]
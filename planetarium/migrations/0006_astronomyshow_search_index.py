@@ -0,0 +1,100 @@
+from django.db import migrations
+
+# inlined so that the migration keeps working as planetarium.search
+# changes
+SEARCH_CONFIG = "english"
+FTS_TABLE = "planetarium_astronomyshow_fts"
+
+
+def search_tables(apps):
+    AstronomyShow = apps.get_model("planetarium", "AstronomyShow")
+    through = AstronomyShow.show_theme.through
+    return {
+        "show": AstronomyShow._meta.db_table,
+        "theme": AstronomyShow.show_theme.field.related_model._meta.db_table,
+        "link": through._meta.db_table,
+        "link_show": through._meta.get_field("astronomyshow").column,
+        "link_theme": through._meta.get_field("showtheme").column,
+    }
+
+
+def install_postgres(schema_editor, tables):
+    schema_editor.execute(
+        f"ALTER TABLE {tables['show']} "
+        f"ADD COLUMN IF NOT EXISTS search_vector tsvector"
+    )
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS astronomyshow_search_gin "
+        f"ON {tables['show']} USING GIN (search_vector)"
+    )
+    schema_editor.execute(
+        f"""
+        UPDATE {tables['show']} AS astronomy_show SET search_vector =
+            setweight(
+                to_tsvector(%s, coalesce(astronomy_show.title, '')), 'A'
+            )
+            || setweight(to_tsvector(%s, coalesce((
+                SELECT string_agg(theme.name, ' ')
+                FROM {tables['theme']} AS theme
+                JOIN {tables['link']} AS link
+                    ON link.{tables['link_theme']} = theme.id
+                WHERE link.{tables['link_show']} = astronomy_show.id
+            ), '')), 'B')
+            || setweight(to_tsvector(
+                %s, coalesce(astronomy_show.description, '')
+            ), 'C')
+        """,
+        [SEARCH_CONFIG] * 3,
+    )
+
+
+def install_sqlite(schema_editor, tables):
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        f"USING fts5(title, themes, description)"
+    )
+    schema_editor.execute(f"DELETE FROM {FTS_TABLE}")
+    schema_editor.execute(
+        f"""
+        INSERT INTO {FTS_TABLE} (rowid, title, themes, description)
+        SELECT astronomy_show.id, astronomy_show.title, coalesce((
+            SELECT group_concat(theme.name, ' ')
+            FROM {tables['theme']} AS theme
+            JOIN {tables['link']} AS link
+                ON link.{tables['link_theme']} = theme.id
+            WHERE link.{tables['link_show']} = astronomy_show.id
+        ), ''), astronomy_show.description
+        FROM {tables['show']} AS astronomy_show
+        """
+    )
+
+
+def install_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        install_postgres(schema_editor, search_tables(apps))
+    elif vendor == "sqlite":
+        install_sqlite(schema_editor, search_tables(apps))
+
+
+def uninstall_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS astronomyshow_search_gin")
+        schema_editor.execute(
+            f"ALTER TABLE {search_tables(apps)['show']} "
+            f"DROP COLUMN IF EXISTS search_vector"
+        )
+    elif vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planetarium', '0005_showsession_schedule_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.0.4 on 2026-10-18 02:35
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('planetarium', '0006_astronomyshow_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatHold',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('seats', models.BinaryField()),
+                ('seat_count', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('show_session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_holds', to='planetarium.showsession')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_holds', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['expires_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='seathold',
+            index=models.Index(fields=['show_session', 'expires_at'], name='seathold_session_expires_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.4 on 2026-10-18 03:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planetarium', '0008_slowquery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='astronomyshow',
+            name='image_variants',
+            field=models.JSONField(default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,98 @@
+import logging
+from datetime import timedelta
+
+import django.core.validators
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+# inlined so that the migration keeps working as planetarium.scheduling
+# changes
+OVERLAP_CONSTRAINT = "showsession_dome_no_overlap"
+
+
+def set_ends_at(apps, schema_editor):
+    ShowSession = apps.get_model("planetarium", "ShowSession")
+    # every show has the default duration at this point
+    ShowSession.objects.update(ends_at=F("show_time") + timedelta(minutes=60))
+
+
+def count_overlaps(ShowSession):
+    """Sessions that start before an earlier session of the dome ends."""
+    overlaps = 0
+    dome_id, last_end = None, None
+    sessions = ShowSession.objects.order_by(
+        "planetarium_dome_id", "show_time"
+    ).values_list("planetarium_dome_id", "show_time", "ends_at")
+    for session_dome_id, show_time, ends_at in sessions.iterator():
+        if session_dome_id != dome_id:
+            dome_id, last_end = session_dome_id, ends_at
+            continue
+        if show_time < last_end:
+            overlaps += 1
+        last_end = max(last_end, ends_at)
+    return overlaps
+
+
+def install_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    ShowSession = apps.get_model("planetarium", "ShowSession")
+    overlaps = count_overlaps(ShowSession)
+    if overlaps:
+        logger.warning(
+            "Skipped the session overlap constraint: %d sessions overlap "
+            "an earlier session of their dome. Reschedule them, then run "
+            "manage.py check_schedule --install.",
+            overlaps,
+        )
+        return
+    range_type = "tstzrange" if settings.USE_TZ else "tsrange"
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    schema_editor.execute(
+        f"ALTER TABLE {ShowSession._meta.db_table} "
+        f"ADD CONSTRAINT {OVERLAP_CONSTRAINT} "
+        f"EXCLUDE USING gist (planetarium_dome_id WITH =, "
+        f"{range_type}(show_time, ends_at) WITH &&)"
+    )
+
+
+def uninstall_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    ShowSession = apps.get_model("planetarium", "ShowSession")
+    schema_editor.execute(
+        f"ALTER TABLE {ShowSession._meta.db_table} "
+        f"DROP CONSTRAINT IF EXISTS {OVERLAP_CONSTRAINT}"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planetarium', '0009_astronomyshow_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='astronomyshow',
+            name='duration',
+            field=models.PositiveIntegerField(default=60, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(1440)]),
+        ),
+        migrations.AddField(
+            model_name='showsession',
+            name='ends_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(set_ends_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='showsession',
+            name='ends_at',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.RunPython(
+            install_overlap_constraint, uninstall_overlap_constraint
+        ),
+    ]
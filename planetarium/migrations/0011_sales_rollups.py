@@ -0,0 +1,173 @@
+# Generated by Django 4.0.4 on 2026-10-18 03:38
+
+from collections import Counter
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models.functions import TruncDate
+
+BATCH_SIZE = 2000
+
+
+def fill_daily(Rollup, ShowSession, field):
+    Rollup.objects.bulk_create(
+        (
+            Rollup(**row)
+            for row in ShowSession.objects.annotate(
+                day=TruncDate('show_time')
+            ).values(f'{field}_id', 'day').annotate(
+                sessions=models.Count('id'),
+                seats=models.Sum(
+                    models.F('planetarium_dome__rows')
+                    * models.F('planetarium_dome__seats_in_row')
+                ),
+                tickets_sold=models.Sum('tickets_sold'),
+            ).order_by().iterator()
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+def fill_rollups(apps, schema_editor):
+    ShowSession = apps.get_model('planetarium', 'ShowSession')
+    Ticket = apps.get_model('planetarium', 'Ticket')
+    ShowDailySales = apps.get_model('planetarium', 'ShowDailySales')
+    DomeDailySales = apps.get_model('planetarium', 'DomeDailySales')
+    ThemeDailySales = apps.get_model('planetarium', 'ThemeDailySales')
+    ShowSellThrough = apps.get_model('planetarium', 'ShowSellThrough')
+
+    fill_daily(ShowDailySales, ShowSession, 'astronomy_show')
+    fill_daily(DomeDailySales, ShowSession, 'planetarium_dome')
+    ThemeDailySales.objects.bulk_create(
+        (
+            ThemeDailySales(**row)
+            for row in ShowDailySales.objects.annotate(
+                show_theme_id=models.F('astronomy_show__show_theme')
+            ).filter(show_theme_id__isnull=False).values(
+                'show_theme_id', 'day'
+            ).annotate(
+                sessions=models.Sum('sessions'),
+                seats=models.Sum('seats'),
+                tickets_sold=models.Sum('tickets_sold'),
+            ).order_by().iterator()
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+    lead_days = Counter()
+    for show_id, show_day, sale_day, count in Ticket.objects.values_list(
+            'show_session__astronomy_show_id',
+            TruncDate('show_session__show_time'),
+            TruncDate('reservation__created_at'),
+    ).annotate(tickets=models.Count('id')).order_by().iterator():
+        lead_days[show_id, max((show_day - sale_day).days, 0)] += count
+    ShowSellThrough.objects.bulk_create(
+        (
+            ShowSellThrough(
+                astronomy_show_id=show_id,
+                days_before=days_before,
+                tickets_sold=count,
+            )
+            for (show_id, days_before), count in lead_days.items()
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planetarium', '0010_showsession_ends_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThemeDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('sessions', models.PositiveIntegerField(default=0)),
+                ('seats', models.PositiveIntegerField(default=0)),
+                ('tickets_sold', models.PositiveIntegerField(default=0)),
+                ('show_theme', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='planetarium.showtheme')),
+            ],
+            options={
+                'verbose_name_plural': 'theme daily sales',
+                'ordering': ['day'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ShowSellThrough',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('days_before', models.PositiveIntegerField()),
+                ('tickets_sold', models.PositiveIntegerField(default=0)),
+                ('astronomy_show', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sell_through', to='planetarium.astronomyshow')),
+            ],
+            options={
+                'ordering': ['astronomy_show', '-days_before'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ShowDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('sessions', models.PositiveIntegerField(default=0)),
+                ('seats', models.PositiveIntegerField(default=0)),
+                ('tickets_sold', models.PositiveIntegerField(default=0)),
+                ('astronomy_show', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='planetarium.astronomyshow')),
+            ],
+            options={
+                'verbose_name_plural': 'show daily sales',
+                'ordering': ['day'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='DomeDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('sessions', models.PositiveIntegerField(default=0)),
+                ('seats', models.PositiveIntegerField(default=0)),
+                ('tickets_sold', models.PositiveIntegerField(default=0)),
+                ('planetarium_dome', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='planetarium.planetariumdome')),
+            ],
+            options={
+                'verbose_name_plural': 'dome daily sales',
+                'ordering': ['day'],
+                'abstract': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='themedailysales',
+            index=models.Index(fields=['day'], name='themedailysales_day_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='themedailysales',
+            unique_together={('show_theme', 'day')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='showsellthrough',
+            unique_together={('astronomy_show', 'days_before')},
+        ),
+        migrations.AddIndex(
+            model_name='showdailysales',
+            index=models.Index(fields=['day'], name='showdailysales_day_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='showdailysales',
+            unique_together={('astronomy_show', 'day')},
+        ),
+        migrations.AddIndex(
+            model_name='domedailysales',
+            index=models.Index(fields=['day'], name='domedailysales_day_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='domedailysales',
+            unique_together={('planetarium_dome', 'day')},
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
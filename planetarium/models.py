@@ -1,9 +1,15 @@
 import os.path
 import uuid
+from collections import Counter
+from datetime import timedelta
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
 from django.utils.text import slugify
 
 
@@ -16,6 +22,11 @@ class PlanetariumDome(models.Model):
     def capacity(self) -> int:
         return self.rows * self.seats_in_row
 
+    @staticmethod
+    def capacity_expression(prefix=""):
+        """``capacity`` as a query expression, ``prefix`` ending in __."""
+        return F(f"{prefix}rows") * F(f"{prefix}seats_in_row")
+
     def __str__(self):
         return self.name
 
@@ -33,6 +44,11 @@ def astronomy_show_image_file_path(instance, filename):
     return os.path.join("uploads/astronomizes/", filename)
 
 
+# upper bound of a show's duration, which bounds how far back a session
+# overlapping a given time can start (see planetarium.scheduling)
+MAX_SHOW_DURATION = 24 * 60
+
+
 class AstronomyShow(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
@@ -41,10 +57,25 @@ class AstronomyShow(models.Model):
         null=True,
         upload_to=astronomy_show_image_file_path
     )
+    # storage names of the resized copies of ``image``, by size and
+    # format; filled in by planetarium.images once they are rendered
+    image_variants = models.JSONField(default=dict, editable=False)
+    # minutes a session of the show keeps its dome booked
+    duration = models.PositiveIntegerField(
+        default=60,
+        validators=[
+            MinValueValidator(1),
+            MaxValueValidator(MAX_SHOW_DURATION),
+        ]
+    )
 
     class Meta:
         ordering = ["title"]
 
+    @property
+    def session_duration(self) -> timedelta:
+        return timedelta(minutes=self.duration)
+
     def __str__(self):
         return self.title
 
@@ -61,9 +92,119 @@ class ShowSession(models.Model):
         related_name="show_sessions"
     )
     show_time = models.DateTimeField()
+    # show_time plus the show's duration when the session was scheduled
+    ends_at = models.DateTimeField(editable=False)
+    tickets_sold = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ["-show_time"]
+        indexes = [
+            models.Index(
+                fields=["-show_time", "-id"],
+                name="showsession_show_time_id_idx"
+            ),
+            models.Index(
+                fields=["astronomy_show", "show_time"],
+                name="showsession_show_time_show_idx"
+            ),
+            models.Index(
+                fields=["planetarium_dome", "show_time"],
+                name="showsession_show_time_dome_idx"
+            ),
+        ]
+
+    @property
+    def tickets_available(self) -> int:
+        return (
+            self.planetarium_dome.capacity
+            - self.tickets_sold
+            - getattr(self, "seats_held", 0)
+        )
+
+    @staticmethod
+    def tickets_available_expression():
+        """``tickets_available`` for querysets annotated with seats_held."""
+        return (
+            PlanetariumDome.capacity_expression("planetarium_dome__")
+            - F("tickets_sold")
+            - F("seats_held")
+        )
+
+    @staticmethod
+    def seats_held_subquery(outer_ref="pk"):
+        return Coalesce(
+            Subquery(
+                SeatHold.active().filter(
+                    show_session=OuterRef(outer_ref)
+                ).order_by().values("show_session").annotate(
+                    total=Sum("seat_count")
+                ).values("total")
+            ),
+            0
+        )
+
+    @staticmethod
+    def add_tickets_sold(show_session_ids):
+        for show_session_id, tickets_count in Counter(
+                show_session_ids
+        ).items():
+            ShowSession.objects.filter(pk=show_session_id).update(
+                tickets_sold=F("tickets_sold") + tickets_count
+            )
+
+    @staticmethod
+    def remove_tickets_sold(show_session_ids):
+        for show_session_id, tickets_count in Counter(
+                show_session_ids
+        ).items():
+            ShowSession.objects.filter(pk=show_session_id).update(
+                tickets_sold=Greatest(F("tickets_sold") - tickets_count, 0)
+            )
+
+    def clean(self):
+        from planetarium.scheduling import (
+            OVERLAP_MESSAGE,
+            overlapping_sessions,
+        )
+
+        if None in (
+                self.show_time,
+                self.astronomy_show_id,
+                self.planetarium_dome_id,
+        ):
+            return
+        if overlapping_sessions(
+                self.planetarium_dome_id,
+                self.show_time,
+                self.show_time + self.astronomy_show.session_duration,
+                exclude_pk=self.pk,
+        ).exists():
+            raise ValidationError({"show_time": OVERLAP_MESSAGE})
+
+    def save(
+            self,
+            force_insert=False,
+            force_update=False,
+            using=None,
+            update_fields=None
+    ):
+        if update_fields is None or {
+            "show_time", "astronomy_show", "astronomy_show_id"
+        } & set(update_fields):
+            self.show_time = self._meta.get_field("show_time").to_python(
+                self.show_time
+            )
+            self.ends_at = (
+                self.show_time + self.astronomy_show.session_duration
+            )
+            if update_fields is not None:
+                update_fields = {*update_fields, "ends_at"}
+        return super().save(
+            force_insert,
+            force_update,
+            using,
+            update_fields,
+        )
 
     def __str__(self):
         return self.astronomy_show.title + " " + str(self.show_time)
@@ -81,6 +222,12 @@ class Reservation(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at", "-id"],
+                name="reservation_user_created_idx"
+            ),
+        ]
 
 
 class Ticket(models.Model):
@@ -146,3 +293,176 @@ class Ticket(models.Model):
     class Meta:
         unique_together = ("show_session", "row", "seat")
         ordering = ["row", "seat"]
+
+
+class SeatHold(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    show_session = models.ForeignKey(
+        ShowSession,
+        on_delete=models.CASCADE,
+        related_name="seat_holds"
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="seat_holds"
+    )
+    seats = models.BinaryField()
+    seat_count = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    @staticmethod
+    def active():
+        return SeatHold.objects.filter(expires_at__gt=timezone.now())
+
+    @property
+    def is_expired(self) -> bool:
+        return self.expires_at <= timezone.now()
+
+    @property
+    def seat_map(self):
+        from planetarium.seat_map import SeatMap
+
+        planetarium_dome = self.show_session.planetarium_dome
+        return SeatMap(
+            planetarium_dome.rows,
+            planetarium_dome.seats_in_row,
+            self.seats
+        )
+
+    @property
+    def held_places(self):
+        return [
+            {"row": row, "seat": seat}
+            for row, seat in self.seat_map.places()
+        ]
+
+    def __str__(self):
+        return f"{self.show_session} ({self.seat_count} seats held)"
+
+    class Meta:
+        ordering = ["expires_at"]
+        indexes = [
+            models.Index(
+                fields=["show_session", "expires_at"],
+                name="seathold_session_expires_idx"
+            ),
+        ]
+
+
+class SlowQuery(models.Model):
+    fingerprint = models.CharField(max_length=40, unique=True)
+    sql = models.TextField()
+    params = models.TextField(blank=True)
+    view = models.CharField(max_length=255)
+    stack = models.TextField(blank=True)
+    explain = models.TextField(blank=True)
+    count = models.PositiveIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    worst_ms = models.FloatField(default=0)
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(auto_now=True)
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ms / self.count if self.count else 0.0
+
+    def __str__(self):
+        return f"{self.view}: {self.sql[:80]}"
+
+    class Meta:
+        ordering = ["-worst_ms"]
+        verbose_name_plural = "slow queries"
+
+
+class DailySales(models.Model):
+    """Sessions, seats and tickets sold of one day, kept by analytics."""
+
+    day = models.DateField()
+    sessions = models.PositiveIntegerField(default=0)
+    seats = models.PositiveIntegerField(default=0)
+    tickets_sold = models.PositiveIntegerField(default=0)
+
+    @property
+    def fill_rate(self) -> float:
+        return self.tickets_sold / self.seats if self.seats else 0.0
+
+    class Meta:
+        abstract = True
+        ordering = ["day"]
+
+
+class ShowDailySales(DailySales):
+    astronomy_show = models.ForeignKey(
+        AstronomyShow,
+        on_delete=models.CASCADE,
+        related_name="daily_sales"
+    )
+
+    def __str__(self):
+        return f"{self.astronomy_show} on {self.day}"
+
+    class Meta(DailySales.Meta):
+        verbose_name_plural = "show daily sales"
+        unique_together = ("astronomy_show", "day")
+        indexes = [
+            models.Index(fields=["day"], name="showdailysales_day_idx"),
+        ]
+
+
+class DomeDailySales(DailySales):
+    planetarium_dome = models.ForeignKey(
+        PlanetariumDome,
+        on_delete=models.CASCADE,
+        related_name="daily_sales"
+    )
+
+    def __str__(self):
+        return f"{self.planetarium_dome} on {self.day}"
+
+    class Meta(DailySales.Meta):
+        verbose_name_plural = "dome daily sales"
+        unique_together = ("planetarium_dome", "day")
+        indexes = [
+            models.Index(fields=["day"], name="domedailysales_day_idx"),
+        ]
+
+
+class ThemeDailySales(DailySales):
+    show_theme = models.ForeignKey(
+        ShowTheme,
+        on_delete=models.CASCADE,
+        related_name="daily_sales"
+    )
+
+    def __str__(self):
+        return f"{self.show_theme} on {self.day}"
+
+    class Meta(DailySales.Meta):
+        verbose_name_plural = "theme daily sales"
+        unique_together = ("show_theme", "day")
+        indexes = [
+            models.Index(fields=["day"], name="themedailysales_day_idx"),
+        ]
+
+
+class ShowSellThrough(models.Model):
+    """Tickets of a show sold ``days_before`` its sessions' day."""
+
+    astronomy_show = models.ForeignKey(
+        AstronomyShow,
+        on_delete=models.CASCADE,
+        related_name="sell_through"
+    )
+    days_before = models.PositiveIntegerField()
+    tickets_sold = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return (
+            f"{self.astronomy_show}: {self.tickets_sold} tickets "
+            f"{self.days_before} days before"
+        )
+
+    class Meta:
+        ordering = ["astronomy_show", "-days_before"]
+        unique_together = ("astronomy_show", "days_before")
@@ -0,0 +1,156 @@
+import base64
+import json
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Seek pagination over a unique ``ordering``.
+
+    Cursors carry the ordering values of the row at the page edge, so each
+    page is a bounded range scan over a matching index: no OFFSET and no
+    COUNT, whatever the depth.
+    """
+
+    ordering = ("-id",)
+    page_size = 10
+    max_page_size = 100
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+        position, self.reverse = self.decode_cursor(request)
+
+        ordering = self.get_ordering(reverse=self.reverse)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.seek_filter(ordering, position))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+
+        self.has_next = has_more if not self.reverse else position is not None
+        self.has_previous = has_more if self.reverse else position is not None
+        self.first = results[0] if results else None
+        self.last = results[-1] if results else None
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_ordering(self, reverse=False):
+        if not reverse:
+            return list(self.ordering)
+        return [
+            field[1:] if field.startswith("-") else f"-{field}"
+            for field in self.ordering
+        ]
+
+    @staticmethod
+    def seek_filter(ordering, position):
+        seek = Q()
+        for index in range(len(ordering) - 1, -1, -1):
+            field = ordering[index].lstrip("-")
+            lookup = "lt" if ordering[index].startswith("-") else "gt"
+            step = Q(**{f"{field}__{lookup}": position[index]})
+            if index < len(ordering) - 1:
+                step |= Q(**{field: position[index]}) & seek
+            seek = step
+        first_field = ordering[0].lstrip("-")
+        first_lookup = "lte" if ordering[0].startswith("-") else "gte"
+        return Q(**{f"{first_field}__{first_lookup}": position[0]}) & seek
+
+    def _fields(self):
+        return [
+            self.model._meta.get_field(field.lstrip("-"))
+            for field in self.ordering
+        ]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            values = cursor["p"]
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                field.to_python(value)
+                for field, value in zip(self._fields(), values)
+            ]
+            return position, bool(cursor.get("r"))
+        except (
+                TypeError, ValueError, KeyError, DjangoValidationError
+        ):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance, reverse):
+        if isinstance(instance, dict):
+            # a .values() row; value_to_string() only reads attributes
+            instance = SimpleNamespace(**instance)
+        values = [
+            field.value_to_string(instance) for field in self._fields()
+        ]
+        cursor = json.dumps({"p": values, "r": int(reverse)})
+        encoded = base64.urlsafe_b64encode(cursor.encode()).decode()
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or self.last is None:
+            return None
+        return self.encode_cursor(self.last, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.first is None:
+            url = self.request.build_absolute_uri()
+            return remove_query_param(url, self.cursor_query_param)
+        return self.encode_cursor(self.first, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("results", data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "previous": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
+
+
+class ShowSessionPagination(KeysetPagination):
+    ordering = ("-show_time", "-id")
+    page_size = 20
+
+
+class ReservationPagination(KeysetPagination):
+    ordering = ("-created_at", "-id")
+    page_size = 10
@@ -0,0 +1,310 @@
+import cProfile
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+DEFAULT_PROFILING = {
+    "DIRECTORY": os.path.join(tempfile.gettempdir(), "planetarium-profiles"),
+    "MAX_PROFILES": 50,
+    "SAMPLE_RATE": 0.0,
+    "INTERVAL": 0.005,
+    "HEADER": "X-Planetarium-Profile",
+    "TOKEN_MAX_AGE": 3600,
+}
+TOKEN_SALT = "planetarium.profiling"
+PROFILE_ID_RE = re.compile(r"^\d{20}-[0-9a-f]{8}$")
+TOP_FUNCTIONS = 40
+MAX_PARAMS_LENGTH = 500
+
+
+def _config():
+    return {
+        **DEFAULT_PROFILING,
+        **getattr(settings, "PLANETARIUM_PROFILING", {}),
+    }
+
+
+def make_profile_token(user) -> str:
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(str(user.pk))
+
+
+def issue_profile_token(user) -> dict:
+    config = _config()
+    return {
+        "token": make_profile_token(user),
+        "header": config["HEADER"],
+        "expires_in": config["TOKEN_MAX_AGE"],
+    }
+
+
+def is_active_staff(user) -> bool:
+    return user is not None and user.is_active and user.is_staff
+
+
+def check_profile_token(token, user) -> bool:
+    """Whether ``token`` was issued to ``user``, who is still staff."""
+    try:
+        pk = signing.TimestampSigner(salt=TOKEN_SALT).unsign(
+            token, max_age=_config()["TOKEN_MAX_AGE"]
+        )
+    except signing.BadSignature:
+        return False
+    return is_active_staff(user) and str(user.pk) == pk
+
+
+def request_user(request):
+    """The user ``request`` authenticates as, before the view runs.
+
+    Falls back from the session user to the API's authentication
+    classes, which the view itself only applies later.
+    """
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return user
+    authenticators = [
+        authentication()
+        for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    ]
+    try:
+        user = Request(request, authenticators=authenticators).user
+    except APIException:
+        return None
+    return user if user.is_authenticated else None
+
+
+def profile_trigger(request, config):
+    """Why ``request`` should be profiled, or None.
+
+    Staff get a signed token from the profiles endpoint and send it in
+    the header with their own requests; staff logged in to the admin can
+    send ``1`` instead.
+    """
+    token = request.headers.get(config["HEADER"])
+    if token:
+        if token == "1":
+            if is_active_staff(getattr(request, "user", None)):
+                return "staff"
+        elif check_profile_token(token, request_user(request)):
+            return "token"
+    if config["SAMPLE_RATE"] and random.random() < config["SAMPLE_RATE"]:
+        return "sampled"
+    return None
+
+
+def _fold(frame):
+    names = []
+    while frame is not None:
+        names.append(
+            f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+        )
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler(threading.Thread):
+    """Wall-clock samples of another thread's stack, in folded format."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_fold(frame)] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                "sql": sql,
+                "params": repr(params)[:MAX_PARAMS_LENGTH],
+                "many": many,
+                "duration_ms": (time.perf_counter() - started) * 1000,
+            })
+
+
+def top_functions(profiler, limit=TOP_FUNCTIONS):
+    stats = pstats.Stats(profiler).stats
+    rows = sorted(
+        stats.items(), key=lambda item: item[1][3], reverse=True
+    )[:limit]
+    return [
+        {
+            "function": f"{filename}:{line}({name})",
+            "calls": calls,
+            "primitive_calls": primitive_calls,
+            "own_ms": own_time * 1000,
+            "cumulative_ms": cumulative_time * 1000,
+        }
+        for (filename, line, name), (
+            primitive_calls, calls, own_time, cumulative_time, _
+        ) in rows
+    ]
+
+
+class ProfileStore:
+    """Bounded ring of request profiles on disk.
+
+    Every profile is a JSON summary plus the raw cProfile dump. Ids start
+    with the capture time, so sorting the names gives the ring order and
+    the oldest profiles are dropped past ``max_profiles``.
+    """
+
+    def __init__(self, directory, max_profiles):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def path(self, profile_id, extension):
+        if not PROFILE_ID_RE.match(profile_id):
+            raise KeyError(profile_id)
+        return os.path.join(self.directory, f"{profile_id}.{extension}")
+
+    def ids(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            name[:-5] for name in names
+            if name.endswith(".json") and PROFILE_ID_RE.match(name[:-5])
+        )
+
+    def save(self, profile, profiler):
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = profile["id"]
+        profiler.dump_stats(self.path(profile_id, "prof"))
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as tmp:
+            json.dump(profile, tmp)
+        os.replace(tmp_path, self.path(profile_id, "json"))
+        self._evict()
+
+    def _evict(self):
+        ids = self.ids()
+        for profile_id in ids[:max(len(ids) - self.max_profiles, 0)]:
+            for extension in ("json", "prof"):
+                try:
+                    os.remove(self.path(profile_id, extension))
+                except FileNotFoundError:
+                    pass
+
+    def get(self, profile_id):
+        try:
+            with open(self.path(profile_id, "json")) as profile_file:
+                return json.load(profile_file)
+        except FileNotFoundError:
+            raise KeyError(profile_id)
+
+    def list(self):
+        profiles = []
+        for profile_id in reversed(self.ids()):
+            try:
+                profile = self.get(profile_id)
+            except (KeyError, ValueError):
+                continue
+            profiles.append({
+                key: profile[key] for key in (
+                    "id",
+                    "created_at",
+                    "trigger",
+                    "method",
+                    "path",
+                    "view",
+                    "status",
+                    "duration_ms",
+                    "queries_count",
+                )
+            })
+        return profiles
+
+
+def get_profile_store() -> ProfileStore:
+    config = _config()
+    return ProfileStore(config["DIRECTORY"], config["MAX_PROFILES"])
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = _config()
+        trigger = profile_trigger(request, config)
+        if trigger is None:
+            return self.get_response(request)
+        return self.profile(request, trigger, config)
+
+    def profile(self, request, trigger, config):
+        recorder = QueryRecorder()
+        wrappers = connections[DEFAULT_DB_ALIAS].execute_wrappers
+        sampler = StackSampler(threading.get_ident(), config["INTERVAL"])
+        profiler = cProfile.Profile()
+
+        sampler.start()
+        wrappers.append(recorder)
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - started
+            wrappers.pop()
+            sampler.stop()
+
+        profile_id = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        match = request.resolver_match
+        get_profile_store().save(
+            {
+                "id": profile_id,
+                "created_at": time.time(),
+                "trigger": trigger,
+                "method": request.method,
+                "path": request.get_full_path(),
+                "view": match.view_name if match is not None else None,
+                "status": response.status_code,
+                "duration_ms": duration * 1000,
+                "queries_count": len(recorder.queries),
+                "queries_ms": sum(
+                    query["duration_ms"] for query in recorder.queries
+                ),
+                "queries": recorder.queries,
+                "functions": top_functions(profiler),
+                "stacks": dict(sampler.stacks.most_common()),
+                "sample_interval_ms": config["INTERVAL"] * 1000,
+            },
+            profiler,
+        )
+        response["X-Profile-Id"] = profile_id
+        return response
@@ -0,0 +1,238 @@
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.relations import (
+    ManyRelatedField,
+    PrimaryKeyRelatedField,
+    SlugRelatedField,
+)
+
+_plans = {}
+
+
+def query_planning_enabled() -> bool:
+    return getattr(settings, "PLANETARIUM_QUERY_PLANNING", True)
+
+
+class QueryPlan:
+    """Columns and relations a serializer reads from ``model``.
+
+    ``fields`` are ``only()`` paths, ``select`` the to-one relations to
+    join and ``prefetch`` maps to-many relations to the plan of their
+    own query.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.fields = {model._meta.pk.name}
+        self.select = set()
+        self.prefetch = {}
+
+    def add_field(self, path):
+        self.fields.add("__".join(path))
+
+    def add_all(self, path, model):
+        for field in model._meta.concrete_fields:
+            self.add_field((*path, field.name))
+
+    def add_select(self, path, relation):
+        self.select.add("__".join(path))
+        if relation.concrete:
+            self.add_field(path)
+        self.add_field((*path, relation.related_model._meta.pk.name))
+
+    def add_prefetch(self, path, relation):
+        lookup = "__".join(path)
+        plan = self.prefetch.get(lookup)
+        if plan is None:
+            plan = self.prefetch[lookup] = QueryPlan(relation.related_model)
+        if relation.one_to_many:
+            # the prefetch matches rows back through this foreign key
+            plan.add_field((relation.field.name,))
+        return plan
+
+    def apply(self, queryset, defer=True):
+        """``queryset`` with the plan's joins, prefetches and ``only()``.
+
+        Relations the queryset already selects or prefetches are kept
+        as they are; with ``defer`` False every column is still loaded.
+        """
+        prefetched = {
+            getattr(lookup, "prefetch_to", lookup)
+            for lookup in queryset._prefetch_related_lookups
+        }
+        if self.select:
+            queryset = queryset.select_related(*sorted(self.select))
+        lookups = [
+            Prefetch(
+                lookup,
+                queryset=plan.apply(plan.model._default_manager.all(), defer)
+            )
+            for lookup, plan in self.prefetch.items()
+            if lookup not in prefetched
+        ]
+        if lookups:
+            queryset = queryset.prefetch_related(*lookups)
+        selected = queryset.query.select_related
+        if not defer or selected is True:
+            return queryset
+        fields = set(self.fields)
+        for path in _select_paths(selected):
+            if "__".join(path) not in self.select:
+                # joined by hand: its columns are all read
+                self._add_joined(fields, path)
+        for lookup in prefetched:
+            self._add_joined(fields, lookup.split("__")[:1], columns=False)
+        return queryset.only(*sorted(fields))
+
+    def _add_joined(self, fields, path, columns=True):
+        opts = self.model._meta
+        for index, name in enumerate(path):
+            try:
+                relation = opts.get_field(name)
+            except FieldDoesNotExist:
+                return
+            if not relation.is_relation:
+                return
+            if relation.concrete and not relation.many_to_many:
+                fields.add("__".join(path[:index + 1]))
+            opts = relation.related_model._meta
+        if columns:
+            fields.update(
+                "__".join((*path, field.name))
+                for field in opts.concrete_fields
+            )
+
+
+def _select_paths(selected, prefix=()):
+    if not isinstance(selected, dict):
+        return
+    for name, nested in selected.items():
+        yield (*prefix, name)
+        yield from _select_paths(nested, (*prefix, name))
+
+
+def _get_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+def _plan_serializer(plan, serializer, model, path):
+    hints = getattr(getattr(serializer, "Meta", None), "query_fields", {})
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if name in hints:
+            for hint in hints[name]:
+                _plan_source(plan, model, path, hint.split("__"), None)
+        elif field.source == "*" and isinstance(
+                field, serializers.ModelSerializer
+        ) and field.Meta.model is model:
+            _plan_serializer(plan, field, model, path)
+        elif field.source == "*" or isinstance(
+                field, serializers.SerializerMethodField
+        ):
+            # reads the whole instance in ways we cannot see
+            plan.add_all(path, model)
+        else:
+            _plan_source(plan, model, path, field.source_attrs, field)
+
+
+def _plan_source(plan, model, path, attrs, field):
+    for index, attr in enumerate(attrs):
+        relation = _get_field(model, attr)
+        if relation is None:
+            # a property or method: it may read any column of the row
+            plan.add_all(path, model)
+            return
+        path = (*path, attr)
+        rest = attrs[index + 1:]
+        if not relation.is_relation:
+            plan.add_field(path)
+            return
+        if relation.many_to_many or relation.one_to_many:
+            prefetch = plan.add_prefetch(path, relation)
+            if rest:
+                _plan_source(
+                    prefetch, relation.related_model, (), rest, field
+                )
+            elif isinstance(field, serializers.ListSerializer):
+                _plan_serializer(
+                    prefetch, field.child, relation.related_model, ()
+                )
+            elif isinstance(field, ManyRelatedField):
+                _plan_related(
+                    prefetch, relation.related_model, (),
+                    field.child_relation
+                )
+            return
+        if not rest:
+            _plan_relation(plan, model, path, relation, field)
+            return
+        plan.add_select(path, relation)
+        model = relation.related_model
+
+
+def _plan_relation(plan, model, path, relation, field):
+    if isinstance(field, PrimaryKeyRelatedField) and relation.concrete:
+        # the foreign key column is enough
+        plan.add_field(path)
+        return
+    plan.add_select(path, relation)
+    related_model = relation.related_model
+    if isinstance(field, serializers.BaseSerializer):
+        _plan_serializer(plan, field, related_model, path)
+    else:
+        _plan_related(plan, related_model, path, field)
+
+
+def _plan_related(plan, model, path, field):
+    if isinstance(field, PrimaryKeyRelatedField):
+        return
+    if isinstance(field, SlugRelatedField):
+        _plan_source(plan, model, path, field.slug_field.split("__"), None)
+    else:
+        plan.add_all(path, model)
+
+
+def get_query_plan(serializer_class):
+    """Plan of a ``ModelSerializer`` class, or None for other serializers.
+
+    Nested serializers, dotted sources and ``many=True`` relations are
+    followed. Properties and method fields load every column of their
+    model unless ``Meta.query_fields`` names the paths they read.
+    """
+    try:
+        return _plans[serializer_class]
+    except KeyError:
+        pass
+    plan = None
+    if issubclass(serializer_class, serializers.ModelSerializer):
+        model = serializer_class.Meta.model
+        plan = QueryPlan(model)
+        _plan_serializer(plan, serializer_class(), model, ())
+    _plans[serializer_class] = plan
+    return plan
+
+
+class QueryPlanMixin:
+    """Plan ``get_queryset()`` from the action's serializer.
+
+    Writes still load every column: model code run by ``save()`` and
+    ``delete()`` reads more than the serializer outputs.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not query_planning_enabled():
+            return queryset
+        plan = get_query_plan(self.get_serializer_class())
+        if plan is None or plan.model is not queryset.model:
+            return queryset
+        request = getattr(self, "request", None)
+        defer = request is not None and request.method in SAFE_METHODS
+        return plan.apply(queryset, defer)
@@ -0,0 +1,42 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+class FastJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` output produced by orjson.
+
+    Dates and times still go through DRF's encoder and line/paragraph
+    separators are escaped the same way, so the bytes match for the
+    API's data. Only floats in exponent notation are spelled
+    differently (``1e16`` for ``1e+16``). Pretty-printed, ASCII-only
+    or non-strict output and anything orjson cannot encode falls back
+    to the stdlib renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+                data is None
+                or self.ensure_ascii
+                or not self.compact
+                or not self.strict
+                or self.get_indent(
+                    accepted_media_type, renderer_context or {}
+                ) is not None
+        ):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        try:
+            ret = orjson.dumps(
+                data, default=JSONEncoder().default, option=ORJSON_OPTIONS
+            )
+        except orjson.JSONEncodeError:
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        return ret.replace(
+            "\u2028".encode(), b"\\u2028"
+        ).replace("\u2029".encode(), b"\\u2029")
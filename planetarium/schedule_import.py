@@ -0,0 +1,325 @@
+import csv
+import io
+import json
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from planetarium.analytics import refresh_session_rollups
+from planetarium.cache import bump_model_version
+from planetarium.models import (
+    MAX_SHOW_DURATION,
+    AstronomyShow,
+    PlanetariumDome,
+    ShowSession,
+)
+from planetarium.scheduling import (
+    OVERLAP_MESSAGE,
+    IntervalIndex,
+    is_overlap_violation,
+)
+
+DEFAULT_SCHEDULE_IMPORT = {
+    # rows validated against the database and written per round trip
+    "BATCH_SIZE": 2000,
+}
+FORMATS = ("csv", "json")
+REQUIRED_MESSAGE = "This field is required."
+DUPLICATE_MESSAGE = "Duplicate of row {row}."
+OVERLAPS_MESSAGE = "Overlaps the session of row {row}."
+
+
+def _config():
+    return {
+        **DEFAULT_SCHEDULE_IMPORT,
+        **getattr(settings, "PLANETARIUM_SCHEDULE_IMPORT", {}),
+    }
+
+
+class ScheduleImportError(ValueError):
+    pass
+
+
+def read_schedule(file, file_format):
+    """Rows of a CSV (with a header) or JSON (array of objects) file.
+
+    ``file`` is a binary file object. Columns are ``show_time``,
+    ``astronomy_show`` and ``planetarium_dome``; references are ids or
+    the exact show title / dome name.
+    """
+    if file_format == "csv":
+        return csv.DictReader(io.TextIOWrapper(file, encoding="utf-8-sig"))
+    if file_format == "json":
+        try:
+            rows = json.load(file)
+        except ValueError as error:
+            raise ScheduleImportError(f"Invalid JSON: {error}")
+        if not isinstance(rows, list):
+            raise ScheduleImportError("Expected a JSON array of sessions")
+        return rows
+    raise ScheduleImportError(
+        f"Unknown format {file_format}, expected one of {', '.join(FORMATS)}"
+    )
+
+
+class ScheduleImport:
+    """Validate and bulk create show sessions, ``BATCH_SIZE`` at a time.
+
+    Each batch costs one lookup per referenced model, one for the
+    shows' durations, one for the dome sessions it could overlap, the
+    ``bulk_create`` and a recount of the sales rollups it touches.
+    Sessions are also checked against every earlier row of the import
+    in an in-memory interval index. Without ``partial`` nothing is kept
+    once any row fails.
+    """
+
+    def __init__(self, batch_size=None, partial=False, dry_run=False):
+        self.batch_size = batch_size or _config()["BATCH_SIZE"]
+        self.partial = partial
+        self.dry_run = dry_run
+        self.created = 0
+        self.errors = []
+        # sessions of the whole import so far, as (row number, show time)
+        self.scheduled = IntervalIndex()
+
+    def run(self, rows):
+        rows = enumerate(rows, start=1)
+        with transaction.atomic():
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                self.import_batch(batch)
+            if self.errors and not self.partial:
+                self.created = 0
+            if self.dry_run or (self.errors and not self.partial):
+                transaction.set_rollback(True)
+        if self.created and not self.dry_run:
+            # bulk_create sends no post_save
+            bump_model_version(ShowSession)
+        return self
+
+    @property
+    def result(self):
+        return {
+            "created": self.created,
+            "errors": self.errors,
+        }
+
+    def import_batch(self, batch):
+        parsed = []
+        for number, row in batch:
+            errors = {}
+            values = self.parse_row(row, errors)
+            if errors:
+                self.errors.append({"row": number, "errors": errors})
+            else:
+                parsed.append((number, values))
+
+        shows = self.resolve(
+            AstronomyShow, "title", [values[1] for _, values in parsed]
+        )
+        domes = self.resolve(
+            PlanetariumDome, "name", [values[2] for _, values in parsed]
+        )
+        sessions = []
+        pending = []
+        resolved = []
+        for number, (show_time, show, dome) in parsed:
+            errors = {}
+            show_id = self.lookup(shows, show, "astronomy_show", errors)
+            dome_id = self.lookup(domes, dome, "planetarium_dome", errors)
+            if errors:
+                self.errors.append({"row": number, "errors": errors})
+            else:
+                resolved.append((number, show_time, show_id, dome_id))
+
+        durations = self.durations(resolved)
+        taken = self.taken_sessions(resolved, durations)
+        for number, show_time, show_id, dome_id in resolved:
+            ends_at = show_time + durations[show_id]
+            scheduled = self.scheduled.overlapping(
+                dome_id, show_time, ends_at
+            )
+            if scheduled:
+                row, start = min(scheduled)
+                message = (
+                    DUPLICATE_MESSAGE if start == show_time
+                    else OVERLAPS_MESSAGE
+                ).format(row=row)
+            elif taken.overlapping(dome_id, show_time, ends_at):
+                message = OVERLAP_MESSAGE
+            else:
+                self.scheduled.add(
+                    dome_id, show_time, ends_at, (number, show_time)
+                )
+                sessions.append(
+                    ShowSession(
+                        show_time=show_time,
+                        ends_at=ends_at,
+                        astronomy_show_id=show_id,
+                        planetarium_dome_id=dome_id,
+                    )
+                )
+                pending.append((number, show_time, show_id, dome_id))
+                continue
+            self.errors.append(
+                {"row": number, "errors": {"show_time": [message]}}
+            )
+
+        sessions = self.create_sessions(pending, sessions, durations)
+        if sessions:
+            # bulk_create skips the signals that keep the rollups current
+            refresh_session_rollups(sessions)
+            self.created += len(sessions)
+
+    def create_sessions(self, pending, sessions, durations):
+        """Bulk create ``sessions``, or those still free, and return them.
+
+        ``taken_sessions`` reads the dome sessions without a lock, so a
+        concurrent write can take a slot before the insert. The overlap
+        constraint then rejects the batch; its rows are checked again
+        and the ones that lost their slot become row errors.
+        """
+        while sessions and (self.partial or not self.errors):
+            try:
+                with transaction.atomic():
+                    return ShowSession.objects.bulk_create(sessions)
+            except IntegrityError as error:
+                if not is_overlap_violation(error):
+                    raise
+                taken = self.taken_sessions(pending, durations)
+                free_rows, free = [], []
+                for row, session in zip(pending, sessions):
+                    if taken.overlapping(
+                            session.planetarium_dome_id,
+                            session.show_time,
+                            session.ends_at,
+                    ):
+                        self.errors.append({
+                            "row": row[0],
+                            "errors": {"show_time": [OVERLAP_MESSAGE]},
+                        })
+                    else:
+                        free_rows.append(row)
+                        free.append(session)
+                if len(free) == len(sessions):
+                    raise
+                pending, sessions = free_rows, free
+        return []
+
+    @staticmethod
+    def parse_row(row, errors):
+        if not isinstance(row, dict):
+            errors["non_field_errors"] = ["Expected an object."]
+            return None
+        values = []
+        for name in ("show_time", "astronomy_show", "planetarium_dome"):
+            value = row.get(name)
+            if isinstance(value, str):
+                value = value.strip()
+            if value in (None, ""):
+                errors[name] = [REQUIRED_MESSAGE]
+            values.append(value)
+        if "show_time" not in errors:
+            show_time = None
+            if isinstance(values[0], str):
+                try:
+                    show_time = parse_datetime(values[0])
+                except ValueError:
+                    pass
+            if show_time is None:
+                errors["show_time"] = [
+                    "Datetime must be in YYYY-MM-DDThh:mm[:ss] format."
+                ]
+            else:
+                values[0] = _enforce_timezone(show_time)
+        return values
+
+    @staticmethod
+    def resolve(model, name_field, references):
+        """{reference: pk, or None when the name is ambiguous}."""
+        pks = set()
+        names = set()
+        for reference in references:
+            if isinstance(reference, int) or (
+                    isinstance(reference, str) and reference.isdigit()
+            ):
+                pks.add(int(reference))
+            else:
+                names.add(str(reference))
+        found = {}
+        if pks:
+            found.update(
+                (pk, pk) for pk in model.objects.filter(
+                    pk__in=pks
+                ).values_list("pk", flat=True)
+            )
+        if names:
+            for pk, name in model.objects.filter(
+                    **{f"{name_field}__in": names}
+            ).values_list("pk", name_field):
+                found[name] = None if name in found else pk
+        return found
+
+    @staticmethod
+    def lookup(found, reference, name, errors):
+        if isinstance(reference, str) and reference.isdigit():
+            reference = int(reference)
+        elif not isinstance(reference, int):
+            reference = str(reference)
+        if reference not in found:
+            errors[name] = [f"No {name.replace('_', ' ')} {reference}."]
+            return None
+        if found[reference] is None:
+            errors[name] = [
+                f"More than one {name.replace('_', ' ')} is named "
+                f"{reference}; use its id."
+            ]
+        return found[reference]
+
+    @staticmethod
+    def durations(resolved):
+        if not resolved:
+            return {}
+        return {
+            pk: timedelta(minutes=duration)
+            for pk, duration in AstronomyShow.objects.filter(
+                pk__in={show_id for _, _, show_id, _ in resolved}
+            ).values_list("pk", "duration")
+        }
+
+    @staticmethod
+    def taken_sessions(resolved, durations):
+        """Existing sessions of the batch's domes around its times."""
+        taken = IntervalIndex()
+        if not resolved:
+            return taken
+        times = [show_time for _, show_time, _, _ in resolved]
+        for dome_id, show_time, ends_at in ShowSession.objects.filter(
+                planetarium_dome_id__in={
+                    dome_id for _, _, _, dome_id in resolved
+                },
+                show_time__gt=min(times) - timedelta(
+                    minutes=MAX_SHOW_DURATION
+                ),
+                show_time__lt=max(times) + max(durations.values()),
+        ).values_list("planetarium_dome_id", "show_time", "ends_at"):
+            taken.add(dome_id, show_time, ends_at)
+        return taken
+
+
+def _enforce_timezone(value):
+    if settings.USE_TZ and timezone.is_naive(value):
+        return timezone.make_aware(value)
+    if not settings.USE_TZ and timezone.is_aware(value):
+        return timezone.make_naive(value)
+    return value
+
+
+def import_schedule(rows, **kwargs):
+    return ScheduleImport(**kwargs).run(rows).result
@@ -0,0 +1,175 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+from rest_framework.exceptions import ValidationError
+
+from planetarium.models import MAX_SHOW_DURATION, ShowSession
+
+OVERLAP_CONSTRAINT = "showsession_dome_no_overlap"
+OVERLAP_MESSAGE = "Planetarium dome already has a session at this time."
+
+
+def _table():
+    return ShowSession._meta.db_table
+
+
+def _range_type():
+    return "tstzrange" if settings.USE_TZ else "tsrange"
+
+
+class PostgresScheduleBackend:
+    """GiST exclusion constraint over (dome, [show_time, ends_at)).
+
+    PostgreSQL itself rejects overlapping sessions of a dome, and the
+    constraint's index answers overlap lookups. It is installed by
+    migration 0010 when the existing sessions allow it, or later by
+    ``manage.py check_schedule --install``.
+    """
+
+    def install(self, cursor):
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        cursor.execute(
+            f"ALTER TABLE {_table()} DROP CONSTRAINT IF EXISTS "
+            f"{OVERLAP_CONSTRAINT}"
+        )
+        cursor.execute(
+            f"ALTER TABLE {_table()} ADD CONSTRAINT {OVERLAP_CONSTRAINT} "
+            f"EXCLUDE USING gist (planetarium_dome_id WITH =, "
+            f"{_range_type()}(show_time, ends_at) WITH &&)"
+        )
+
+    def uninstall(self, cursor):
+        cursor.execute(
+            f"ALTER TABLE {_table()} DROP CONSTRAINT IF EXISTS "
+            f"{OVERLAP_CONSTRAINT}"
+        )
+
+    def overlapping(self, queryset, start, end):
+        return queryset.filter(
+            RawSQL(
+                f"{_range_type()}({_table()}.show_time, {_table()}.ends_at) "
+                f"&& {_range_type()}(%s, %s)",
+                [start, end],
+                output_field=BooleanField(),
+            )
+        )
+
+
+class BasicScheduleBackend:
+    """Range scan of the (dome, show_time) index.
+
+    A session overlapping [start, end) starts before ``end`` and at
+    most MAX_SHOW_DURATION before ``start``, so only that slice of the
+    dome's sessions is read.
+    """
+
+    def install(self, cursor):
+        pass
+
+    def uninstall(self, cursor):
+        pass
+
+    def overlapping(self, queryset, start, end):
+        return queryset.filter(
+            show_time__gt=start - timedelta(minutes=MAX_SHOW_DURATION),
+            show_time__lt=end,
+            ends_at__gt=start,
+        )
+
+
+def get_schedule_backend(vendor=None):
+    vendor = vendor or connection.vendor
+    if vendor == "postgresql":
+        return PostgresScheduleBackend()
+    return BasicScheduleBackend()
+
+
+def is_overlap_violation(error):
+    return OVERLAP_CONSTRAINT in str(error)
+
+
+@contextmanager
+def overlap_constraint_errors():
+    """Save a session in a transaction, reporting overlaps as a 400.
+
+    The serializer checks for overlaps before the write and without a
+    lock, so a concurrent session can take the slot in between; on
+    PostgreSQL the overlap constraint then rejects the write.
+    """
+    try:
+        with transaction.atomic():
+            yield
+    except IntegrityError as error:
+        if not is_overlap_violation(error):
+            raise
+        raise ValidationError({"show_time": [OVERLAP_MESSAGE]})
+
+
+def overlapping_sessions(planetarium_dome_id, start, end, exclude_pk=None):
+    """Sessions of the dome that overlap [start, end)."""
+    queryset = ShowSession.objects.filter(
+        planetarium_dome_id=planetarium_dome_id
+    )
+    if exclude_pk is not None:
+        queryset = queryset.exclude(pk=exclude_pk)
+    return get_schedule_backend().overlapping(queryset, start, end)
+
+
+class IntervalIndex:
+    """Half-open [start, end) intervals by key, for overlap lookups.
+
+    Starts are kept sorted per key. No interval is longer than the
+    longest one added, so a lookup bisects to the candidates starting
+    within that distance before ``end`` and checks only those.
+    """
+
+    def __init__(self):
+        self.starts = defaultdict(list)
+        self.intervals = defaultdict(list)
+        self.longest = timedelta(0)
+
+    def add(self, key, start, end, value=None):
+        starts = self.starts[key]
+        position = bisect_right(starts, start)
+        starts.insert(position, start)
+        self.intervals[key].insert(position, (end, value))
+        self.longest = max(self.longest, end - start)
+
+    def overlapping(self, key, start, end):
+        """Values of the intervals of ``key`` overlapping [start, end)."""
+        starts = self.starts.get(key)
+        if not starts:
+            return []
+        intervals = self.intervals[key]
+        return [
+            intervals[position][1]
+            for position in range(
+                bisect_right(starts, start - self.longest),
+                bisect_left(starts, end),
+            )
+            if intervals[position][0] > start
+        ]
+
+    def __len__(self):
+        return sum(len(starts) for starts in self.starts.values())
+
+
+def find_overlaps(sessions):
+    """Pairs of overlapping (id, dome id, show_time, ends_at) sessions."""
+    index = IntervalIndex()
+    overlaps = []
+    for pk, dome_id, show_time, ends_at in sorted(
+            sessions, key=lambda session: (session[2], session[0])
+    ):
+        overlaps.extend(
+            (other, pk)
+            for other in index.overlapping(dome_id, show_time, ends_at)
+        )
+        index.add(dome_id, show_time, ends_at, pk)
+    return overlaps
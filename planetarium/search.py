@@ -0,0 +1,227 @@
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from planetarium.models import AstronomyShow
+
+SEARCH_CONFIG = "english"
+FTS_TABLE = "planetarium_astronomyshow_fts"
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def search_terms(query):
+    return TOKEN_RE.findall(query.lower())[:16]
+
+
+def _tables():
+    through = AstronomyShow.show_theme.through
+    return {
+        "show": AstronomyShow._meta.db_table,
+        "theme": AstronomyShow.show_theme.field.related_model._meta.db_table,
+        "link": through._meta.db_table,
+        "link_show": through._meta.get_field("astronomyshow").column,
+        "link_theme": through._meta.get_field("showtheme").column,
+    }
+
+
+class PostgresSearchBackend:
+    """Weighted tsvector column with a GIN index.
+
+    ``search_vector`` is created by migration 0006 outside the Django model
+    so other databases keep the plain table.
+    """
+
+    def install(self, cursor):
+        tables = _tables()
+        cursor.execute(
+            f"ALTER TABLE {tables['show']} "
+            f"ADD COLUMN IF NOT EXISTS search_vector tsvector"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS astronomyshow_search_gin "
+            f"ON {tables['show']} USING GIN (search_vector)"
+        )
+
+    def uninstall(self, cursor):
+        cursor.execute("DROP INDEX IF EXISTS astronomyshow_search_gin")
+        cursor.execute(
+            f"ALTER TABLE {_tables()['show']} "
+            f"DROP COLUMN IF EXISTS search_vector"
+        )
+
+    def index(self, cursor, show_ids=None):
+        tables = _tables()
+        sql = f"""
+            UPDATE {tables['show']} AS astronomy_show SET search_vector =
+                setweight(
+                    to_tsvector(%s, coalesce(astronomy_show.title, '')), 'A'
+                )
+                || setweight(to_tsvector(%s, coalesce((
+                    SELECT string_agg(theme.name, ' ')
+                    FROM {tables['theme']} AS theme
+                    JOIN {tables['link']} AS link
+                        ON link.{tables['link_theme']} = theme.id
+                    WHERE link.{tables['link_show']} = astronomy_show.id
+                ), '')), 'B')
+                || setweight(to_tsvector(
+                    %s, coalesce(astronomy_show.description, '')
+                ), 'C')
+        """
+        params = [SEARCH_CONFIG] * 3
+        if show_ids is not None:
+            sql += " WHERE astronomy_show.id = ANY(%s)"
+            params.append(list(show_ids))
+        cursor.execute(sql, params)
+
+    def remove(self, cursor, show_ids):
+        pass
+
+    def search(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+        tsquery = " & ".join(f"{term}:*" for term in terms)
+        table = _tables()["show"]
+        return queryset.filter(
+            id__in=RawSQL(
+                f"SELECT id FROM {table} "
+                f"WHERE search_vector @@ to_tsquery(%s, %s)",
+                [SEARCH_CONFIG, tsquery],
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f"ts_rank({table}.search_vector, to_tsquery(%s, %s))",
+                [SEARCH_CONFIG, tsquery],
+                output_field=FloatField(),
+            )
+        ).order_by("-search_rank", "title")
+
+
+class SQLiteSearchBackend:
+    """FTS5 table keyed by show id, ranked with column-weighted bm25."""
+
+    def install(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            f"USING fts5(title, themes, description)"
+        )
+
+    def uninstall(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+    def index(self, cursor, show_ids=None):
+        tables = _tables()
+        where = ""
+        params = []
+        if show_ids is not None:
+            show_ids = list(show_ids)
+            if not show_ids:
+                return
+            placeholders = ", ".join(["%s"] * len(show_ids))
+            where = f" WHERE astronomy_show.id IN ({placeholders})"
+            params = show_ids
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})",
+                params,
+            )
+        else:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"""
+            INSERT INTO {FTS_TABLE} (rowid, title, themes, description)
+            SELECT astronomy_show.id, astronomy_show.title, coalesce((
+                SELECT group_concat(theme.name, ' ')
+                FROM {tables['theme']} AS theme
+                JOIN {tables['link']} AS link
+                    ON link.{tables['link_theme']} = theme.id
+                WHERE link.{tables['link_show']} = astronomy_show.id
+            ), ''), astronomy_show.description
+            FROM {tables['show']} AS astronomy_show{where}
+            """,
+            params,
+        )
+
+    def remove(self, cursor, show_ids):
+        show_ids = list(show_ids)
+        if show_ids:
+            placeholders = ", ".join(["%s"] * len(show_ids))
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})",
+                show_ids,
+            )
+
+    def search(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+        match = " ".join(f'"{term}"*' for term in terms)
+        table = _tables()["show"]
+        return queryset.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+                [match],
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f"(SELECT -bm25({FTS_TABLE}, 10.0, 5.0, 1.0) "
+                f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"AND {FTS_TABLE}.rowid = {table}.id)",
+                [match],
+                output_field=FloatField(),
+            )
+        ).order_by("-search_rank", "title")
+
+
+class BasicSearchBackend:
+    """Unindexed fallback for databases without full-text support."""
+
+    def install(self, cursor):
+        pass
+
+    def uninstall(self, cursor):
+        pass
+
+    def index(self, cursor, show_ids=None):
+        pass
+
+    def remove(self, cursor, show_ids):
+        pass
+
+    def search(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+        for term in terms:
+            queryset = queryset.filter(
+                Q(title__icontains=term)
+                | Q(description__icontains=term)
+                | Q(show_theme__name__icontains=term)
+            )
+        return queryset.annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        ).order_by("title")
+
+
+def get_search_backend(vendor=None):
+    vendor = vendor or connection.vendor
+    if vendor == "postgresql":
+        return PostgresSearchBackend()
+    if vendor == "sqlite":
+        return SQLiteSearchBackend()
+    return BasicSearchBackend()
+
+
+def index_astronomy_shows(show_ids=None):
+    with connection.cursor() as cursor:
+        get_search_backend().index(cursor, show_ids)
+
+
+def remove_astronomy_shows(show_ids):
+    with connection.cursor() as cursor:
+        get_search_backend().remove(cursor, show_ids)
+
+
+def search_astronomy_shows(queryset, query):
+    return get_search_backend().search(queryset, query)
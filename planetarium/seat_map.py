@@ -0,0 +1,136 @@
+import base64
+
+from planetarium.models import SeatHold, ShowSession, Ticket
+
+
+class SeatMap:
+    """Packed occupancy bitmap of a show session.
+
+    Seat ``(row, seat)`` maps to bit ``(row - 1) * seats_in_row + seat - 1``;
+    bits are packed most significant bit first, so bit 0 is the high bit
+    of the first byte.
+    """
+
+    def __init__(self, rows: int, seats_in_row: int, bits: bytes = None):
+        self.rows = rows
+        self.seats_in_row = seats_in_row
+        size = (rows * seats_in_row + 7) // 8
+        self.bits = bytearray(bits) if bits is not None else bytearray(size)
+
+    @classmethod
+    def for_show_session(
+            cls,
+            show_session: ShowSession,
+            include_holds: bool = True,
+            exclude_user=None,
+    ) -> "SeatMap":
+        planetarium_dome = show_session.planetarium_dome
+        seat_map = cls(planetarium_dome.rows, planetarium_dome.seats_in_row)
+        seat_map.mark_many(
+            Ticket.objects.filter(
+                show_session=show_session
+            ).values_list("row", "seat").order_by()
+        )
+        if include_holds:
+            seat_holds = SeatHold.active().filter(show_session=show_session)
+            if exclude_user is not None:
+                seat_holds = seat_holds.exclude(user=exclude_user)
+            for seats in seat_holds.values_list("seats", flat=True):
+                seat_map.merge(seats)
+        return seat_map
+
+    @property
+    def capacity(self) -> int:
+        return self.rows * self.seats_in_row
+
+    def _index(self, row: int, seat: int) -> int:
+        if not (1 <= row <= self.rows and 1 <= seat <= self.seats_in_row):
+            raise IndexError(f"Seat ({row}, {seat}) is outside the dome")
+        return (row - 1) * self.seats_in_row + seat - 1
+
+    def mark(self, row: int, seat: int) -> None:
+        index = self._index(row, seat)
+        self.bits[index >> 3] |= 0x80 >> (index & 7)
+
+    def mark_many(self, places) -> None:
+        for row, seat in places:
+            self.mark(row, seat)
+
+    def merge(self, bits) -> None:
+        for index, byte in enumerate(bytes(bits)[:len(self.bits)]):
+            self.bits[index] |= byte
+
+    def places(self):
+        for byte_index, byte in enumerate(self.bits):
+            if not byte:
+                continue
+            for bit in range(8):
+                if byte & (0x80 >> bit):
+                    index = byte_index * 8 + bit
+                    yield (
+                        index // self.seats_in_row + 1,
+                        index % self.seats_in_row + 1,
+                    )
+
+    def is_taken(self, row: int, seat: int) -> bool:
+        index = self._index(row, seat)
+        return bool(self.bits[index >> 3] & (0x80 >> (index & 7)))
+
+    def best_block(self, size: int, rows=None, centre: bool = True):
+        """``(row, seat)`` starting the best ``size`` adjacent free seats.
+
+        ``rows`` limits the search to an inclusive ``(first, last)``
+        range; either end may be None. With ``centre`` the block nearest
+        the middle of the dome wins, otherwise the front-most, left-most
+        one. Every seat is read once; None when no row has such a block.
+        """
+        first, last = rows or (None, None)
+        first = max(first or 1, 1)
+        last = min(last or self.rows, self.rows)
+        middle_row = (self.rows + 1) / 2
+        middle_seat = (self.seats_in_row + 1) / 2
+        best = None
+        best_score = None
+        for row in range(first, last + 1):
+            offset = (row - 1) * self.seats_in_row
+            run_start = None
+            for seat in range(1, self.seats_in_row + 2):
+                index = offset + seat - 1
+                free = seat <= self.seats_in_row and not (
+                    self.bits[index >> 3] & (0x80 >> (index & 7))
+                )
+                if free:
+                    if run_start is None:
+                        run_start = seat
+                    continue
+                if run_start is None or seat - run_start < size:
+                    run_start = None
+                    continue
+                if not centre:
+                    return row, run_start
+                # the start nearest the middle within the free run
+                ideal = middle_seat - (size - 1) / 2
+                for start in {int(ideal), int(ideal + 0.5)}:
+                    start = min(max(start, run_start), seat - size)
+                    score = (
+                        (row - middle_row) ** 2
+                        + (start + (size - 1) / 2 - middle_seat) ** 2,
+                        row,
+                        start,
+                    )
+                    if best_score is None or score < best_score:
+                        best, best_score = (row, start), score
+                run_start = None
+        return best
+
+    @property
+    def taken(self) -> int:
+        return sum(bin(byte).count("1") for byte in self.bits)
+
+    @property
+    def available(self) -> int:
+        return self.capacity - self.taken
+
+    @property
+    def bitmap(self) -> str:
+        return base64.b64encode(bytes(self.bits)).decode("ascii")
@@ -1,15 +1,29 @@
-from django.db import transaction
+from collections import Counter
+
+from django.core.files.storage import default_storage
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
+from planetarium.booking import (
+    HELD_MESSAGE,
+    TAKEN_MESSAGE,
+    book_tickets,
+    check_capacity,
+)
+from planetarium.holds import hold_seats, seat_hold_max_seats
+from planetarium.images import THUMBNAIL
 from planetarium.models import (
     PlanetariumDome,
     ShowTheme,
     AstronomyShow,
     ShowSession,
     Reservation,
+    SeatHold,
     Ticket
 )
+from planetarium.scheduling import OVERLAP_MESSAGE, overlapping_sessions
+from planetarium.seat_map import SeatMap
 
 
 class PlanetariumDomeSerializer(serializers.ModelSerializer):
@@ -24,10 +38,57 @@ class ShowThemeSerializer(serializers.ModelSerializer):
         fields = ("id", "name")
 
 
+IMAGE_URLS_SCHEMA = {
+    "type": "object",
+    "additionalProperties": {"type": "string", "format": "uri"},
+    "description": "Image URL by format (jpeg, webp, avif)",
+}
+
+
+@extend_schema_field(
+    {"type": "object", "additionalProperties": IMAGE_URLS_SCHEMA}
+)
+class ImageVariantsField(serializers.Field):
+    """URLs of every rendered variant of ``AstronomyShow.image``."""
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def image_urls(self, formats):
+        request = self.context.get("request")
+        urls = {}
+        for image_format, name in formats.items():
+            url = default_storage.url(name)
+            urls[image_format] = (
+                request.build_absolute_uri(url) if request else url
+            )
+        return urls
+
+    def to_representation(self, value):
+        return {
+            variant: self.image_urls(formats)
+            for variant, formats in value.items()
+        }
+
+
+@extend_schema_field({**IMAGE_URLS_SCHEMA, "nullable": True})
+class ImageVariantField(ImageVariantsField):
+    """URLs of one variant, null until it is rendered."""
+
+    def __init__(self, variant, **kwargs):
+        self.variant = variant
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        formats = value.get(self.variant)
+        return self.image_urls(formats) if formats else None
+
+
 class AstronomyShowSerializer(serializers.ModelSerializer):
     class Meta:
         model = AstronomyShow
-        fields = ("id", "title", "description", "show_theme")
+        fields = ("id", "title", "description", "duration", "show_theme")
 
 
 class AstronomyShowListSerializer(AstronomyShowSerializer):
@@ -36,30 +97,68 @@ class AstronomyShowListSerializer(AstronomyShowSerializer):
         read_only=True,
         slug_field="name"
     )
+    image_thumbnail = ImageVariantField(THUMBNAIL, source="image_variants")
 
     class Meta:
         model = AstronomyShow
-        fields = ("id", "title", "show_theme", "image")
+        fields = ("id", "title", "show_theme", "image", "image_thumbnail")
 
 
 class AstronomyShowDetailSerializer(AstronomyShowSerializer):
     show_theme = ShowThemeSerializer(many=True, read_only=True)
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = AstronomyShow
-        fields = ("id", "title", "show_theme", "description", "image")
+        fields = (
+            "id",
+            "title",
+            "show_theme",
+            "description",
+            "duration",
+            "image",
+            "image_variants"
+        )
 
 
 class AstronomyShowImageSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = AstronomyShow
-        fields = ("id", "image")
+        fields = ("id", "image", "image_variants")
 
 
 class ShowSessionSerializer(serializers.ModelSerializer):
+    def validate(self, attrs):
+        data = super(ShowSessionSerializer, self).validate(attrs=attrs)
+        names = ("show_time", "astronomy_show", "planetarium_dome")
+        if not set(names) & set(attrs):
+            return data
+        values = {
+            name: attrs[name] if name in attrs
+            else getattr(self.instance, name, None)
+            for name in names
+        }
+        if overlapping_sessions(
+                values["planetarium_dome"].pk,
+                values["show_time"],
+                values["show_time"]
+                + values["astronomy_show"].session_duration,
+                exclude_pk=getattr(self.instance, "pk", None),
+        ).exists():
+            raise ValidationError({"show_time": [OVERLAP_MESSAGE]})
+        return data
+
     class Meta:
         model = ShowSession
-        fields = ("id", "show_time", "astronomy_show", "planetarium_dome")
+        fields = (
+            "id",
+            "show_time",
+            "ends_at",
+            "astronomy_show",
+            "planetarium_dome"
+        )
 
 
 class ShowSessionListSerializer(ShowSessionSerializer):
@@ -75,6 +174,10 @@ class ShowSessionListSerializer(ShowSessionSerializer):
         source="astronomy_show.image",
         read_only=True
     )
+    astronomy_show_thumbnail = ImageVariantField(
+        THUMBNAIL,
+        source="astronomy_show.image_variants"
+    )
     tickets_available = serializers.IntegerField(read_only=True)
     planetarium_dome_capacity = serializers.IntegerField(
         source="planetarium_dome.capacity",
@@ -88,10 +191,24 @@ class ShowSessionListSerializer(ShowSessionSerializer):
             "show_time",
             "astronomy_show_title",
             "astronomy_show_image",
+            "astronomy_show_thumbnail",
             "planetarium_dome_name",
             "planetarium_dome_capacity",
             "tickets_available"
         )
+        fast_values = {
+            "planetarium_dome_capacity": PlanetariumDome.capacity_expression(
+                "planetarium_dome__"
+            ),
+            "tickets_available": ShowSession.tickets_available_expression(),
+        }
+        query_fields = {
+            "tickets_available": (
+                "tickets_sold",
+                "planetarium_dome__rows",
+                "planetarium_dome__seats_in_row",
+            ),
+        }
 
 
 class TicketSerializer(serializers.ModelSerializer):
@@ -110,6 +227,88 @@ class TicketSerializer(serializers.ModelSerializer):
         fields = ("id", "row", "seat", "show_session")
 
 
+class BatchedShowSessionField(serializers.PrimaryKeyRelatedField):
+    def to_internal_value(self, data):
+        list_serializer = getattr(self.parent, "parent", None)
+        show_sessions = getattr(list_serializer, "show_sessions", None)
+        if show_sessions is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return show_sessions[int(data)]
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+
+
+class ReservationTicketListSerializer(serializers.ListSerializer):
+    unique_message = TAKEN_MESSAGE
+    held_message = HELD_MESSAGE
+
+    def to_internal_value(self, data):
+        self.show_sessions = None
+        if isinstance(data, list):
+            self.show_sessions = self.child.fields[
+                "show_session"
+            ].get_queryset().in_bulk(self._show_session_pks(data))
+        try:
+            tickets_data = super().to_internal_value(data)
+        finally:
+            self.show_sessions = None
+
+        seen_places = set()
+        errors = []
+        for ticket_data in tickets_data:
+            place = (
+                ticket_data["show_session"].id,
+                ticket_data["row"],
+                ticket_data["seat"],
+            )
+            if place in seen_places:
+                errors.append(
+                    {"non_field_errors": [self.unique_message]}
+                )
+            else:
+                errors.append({})
+            seen_places.add(place)
+        if any(errors):
+            raise ValidationError(errors)
+
+        # sold-out fast path on the counters loaded above; the exact check
+        # runs again under the show session lock in book_tickets
+        show_sessions = {
+            ticket_data["show_session"].id: ticket_data["show_session"]
+            for ticket_data in tickets_data
+        }
+        for show_session_id, requested in Counter(
+                ticket_data["show_session"].id for ticket_data in tickets_data
+        ).items():
+            check_capacity(show_sessions[show_session_id], requested)
+        return tickets_data
+
+    @staticmethod
+    def _show_session_pks(data):
+        pks = set()
+        for item in data:
+            try:
+                pks.add(int(item["show_session"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+        return pks
+
+
+class ReservationTicketSerializer(TicketSerializer):
+    show_session = BatchedShowSessionField(
+        queryset=ShowSession.objects.select_related("planetarium_dome")
+    )
+
+    class Meta(TicketSerializer.Meta):
+        validators = []
+        list_serializer_class = ReservationTicketListSerializer
+
+
 class TicketListSerializer(TicketSerializer):
     show_session = ShowSessionListSerializer(many=False, read_only=True)
 
@@ -121,40 +320,222 @@ class TicketSeatSerializer(TicketSerializer):
 
 
 class ShowSessionDetailSerializer(ShowSessionSerializer):
-    astronomy_show = ShowSessionListSerializer(many=False, read_only=True)
+    astronomy_show = AstronomyShowListSerializer(many=False, read_only=True)
     planetarium_dome = PlanetariumDomeSerializer(many=False, read_only=True)
-    taken_places = TicketSeatSerializer(
-        source="tickets",
-        many=True,
-        read_only=True
-    )
+    taken_places = serializers.SerializerMethodField()
 
     class Meta:
         model = ShowSession
         fields = (
             "id",
             "show_time",
+            "ends_at",
             "astronomy_show",
             "planetarium_dome",
             "taken_places"
         )
+        query_fields = {
+            "taken_places": (
+                "planetarium_dome__rows",
+                "planetarium_dome__seats_in_row",
+            ),
+        }
+
+    @extend_schema_field(TicketSeatSerializer(many=True))
+    def get_taken_places(self, show_session):
+        return [
+            {"row": row, "seat": seat}
+            for row, seat in SeatMap.for_show_session(show_session).places()
+        ]
+
+
+class SeatMapSerializer(serializers.Serializer):
+    rows = serializers.IntegerField(read_only=True)
+    seats_in_row = serializers.IntegerField(read_only=True)
+    taken = serializers.IntegerField(read_only=True)
+    available = serializers.IntegerField(read_only=True)
+    bitmap = serializers.CharField(
+        read_only=True,
+        help_text=(
+            "Base64 of the packed occupancy bitset, one bit per seat in "
+            "row-major order, most significant bit first"
+        )
+    )
 
 
 class ReservationSerializer(serializers.ModelSerializer):
-    tickets = TicketSerializer(many=True, read_only=False, allow_empty=False)
+    tickets = ReservationTicketSerializer(
+        many=True,
+        read_only=False,
+        allow_empty=False
+    )
 
     class Meta:
         model = Reservation
         fields = ("id", "tickets", "created_at")
 
     def create(self, validated_data):
-        with transaction.atomic():
-            tickets_data = validated_data.pop("tickets")
-            reservation = Reservation.objects.create(**validated_data)
-            for ticket_data in tickets_data:
-                Ticket.objects.create(reservation=reservation, **ticket_data)
-            return reservation
+        tickets_data = validated_data.pop("tickets")
+        return book_tickets(tickets_data, **validated_data)
 
 
 class ReservationListSerializer(ReservationSerializer):
     tickets = TicketListSerializer(many=True, read_only=True)
+
+
+class SeatSerializer(serializers.Serializer):
+    row = serializers.IntegerField()
+    seat = serializers.IntegerField()
+
+
+class SeatHoldSerializer(serializers.ModelSerializer):
+    seats = SeatSerializer(many=True, allow_empty=False, source="held_places")
+
+    class Meta:
+        model = SeatHold
+        fields = ("id", "show_session", "seats", "expires_at")
+        read_only_fields = ("expires_at",)
+        query_fields = {
+            "seats": (
+                "seats",
+                "show_session__planetarium_dome__rows",
+                "show_session__planetarium_dome__seats_in_row",
+            ),
+        }
+
+    def create(self, validated_data):
+        return hold_seats(
+            validated_data["show_session"].id,
+            validated_data["user"],
+            validated_data["held_places"],
+        )
+
+
+class BestAvailableSerializer(serializers.Serializer):
+    party_size = serializers.IntegerField(min_value=1)
+    row_from = serializers.IntegerField(min_value=1, required=False)
+    row_to = serializers.IntegerField(min_value=1, required=False)
+    centre = serializers.BooleanField(
+        default=True,
+        help_text=(
+            "Prefer the block nearest the middle of the dome rather than "
+            "the front-most one"
+        )
+    )
+    hold = serializers.BooleanField(
+        default=False, help_text="Hold the seats found for the party"
+    )
+
+    def validate_party_size(self, value):
+        if value > seat_hold_max_seats():
+            raise ValidationError(
+                f"At most {seat_hold_max_seats()} seats can be held"
+            )
+        return value
+
+    def validate(self, attrs):
+        row_from = attrs.get("row_from")
+        row_to = attrs.get("row_to")
+        if row_from and row_to and row_from > row_to:
+            raise ValidationError(
+                {"row_to": "Must not be less than row_from."}
+            )
+        return attrs
+
+
+class BestAvailableResultSerializer(serializers.Serializer):
+    seats = SeatSerializer(many=True, read_only=True)
+    hold = SeatHoldSerializer(read_only=True, allow_null=True)
+
+
+class ScheduleImportSerializer(serializers.Serializer):
+    file = serializers.FileField(
+        required=False,
+        help_text=(
+            "CSV with a show_time,astronomy_show,planetarium_dome header "
+            "or a JSON array of such objects"
+        )
+    )
+    sessions = serializers.ListField(
+        child=serializers.DictField(), required=False
+    )
+    partial = serializers.BooleanField(
+        default=False, help_text="Keep the valid rows when some fail"
+    )
+    dry_run = serializers.BooleanField(
+        default=False, help_text="Validate without creating anything"
+    )
+
+    def validate(self, attrs):
+        if ("file" in attrs) == ("sessions" in attrs):
+            raise ValidationError("Send either a file or sessions.")
+        return attrs
+
+
+class ScheduleImportRowErrorSerializer(serializers.Serializer):
+    row = serializers.IntegerField(read_only=True)
+    errors = serializers.DictField(
+        child=serializers.ListField(child=serializers.CharField()),
+        read_only=True
+    )
+
+
+class ScheduleImportResultSerializer(serializers.Serializer):
+    created = serializers.IntegerField(read_only=True)
+    errors = ScheduleImportRowErrorSerializer(many=True, read_only=True)
+
+
+class ProfileSummarySerializer(serializers.Serializer):
+    id = serializers.CharField(read_only=True)
+    created_at = serializers.FloatField(read_only=True)
+    trigger = serializers.CharField(read_only=True)
+    method = serializers.CharField(read_only=True)
+    path = serializers.CharField(read_only=True)
+    view = serializers.CharField(read_only=True, allow_null=True)
+    status = serializers.IntegerField(read_only=True)
+    duration_ms = serializers.FloatField(read_only=True)
+    queries_count = serializers.IntegerField(read_only=True)
+
+
+class ProfileSerializer(ProfileSummarySerializer):
+    queries_ms = serializers.FloatField(read_only=True)
+    queries = serializers.JSONField(read_only=True)
+    functions = serializers.JSONField(read_only=True)
+    stacks = serializers.DictField(
+        child=serializers.IntegerField(),
+        read_only=True,
+        help_text="Wall-clock samples per folded stack"
+    )
+    sample_interval_ms = serializers.FloatField(read_only=True)
+
+
+class ProfileTokenSerializer(serializers.Serializer):
+    token = serializers.CharField(read_only=True)
+    header = serializers.CharField(read_only=True)
+    expires_in = serializers.IntegerField(read_only=True)
+
+
+class FillRateSerializer(serializers.Serializer):
+    id = serializers.IntegerField(read_only=True)
+    name = serializers.CharField(read_only=True)
+    day = serializers.DateField(read_only=True, required=False)
+    sessions = serializers.IntegerField(read_only=True)
+    seats = serializers.IntegerField(read_only=True)
+    tickets_sold = serializers.IntegerField(read_only=True)
+    fill_rate = serializers.FloatField(read_only=True)
+
+
+class SellThroughPointSerializer(serializers.Serializer):
+    days_before = serializers.IntegerField(read_only=True)
+    tickets_sold = serializers.IntegerField(read_only=True)
+    cumulative_tickets_sold = serializers.IntegerField(read_only=True)
+    sell_through = serializers.FloatField(
+        read_only=True,
+        help_text="Share of the seats sold this many days ahead or earlier"
+    )
+
+
+class SellThroughSerializer(serializers.Serializer):
+    seats = serializers.IntegerField(read_only=True)
+    tickets_sold = serializers.IntegerField(read_only=True)
+    curve = SellThroughPointSerializer(many=True, read_only=True)
@@ -0,0 +1,283 @@
+from contextvars import ContextVar
+
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from planetarium.analytics import (
+    record_ticket_sales,
+    record_sessions,
+    refresh_rollups,
+    refresh_sell_through,
+    refresh_theme_rollups,
+    reservation_sales,
+    ticket_sales,
+)
+from planetarium.cache import bump_model_version
+from planetarium.models import (
+    AstronomyShow,
+    PlanetariumDome,
+    Reservation,
+    SeatHold,
+    ShowSession,
+    ShowTheme,
+    Ticket,
+)
+from planetarium.search import index_astronomy_shows, remove_astronomy_shows
+
+# Models the cached and conditional endpoints serialize; writes to any
+# other model (slow query log, sales rollups) keep their responses.
+VERSIONED_MODELS = (
+    ShowTheme,
+    PlanetariumDome,
+    AstronomyShow,
+    ShowSession,
+    Reservation,
+    Ticket,
+    SeatHold,
+)
+
+# Show sessions whose own deletion cascades to their tickets; their
+# counters are not worth decrementing ticket by ticket.
+_deleted_show_session_ids = ContextVar(
+    "deleted_show_session_ids", default=frozenset()
+)
+# Reservations being deleted; their tickets leave the rollups at once.
+_deleted_reservation_ids = ContextVar(
+    "deleted_reservation_ids", default=frozenset()
+)
+
+
+@receiver(post_save, sender=Ticket)
+def count_ticket_sold(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ShowSession.add_tickets_sold([instance.show_session_id])
+
+
+@receiver(post_delete, sender=Ticket)
+def count_ticket_returned(sender, instance, **kwargs):
+    if instance.show_session_id not in _deleted_show_session_ids.get():
+        ShowSession.remove_tickets_sold([instance.show_session_id])
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Ticket)
+@receiver(post_save, sender=SeatHold)
+@receiver(post_delete, sender=SeatHold)
+def bump_show_session_version(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_model_version(ShowSession, instance.show_session_id)
+
+
+@receiver(pre_delete, sender=ShowSession)
+def start_show_session_delete(sender, instance, **kwargs):
+    _deleted_show_session_ids.set(
+        _deleted_show_session_ids.get() | {instance.pk}
+    )
+
+
+@receiver(post_delete, sender=ShowSession)
+def finish_show_session_delete(sender, instance, **kwargs):
+    _deleted_show_session_ids.set(
+        _deleted_show_session_ids.get() - {instance.pk}
+    )
+
+
+def bump_version_on_write(sender, raw=False, **kwargs):
+    if not raw:
+        bump_model_version(sender)
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_version_on_write, sender=model)
+    post_delete.connect(bump_version_on_write, sender=model)
+
+
+@receiver(m2m_changed, sender=AstronomyShow.show_theme.through)
+def bump_version_on_m2m_change(sender, instance, action, model, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_model_version(type(instance))
+        bump_model_version(model)
+
+
+@receiver(post_save, sender=AstronomyShow)
+def index_astronomy_show(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_astronomy_shows([instance.pk])
+
+
+@receiver(post_delete, sender=AstronomyShow)
+def unindex_astronomy_show(sender, instance, **kwargs):
+    remove_astronomy_shows([instance.pk])
+
+
+@receiver(m2m_changed, sender=AstronomyShow.show_theme.through)
+def index_astronomy_show_themes(
+        sender, instance, action, reverse, pk_set, **kwargs
+):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            index_astronomy_shows([instance.pk])
+    elif action == "pre_clear":
+        instance._search_show_ids = list(
+            instance.astronomyshow_set.values_list("id", flat=True)
+        )
+    elif action == "post_clear":
+        index_astronomy_shows(instance._search_show_ids)
+    elif action in ("post_add", "post_remove"):
+        index_astronomy_shows(pk_set)
+
+
+@receiver(post_save, sender=ShowTheme)
+def reindex_renamed_show_theme(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        index_astronomy_shows(
+            instance.astronomyshow_set.values_list("id", flat=True)
+        )
+
+
+@receiver(pre_delete, sender=ShowTheme)
+def collect_show_theme_shows(sender, instance, **kwargs):
+    instance._search_show_ids = list(
+        instance.astronomyshow_set.values_list("id", flat=True)
+    )
+
+
+@receiver(post_delete, sender=ShowTheme)
+def reindex_deleted_show_theme(sender, instance, **kwargs):
+    index_astronomy_shows(getattr(instance, "_search_show_ids", []))
+
+
+@receiver(post_save, sender=Ticket)
+def record_ticket_sale(sender, instance, created, raw=False, **kwargs):
+    # book_tickets bulk creates and records its tickets itself
+    if created and not raw:
+        record_ticket_sales(ticket_sales([instance]))
+
+
+@receiver(post_delete, sender=Ticket)
+def record_ticket_return(sender, instance, **kwargs):
+    if (
+        instance.show_session_id not in _deleted_show_session_ids.get()
+        and instance.reservation_id not in _deleted_reservation_ids.get()
+    ):
+        record_ticket_sales(ticket_sales([instance]), sign=-1)
+
+
+@receiver(pre_delete, sender=Reservation)
+def start_reservation_delete(sender, instance, **kwargs):
+    instance._analytics_sales = reservation_sales([instance.pk])
+    _deleted_reservation_ids.set(
+        _deleted_reservation_ids.get() | {instance.pk}
+    )
+
+
+@receiver(post_delete, sender=Reservation)
+def finish_reservation_delete(sender, instance, **kwargs):
+    _deleted_reservation_ids.set(
+        _deleted_reservation_ids.get() - {instance.pk}
+    )
+    record_ticket_sales(getattr(instance, "_analytics_sales", []), sign=-1)
+
+
+def _session_totals(show_session):
+    return (
+        show_session.astronomy_show_id,
+        show_session.planetarium_dome_id,
+        show_session.show_time,
+        show_session.planetarium_dome.capacity,
+        show_session.tickets_sold,
+    )
+
+
+@receiver(pre_save, sender=ShowSession)
+def remember_show_session_totals(sender, instance, raw=False, **kwargs):
+    if not raw and not instance._state.adding:
+        previous = ShowSession.objects.filter(pk=instance.pk).values_list(
+            "astronomy_show_id",
+            "planetarium_dome_id",
+            "show_time",
+            "planetarium_dome__rows",
+            "planetarium_dome__seats_in_row",
+            "tickets_sold",
+        ).first()
+        if previous:
+            show_id, dome_id, show_time, rows, seats_in_row, sold = previous
+            instance._analytics_totals = (
+                show_id, dome_id, show_time, rows * seats_in_row, sold
+            )
+
+
+@receiver(post_save, sender=ShowSession)
+def record_show_session(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_analytics_totals", None)
+    current = _session_totals(instance)
+    if previous == current:
+        return
+    record_sessions(added=[current], removed=[previous] if previous else [])
+    if previous and current[4] and (
+            previous[0] != current[0] or previous[2] != current[2]
+    ):
+        refresh_sell_through({previous[0], current[0]})
+
+
+@receiver(post_delete, sender=ShowSession)
+def record_deleted_show_session(sender, instance, **kwargs):
+    record_sessions(removed=[_session_totals(instance)])
+    if instance.tickets_sold:
+        refresh_sell_through({instance.astronomy_show_id})
+
+
+@receiver(pre_save, sender=PlanetariumDome)
+def remember_dome_capacity(sender, instance, raw=False, **kwargs):
+    if not raw and not instance._state.adding:
+        instance._analytics_capacity = PlanetariumDome.objects.filter(
+            pk=instance.pk
+        ).values_list("rows", "seats_in_row").first()
+
+
+@receiver(post_save, sender=PlanetariumDome)
+def refresh_resized_dome_rollups(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, "_analytics_capacity", None)
+    if raw or not previous or previous[0] * previous[1] == instance.capacity:
+        return
+    refresh_rollups(
+        instance.show_sessions.values_list(
+            "astronomy_show_id", flat=True
+        ).distinct(),
+        [instance.pk],
+    )
+
+
+@receiver(pre_delete, sender=AstronomyShow)
+def collect_astronomy_show_themes(sender, instance, **kwargs):
+    instance._analytics_theme_ids = list(
+        instance.show_theme.values_list("id", flat=True)
+    )
+
+
+@receiver(post_delete, sender=AstronomyShow)
+def refresh_deleted_show_theme_rollups(sender, instance, **kwargs):
+    refresh_theme_rollups(getattr(instance, "_analytics_theme_ids", []))
+
+
+@receiver(m2m_changed, sender=AstronomyShow.show_theme.through)
+def refresh_show_theme_rollups(
+        sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action == "pre_clear":
+        instance._analytics_theme_ids = (
+            [instance.pk] if reverse
+            else list(instance.show_theme.values_list("id", flat=True))
+        )
+    elif action == "post_clear":
+        refresh_theme_rollups(getattr(instance, "_analytics_theme_ids", []))
+    elif action in ("post_add", "post_remove"):
+        refresh_theme_rollups([instance.pk] if reverse else pk_set)
@@ -0,0 +1,192 @@
+import hashlib
+import re
+import time
+import traceback
+
+from django.conf import settings
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    DatabaseError,
+    IntegrityError,
+    connections,
+    transaction,
+)
+from django.db.models import F
+from django.utils import timezone
+
+from planetarium.metrics import view_name
+from planetarium.models import SlowQuery
+
+DEFAULT_SLOW_QUERIES = {
+    "THRESHOLD_MS": 200.0,
+    "ANALYZE": False,
+    "STACK_DEPTH": 12,
+}
+MAX_PARAMS_LENGTH = 2000
+
+_STRING_RE = re.compile(r"'(?:''|[^'])*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%s|\?")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def _config():
+    return {
+        **DEFAULT_SLOW_QUERIES,
+        **getattr(settings, "PLANETARIUM_SLOW_QUERIES", {}),
+    }
+
+
+def normalize_sql(sql):
+    """SQL with literals and placeholder lists collapsed.
+
+    ``IN (%s, %s)`` and ``IN (%s, %s, %s)`` normalize alike, so one
+    query shape gets one record whatever its parameters.
+    """
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _PLACEHOLDER_RE.sub("?", sql)
+    sql = _LIST_RE.sub("(...)", sql)
+    return _SPACE_RE.sub(" ", sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize_sql(sql).encode()).hexdigest()
+
+
+def _stack(depth):
+    frames = [
+        frame for frame in traceback.extract_stack()[:-3]
+        if "site-packages" not in frame.filename
+        and frame.filename.startswith(str(settings.BASE_DIR))
+    ]
+    return "".join(traceback.format_list(frames[-depth:]))
+
+
+def explain(connection, sql, params, analyze=False):
+    if not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+        return ""
+    options = {}
+    if analyze and connection.vendor == "postgresql":
+        options["analyze"] = True
+    prefix = connection.ops.explain_query_prefix(**options)
+    try:
+        # a failed EXPLAIN must not poison an enclosing transaction
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(f"{prefix} {sql}", params)
+                rows = cursor.fetchall()
+    except DatabaseError as error:
+        return f"EXPLAIN failed: {error}"
+    return "\n".join(" ".join(str(column) for column in row) for row in rows)
+
+
+def record_slow_query(connection, query, analyze=False):
+    duration_ms = query["duration_ms"]
+    key = fingerprint(query["sql"])
+    now = timezone.now()
+    counted = SlowQuery.objects.filter(fingerprint=key).update(
+        count=F("count") + 1,
+        total_ms=F("total_ms") + duration_ms,
+        last_seen=now,
+    )
+    worst = {
+        "sql": query["sql"],
+        "params": repr(query["params"])[:MAX_PARAMS_LENGTH],
+        "view": query["view"],
+        "stack": query["stack"],
+        "worst_ms": duration_ms,
+    }
+    if counted:
+        # plans are only refreshed for a new worst case
+        worse = SlowQuery.objects.filter(
+            fingerprint=key, worst_ms__lt=duration_ms
+        )
+        if worse.exists():
+            worse.update(
+                explain=explain(
+                    connection, query["sql"], query["params"], analyze
+                ),
+                **worst,
+            )
+        return
+    try:
+        with transaction.atomic(using=connection.alias):
+            SlowQuery.objects.create(
+                fingerprint=key,
+                explain=explain(
+                    connection, query["sql"], query["params"], analyze
+                ),
+                count=1,
+                total_ms=duration_ms,
+                **worst,
+            )
+    except IntegrityError:
+        # another process recorded the same shape in the meantime
+        SlowQuery.objects.filter(fingerprint=key).update(
+            count=F("count") + 1,
+            total_ms=F("total_ms") + duration_ms,
+            last_seen=now,
+        )
+
+
+class SlowQueryRecorder:
+    def __init__(self, threshold_ms, stack_depth):
+        self.threshold_ms = threshold_ms
+        self.stack_depth = stack_depth
+        self.view = None
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            if (
+                    self.view is not None
+                    and not many
+                    and duration_ms >= self.threshold_ms
+            ):
+                self.queries.append({
+                    "sql": sql,
+                    "params": params,
+                    "view": self.view,
+                    "stack": _stack(self.stack_depth),
+                    "duration_ms": duration_ms,
+                })
+
+
+class SlowQueryMiddleware:
+    """Record queries of planetarium views slower than THRESHOLD_MS.
+
+    Queries are only collected while the view runs; fingerprints,
+    EXPLAIN and the ``SlowQuery`` upserts happen once the response is
+    ready, with the recorder detached.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = _config()
+        recorder = SlowQueryRecorder(
+            config["THRESHOLD_MS"], config["STACK_DEPTH"]
+        )
+        request.slow_query_recorder = recorder
+        connection = connections[DEFAULT_DB_ALIAS]
+        connection.execute_wrappers.append(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            connection.execute_wrappers.pop()
+        for query in recorder.queries:
+            record_slow_query(connection, query, config["ANALYZE"])
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        recorder = getattr(request, "slow_query_recorder", None)
+        module = getattr(view_func, "__module__", "") or ""
+        if recorder is not None and module.startswith("planetarium."):
+            recorder.view = view_name(request, view_func)
@@ -1,26 +1,88 @@
+import base64
+import csv
+import json
 import os.path
+import pstats
+import shutil
+import subprocess
+import sys
 import tempfile
+import uuid
+from datetime import date, datetime, timedelta
+from collections import Counter, OrderedDict
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
 
 from PIL import Image
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
 from rest_framework import status
+from rest_framework.exceptions import ErrorDetail, ValidationError
+from rest_framework.renderers import JSONRenderer
 
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 from planetarium.models import (
     ShowTheme,
     AstronomyShow,
     ShowSession,
-    PlanetariumDome
+    PlanetariumDome,
+    Reservation,
+    SeatHold,
+    SlowQuery,
+    Ticket,
+    ShowDailySales,
+    DomeDailySales,
+    ThemeDailySales,
+    ShowSellThrough
 )
+from planetarium.analytics import ROLLUPS, rebuild_rollups
+from planetarium.holds import hold_seats
+from planetarium.images import get_image_executors, render_variants
+from planetarium.fast_serializers import get_compiled_serializer
+from planetarium.metrics import DEFAULT_METRICS, MetricsRegistry
+from planetarium.slow_queries import fingerprint
+from planetarium.cache import (
+    VERSION_KEY_PREFIX,
+    FileResponseCache,
+    LocMemResponseCache,
+    check_version_cache,
+    get_response_cache,
+)
+from planetarium.query_planning import get_query_plan
+from planetarium.exports import TICKET_COLUMNS, csv_chunks
+from planetarium.schedule_import import ScheduleImport
+from planetarium.scheduling import (
+    OVERLAP_CONSTRAINT,
+    OVERLAP_MESSAGE,
+    IntervalIndex,
+    overlap_constraint_errors,
+)
+from planetarium.seat_map import SeatMap
+from planetarium.media import FileRange
+from planetarium.renderers import FastJSONRenderer
+from planetarium.urls import router
 from planetarium.serializers import (
     AstronomyShowListSerializer,
-    AstronomyShowDetailSerializer
+    AstronomyShowDetailSerializer,
+    ReservationListSerializer,
+    SeatMapSerializer,
+    ShowSessionListSerializer
 )
 
 PLANETARIUM_URL = reverse("planetarium:astronomyshow-list")
 SHOW_SESSION_URL = reverse("planetarium:showsession-list")
+RESERVATION_URL = reverse("planetarium:reservation-list")
+SEAT_HOLD_URL = reverse("planetarium:seathold-list")
 
 
 def sample_astronomy_show(**params):
@@ -60,6 +122,24 @@ def image_upload_url(astronomy_show_id):
     )
 
 
+def seat_map_url(show_session_id):
+    return reverse(
+        "planetarium:showsession-seat-map",
+        args=[show_session_id]
+    )
+
+
+def best_available_url(show_session_id):
+    return reverse(
+        "planetarium:showsession-best-available",
+        args=[show_session_id]
+    )
+
+
+def seat_hold_url(seat_hold_id, action="detail"):
+    return reverse(f"planetarium:seathold-{action}", args=[seat_hold_id])
+
+
 def detail_url(astronomy_show_id):
     return reverse(
         "planetarium:astronomyshow-detail",
@@ -273,7 +353,9 @@ class AstronomyShowImageUploadTests(TestCase):
             ntf.seek(0)
             self.client.post(url, {"image": ntf}, format="multipart")
         res = self.client.get(SHOW_SESSION_URL)
-        self.assertIn("astronomy_show_image", res.data[0].keys())
+        self.assertIn(
+            "astronomy_show_image", res.data["results"][0].keys()
+        )
 
     def test_put_astronomy_show_not_allowed(self):
         payload = {
@@ -292,3 +374,2760 @@ class AstronomyShowImageUploadTests(TestCase):
         url = detail_url(astronomy_show.id)
         res = self.client.delete(url)
         self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class ShowSessionSeatMapApiTest(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "password",
+        )
+        self.client.force_authenticate(self.user)
+        self.show_session = sample_show_session(
+            astronomy_show=sample_astronomy_show()
+        )
+
+    def test_seat_map_packs_taken_places(self):
+        reservation = Reservation.objects.create(user=self.user)
+        Ticket.objects.create(
+            row=1, seat=1,
+            show_session=self.show_session,
+            reservation=reservation
+        )
+        Ticket.objects.create(
+            row=2, seat=3,
+            show_session=self.show_session,
+            reservation=reservation
+        )
+
+        res = self.client.get(seat_map_url(self.show_session.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["rows"], 20)
+        self.assertEqual(res.data["seats_in_row"], 20)
+        self.assertEqual(res.data["taken"], 2)
+        self.assertEqual(res.data["available"], 398)
+        bits = base64.b64decode(res.data["bitmap"])
+        self.assertEqual(len(bits), 50)
+        taken_indexes = [
+            index for index in range(400)
+            if bits[index >> 3] & (0x80 >> (index & 7))
+        ]
+        self.assertEqual(taken_indexes, [0, 22])
+
+    def test_seat_map_of_empty_session(self):
+        res = self.client.get(seat_map_url(self.show_session.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["taken"], 0)
+        self.assertFalse(any(base64.b64decode(res.data["bitmap"])))
+
+
+class ReservationCreateApiTest(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "password",
+        )
+        self.client.force_authenticate(self.user)
+        self.show_session = sample_show_session(
+            astronomy_show=sample_astronomy_show()
+        )
+
+    def reserve(self, places):
+        return self.client.post(
+            RESERVATION_URL,
+            {
+                "tickets": [
+                    {
+                        "row": row,
+                        "seat": seat,
+                        "show_session": self.show_session.id
+                    }
+                    for row, seat in places
+                ]
+            },
+            format="json"
+        )
+
+    def test_create_reservation(self):
+        res = self.reserve([(1, 1), (1, 2)])
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            list(
+                Ticket.objects.filter(
+                    reservation_id=res.data["id"]
+                ).values_list("row", "seat")
+            ),
+            [(1, 1), (1, 2)]
+        )
+
+    def test_query_count_does_not_depend_on_ticket_count(self):
+        # the first sale of the show creates its sell-through row
+        self.reserve([(3, 1)])
+        with self.assertNumQueries(14):
+            self.reserve([(1, seat) for seat in range(1, 3)])
+        with self.assertNumQueries(14):
+            self.reserve([(2, seat) for seat in range(1, 21)])
+
+    def test_taken_seat_rejected(self):
+        self.reserve([(1, 1)])
+
+        res = self.reserve([(1, 2), (1, 1)])
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["tickets"][0], {})
+        self.assertEqual(
+            res.data["tickets"][1]["non_field_errors"],
+            ["The fields show_session, row, seat must make a unique set."]
+        )
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_duplicate_seat_in_request_rejected(self):
+        res = self.reserve([(3, 3), (3, 3)])
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("non_field_errors", res.data["tickets"][1])
+        self.assertFalse(Ticket.objects.exists())
+
+    def test_seat_out_of_dome_rejected(self):
+        res = self.reserve([(21, 1)])
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("row", res.data["tickets"][0])
+
+    def test_unknown_show_session_rejected(self):
+        res = self.client.post(
+            RESERVATION_URL,
+            {"tickets": [{"row": 1, "seat": 1, "show_session": 999}]},
+            format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("show_session", res.data["tickets"][0])
+
+
+class SeatHoldApiTest(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "password",
+        )
+        self.other = get_user_model().objects.create_user(
+            "other@test.com",
+            "password",
+        )
+        self.client.force_authenticate(self.user)
+        self.show_session = sample_show_session(
+            astronomy_show=sample_astronomy_show()
+        )
+
+    def hold(self, places):
+        return self.client.post(
+            SEAT_HOLD_URL,
+            {
+                "show_session": self.show_session.id,
+                "seats": [{"row": row, "seat": seat} for row, seat in places]
+            },
+            format="json"
+        )
+
+    def test_hold_counts_as_taken(self):
+        res = self.hold([(1, 1), (1, 2)])
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            res.data["seats"],
+            [{"row": 1, "seat": 1}, {"row": 1, "seat": 2}]
+        )
+        seat_map = self.client.get(seat_map_url(self.show_session.id))
+        self.assertEqual(seat_map.data["taken"], 2)
+        detail = self.client.get(
+            reverse(
+                "planetarium:showsession-detail",
+                args=[self.show_session.id]
+            )
+        )
+        self.assertEqual(
+            detail.data["taken_places"],
+            [{"row": 1, "seat": 1}, {"row": 1, "seat": 2}]
+        )
+        sessions = self.client.get(SHOW_SESSION_URL)
+        self.assertEqual(sessions.data["results"][0]["tickets_available"], 398)
+
+    def test_held_seat_cannot_be_held_or_reserved_by_others(self):
+        self.hold([(1, 1)])
+        self.client.force_authenticate(self.other)
+
+        res = self.hold([(1, 1)])
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("seats", res.data)
+
+        res = self.client.post(
+            RESERVATION_URL,
+            {"tickets": [
+                {"row": 1, "seat": 1, "show_session": self.show_session.id}
+            ]},
+            format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data["tickets"][0]["non_field_errors"],
+            ["This seat is held by another customer."]
+        )
+
+    def test_sold_seat_cannot_be_held(self):
+        reservation = Reservation.objects.create(user=self.other)
+        Ticket.objects.create(
+            row=2, seat=2,
+            show_session=self.show_session,
+            reservation=reservation
+        )
+
+        res = self.hold([(2, 2)])
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(SeatHold.objects.exists())
+
+    def test_confirm_turns_hold_into_reservation(self):
+        seat_hold_id = self.hold([(3, 1), (3, 2)]).data["id"]
+
+        res = self.client.post(seat_hold_url(seat_hold_id, "confirm"))
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            sorted(
+                (ticket["row"], ticket["seat"])
+                for ticket in res.data["tickets"]
+            ),
+            [(3, 1), (3, 2)]
+        )
+        self.assertFalse(SeatHold.objects.exists())
+        self.show_session.refresh_from_db()
+        self.assertEqual(self.show_session.tickets_sold, 2)
+
+    def test_hold_of_other_user_is_not_visible(self):
+        seat_hold_id = self.hold([(1, 1)]).data["id"]
+        self.client.force_authenticate(self.other)
+
+        res = self.client.post(seat_hold_url(seat_hold_id, "confirm"))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_expired_hold_is_ignored_and_dropped(self):
+        hold_seats(
+            self.show_session.id,
+            self.other,
+            [{"row": 1, "seat": 1}],
+            ttl=timedelta(seconds=-1)
+        )
+
+        res = self.hold([(1, 1)])
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(SeatHold.objects.count(), 1)
+
+    def test_expired_hold_stops_counting_in_list(self):
+        seat_hold_id = self.hold([(1, 1), (1, 2)]).data["id"]
+        sessions = self.client.get(SHOW_SESSION_URL)
+        self.assertEqual(sessions.data["results"][0]["tickets_available"], 398)
+
+        seat_hold = SeatHold.objects.get(pk=seat_hold_id)
+        seat_hold.expires_at = timezone.now() - timedelta(seconds=1)
+        seat_hold.save()
+
+        sessions = self.client.get(SHOW_SESSION_URL)
+        self.assertEqual(sessions.data["results"][0]["tickets_available"], 400)
+
+    def test_booking_held_seats_releases_them_from_hold(self):
+        seat_hold_id = self.hold([(1, 1), (1, 2)]).data["id"]
+
+        for seat, held in ((1, [{"row": 1, "seat": 2}]), (2, None)):
+            res = self.client.post(
+                RESERVATION_URL,
+                {"tickets": [
+                    {"row": 1, "seat": seat,
+                     "show_session": self.show_session.id}
+                ]},
+                format="json"
+            )
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            seat_hold = SeatHold.objects.filter(pk=seat_hold_id).first()
+            self.assertEqual(seat_hold and seat_hold.held_places, held)
+            sessions = self.client.get(SHOW_SESSION_URL)
+            self.assertEqual(
+                sessions.data["results"][0]["tickets_available"], 398
+            )
+
+    def test_release_hold(self):
+        seat_hold_id = self.hold([(1, 1)]).data["id"]
+
+        res = self.client.delete(seat_hold_url(seat_hold_id))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(SeatHold.objects.exists())
+
+
+class ReservationSoldOutTest(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "password",
+        )
+        self.client.force_authenticate(self.user)
+        self.show_session = ShowSession.objects.create(
+            astronomy_show=sample_astronomy_show(),
+            planetarium_dome=PlanetariumDome.objects.create(
+                name="Small", rows=1, seats_in_row=2
+            ),
+            show_time="2024-11-14 10:00:00",
+        )
+
+    def reserve(self, *seats):
+        return self.client.post(
+            RESERVATION_URL,
+            {"tickets": [
+                {"row": 1, "seat": seat, "show_session": self.show_session.id}
+                for seat in seats
+            ]},
+            format="json"
+        )
+
+    def test_sold_out_session_answers_conflict_without_locking(self):
+        self.reserve(1, 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.reserve(1)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data["detail"].code, "sold_out")
+        self.assertEqual(len(queries), 1)
+
+    def test_request_above_remaining_capacity_rejected(self):
+        self.reserve(1)
+        hold_seats(self.show_session.id, get_user_model().objects.create_user(
+            "other@test.com", "password"
+        ), [{"row": 1, "seat": 2}])
+
+        res = self.reserve(2)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Ticket.objects.count(), 1)
+
+
+class ReservationConcurrencyTest(TransactionTestCase):
+    BOOKINGS = 200
+
+    def setUp(self) -> None:
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            # shared-cache in-memory SQLite fails readers on table locks
+            # instead of waiting, which says nothing about the booking path
+            self.skipTest("needs a database file or server")
+        self.users = [
+            get_user_model().objects.create_user(
+                f"user{index}@test.com", "password"
+            )
+            for index in range(8)
+        ]
+        self.show_session = ShowSession.objects.create(
+            astronomy_show=sample_astronomy_show(),
+            planetarium_dome=PlanetariumDome.objects.create(
+                name="Flash sale", rows=5, seats_in_row=10
+            ),
+            show_time="2024-11-14 10:00:00",
+        )
+
+    def book(self, index):
+        try:
+            client = APIClient()
+            client.force_authenticate(self.users[index % len(self.users)])
+            seat = index % 50
+            res = client.post(
+                RESERVATION_URL,
+                {"tickets": [
+                    {
+                        "row": seat // 10 + 1,
+                        "seat": seat % 10 + 1,
+                        "show_session": self.show_session.id
+                    },
+                ]},
+                format="json"
+            )
+            return res.status_code
+        finally:
+            connection.close()
+
+    def test_parallel_bookings_never_oversell(self):
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            codes = Counter(executor.map(self.book, range(self.BOOKINGS)))
+
+        self.assertLessEqual(
+            set(codes),
+            {
+                status.HTTP_201_CREATED,
+                status.HTTP_400_BAD_REQUEST,
+                status.HTTP_409_CONFLICT
+            },
+            codes
+        )
+        self.show_session.refresh_from_db()
+        tickets = Ticket.objects.filter(show_session=self.show_session)
+        self.assertLessEqual(tickets.count(), 50)
+        self.assertEqual(tickets.count(), codes[status.HTTP_201_CREATED])
+        self.assertEqual(self.show_session.tickets_sold, tickets.count())
+
+
+class ShowSessionTicketsSoldTest(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "password",
+        )
+        self.show_session = sample_show_session(
+            astronomy_show=sample_astronomy_show()
+        )
+        self.reservation = Reservation.objects.create(user=self.user)
+
+    def test_tickets_sold_follows_ticket_create_and_delete(self):
+        ticket = Ticket.objects.create(
+            row=1, seat=1,
+            show_session=self.show_session,
+            reservation=self.reservation
+        )
+        Ticket.objects.create(
+            row=1, seat=2,
+            show_session=self.show_session,
+            reservation=self.reservation
+        )
+        self.show_session.refresh_from_db()
+        self.assertEqual(self.show_session.tickets_sold, 2)
+        self.assertEqual(self.show_session.tickets_available, 398)
+
+        ticket.delete()
+        self.show_session.refresh_from_db()
+        self.assertEqual(self.show_session.tickets_sold, 1)
+
+        self.reservation.delete()
+        self.show_session.refresh_from_db()
+        self.assertEqual(self.show_session.tickets_sold, 0)
+
+    def test_reservation_api_counts_tickets_sold(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        client.post(
+            RESERVATION_URL,
+            {
+                "tickets": [
+                    {"row": 1, "seat": seat,
+                     "show_session": self.show_session.id}
+                    for seat in range(1, 6)
+                ]
+            },
+            format="json"
+        )
+
+        res = client.get(SHOW_SESSION_URL)
+
+        self.assertEqual(
+            res.data["results"][0]["tickets_available"], 395
+        )
+
+    def test_reconcile_tickets_sold(self):
+        Ticket.objects.create(
+            row=1, seat=1,
+            show_session=self.show_session,
+            reservation=self.reservation
+        )
+        ShowSession.objects.update(tickets_sold=7)
+
+        call_command("reconcile_tickets_sold", stdout=StringIO())
+
+        self.show_session.refresh_from_db()
+        self.assertEqual(self.show_session.tickets_sold, 1)
+
+
+class QueryBudgetTestCase(TestCase):
+    def assertQueryBudget(self, budget, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            res = getattr(self.client, method)(url, data, format="json")
+        self.assertLess(res.status_code, 400, res.data)
+        self.assertEqual(
+            len(queries),
+            budget,
+            f"{method.upper()} {url} ran {len(queries)} queries, "
+            f"budget is {budget}:\n"
+            + "\n".join(query["sql"] for query in queries.captured_queries)
+        )
+        return res
+
+
+class EndpointQueryBudgetTest(QueryBudgetTestCase):
+    # (url name, method) -> number of queries the request may run
+    QUERY_BUDGETS = {
+        ("api-root", "get"): 0,
+        ("showtheme-list", "get"): 1,
+        ("showtheme-list", "post"): 2,
+        ("planetariumdome-list", "get"): 1,
+        ("planetariumdome-list", "post"): 1,
+        ("astronomyshow-list", "get"): 2,
+        ("astronomyshow-list", "post"): 4,
+        ("astronomyshow-detail", "get"): 2,
+        # multipart upload, exercised by AstronomyShowImageUploadTests
+        ("astronomyshow-upload-image", "post"): None,
+        ("showsession-list", "get"): 1,
+        ("showsession-list", "post"): 16,
+        ("showsession-detail", "get"): 4,
+        ("showsession-detail", "put"): 18,
+        ("showsession-detail", "patch"): 23,
+        ("showsession-detail", "delete"): 11,
+        ("showsession-seat-map", "get"): 3,
+        # bulk import, exercised by ScheduleImportTest
+        ("showsession-import", "post"): None,
+        ("showsession-best-available", "post"): 3,
+        ("reservation-list", "get"): 2,
+        ("reservation-list", "post"): 15,
+        ("seathold-list", "post"): 8,
+        ("seathold-detail", "get"): 1,
+        ("seathold-detail", "delete"): 2,
+        ("seathold-confirm", "post"): 19,
+        ("analytics-fill-rate", "get"): 1,
+        ("analytics-top-shows", "get"): 1,
+        ("analytics-sell-through", "get"): 2,
+        ("profile-list", "get"): 0,
+        ("profile-token", "post"): 0,
+        # read a captured profile, exercised by RequestProfilingTest
+        ("profile-detail", "get"): None,
+        ("profile-download", "get"): None,
+    }
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_superuser(
+            "admin@planetarium.com",
+            "admin-password",
+        )
+        self.client.force_authenticate(self.user)
+        self.batch = 0
+
+    def populate(self):
+        self.batch += 1
+        show_theme = ShowTheme.objects.create(name=f"Theme {self.batch}")
+        for _ in range(3):
+            astronomy_show = sample_astronomy_show()
+            astronomy_show.show_theme.add(show_theme)
+            show_session = sample_show_session(astronomy_show=astronomy_show)
+            reservation = Reservation.objects.create(user=self.user)
+            for seat in range(1, 4):
+                Ticket.objects.create(
+                    row=1, seat=seat,
+                    show_session=show_session,
+                    reservation=reservation
+                )
+        return show_session
+
+    def check_budgets(self, show_session):
+        budgets = self.QUERY_BUDGETS
+        astronomy_show = show_session.astronomy_show
+        session_url = reverse(
+            "planetarium:showsession-detail", args=[show_session.id]
+        )
+        session_payload = {
+            "show_time": "2024-12-01T12:00:00",
+            "astronomy_show": astronomy_show.id,
+            "planetarium_dome": show_session.planetarium_dome_id,
+        }
+        requests = [
+            ("api-root", "get", reverse("planetarium:api-root"), None),
+            ("showtheme-list", "get", reverse("planetarium:showtheme-list"),
+             None),
+            ("showtheme-list", "post", reverse("planetarium:showtheme-list"),
+             {"name": f"New theme {self.batch}"}),
+            ("planetariumdome-list", "get",
+             reverse("planetarium:planetariumdome-list"), None),
+            ("planetariumdome-list", "post",
+             reverse("planetarium:planetariumdome-list"),
+             {"name": "Moon", "rows": 5, "seats_in_row": 5}),
+            ("astronomyshow-list", "get", PLANETARIUM_URL, None),
+            ("astronomyshow-list", "post", PLANETARIUM_URL,
+             {"title": "New show", "description": "Description"}),
+            ("astronomyshow-detail", "get", detail_url(astronomy_show.id),
+             None),
+            ("showsession-list", "get", SHOW_SESSION_URL, None),
+            ("showsession-list", "post", SHOW_SESSION_URL, session_payload),
+            ("showsession-detail", "get", session_url, None),
+            ("showsession-detail", "put", session_url,
+             {**session_payload, "show_time": "2024-12-01T15:00:00"}),
+            ("showsession-detail", "patch", session_url,
+             {"show_time": "2024-12-02T12:00:00"}),
+            ("showsession-seat-map", "get", seat_map_url(show_session.id),
+             None),
+            ("showsession-best-available", "post",
+             best_available_url(show_session.id),
+             {"party_size": 3}),
+            ("reservation-list", "get", RESERVATION_URL, None),
+            ("reservation-list", "post", RESERVATION_URL,
+             {"tickets": [
+                 {"row": 2, "seat": seat, "show_session": show_session.id}
+                 for seat in range(1, 4)
+             ]}),
+            ("analytics-fill-rate", "get",
+             reverse("planetarium:analytics-fill-rate"), None),
+            ("analytics-top-shows", "get",
+             reverse("planetarium:analytics-top-shows"), None),
+            ("analytics-sell-through", "get",
+             reverse("planetarium:analytics-sell-through"), None),
+            ("profile-list", "get", reverse("planetarium:profile-list"),
+             None),
+            ("profile-token", "post", reverse("planetarium:profile-token"),
+             None),
+            ("seathold-list", "post", SEAT_HOLD_URL,
+             {"show_session": show_session.id,
+              "seats": [{"row": 3, "seat": 1}]}),
+        ]
+        for name, method, url, data in requests:
+            with self.subTest(endpoint=name, method=method):
+                res = self.assertQueryBudget(
+                    budgets[(name, method)], method, url, data
+                )
+        hold_url = seat_hold_url(res.data["id"])
+        requests = [
+            ("seathold-detail", "get", hold_url, None),
+            ("seathold-confirm", "post", seat_hold_url(res.data["id"],
+                                                       "confirm"), None),
+            ("seathold-list", "post", SEAT_HOLD_URL,
+             {"show_session": show_session.id,
+              "seats": [{"row": 4, "seat": 1}]}),
+        ]
+        for name, method, url, data in requests:
+            with self.subTest(endpoint=name, method=method):
+                res = self.assertQueryBudget(
+                    budgets[(name, method)], method, url, data
+                )
+        requests = [
+            ("seathold-detail", "delete", seat_hold_url(res.data["id"]),
+             None),
+            ("showsession-detail", "delete", session_url, None),
+        ]
+        for name, method, url, data in requests:
+            with self.subTest(endpoint=name, method=method):
+                self.assertQueryBudget(
+                    budgets[(name, method)], method, url, data
+                )
+
+    def test_query_budgets_do_not_grow_with_data(self):
+        self.check_budgets(self.populate())
+        self.populate()
+        self.check_budgets(self.populate())
+
+    def test_every_router_endpoint_has_budget(self):
+        budgeted = {name for name, _ in self.QUERY_BUDGETS}
+        for pattern in router.urls:
+            self.assertIn(pattern.name, budgeted)
+
+
+class CatalogResponseCacheTest(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "password",
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_second_list_request_is_served_from_cache(self):
+        sample_astronomy_show()
+        hits = get_response_cache().hits
+
+        first = self.client.get(PLANETARIUM_URL)
+        with self.assertNumQueries(0):
+            second = self.client.get(PLANETARIUM_URL)
+
+        self.assertEqual(first["X-Cache"], "MISS")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(get_response_cache().hits, hits + 1)
+
+    def test_query_params_are_part_of_the_key(self):
+        sample_astronomy_show(title="Moon")
+        self.client.get(PLANETARIUM_URL)
+
+        res = self.client.get(PLANETARIUM_URL, {"title": "sun"})
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data, [])
+
+    def test_save_invalidates_cached_list(self):
+        self.client.get(reverse("planetarium:showtheme-list"))
+        ShowTheme.objects.create(name="Galaxies")
+
+        res = self.client.get(reverse("planetarium:showtheme-list"))
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data[0]["name"], "Galaxies")
+
+    def test_m2m_change_invalidates_cached_detail(self):
+        astronomy_show = sample_astronomy_show()
+        self.client.get(detail_url(astronomy_show.id))
+        astronomy_show.show_theme.add(ShowTheme.objects.create(name="Stars"))
+
+        res = self.client.get(detail_url(astronomy_show.id))
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["show_theme"][0]["name"], "Stars")
+
+
+class ResponseCacheBackendTest(TestCase):
+    def test_locmem_evicts_least_recently_used(self):
+        response_cache = LocMemResponseCache(max_entries=2)
+        response_cache.set("a", 1)
+        response_cache.set("b", 2)
+        response_cache.get("a")
+        response_cache.set("c", 3)
+
+        self.assertEqual(response_cache.get("a"), 1)
+        self.assertIsNone(response_cache.get("b"))
+        self.assertEqual(response_cache.stats, {"hits": 2, "misses": 1})
+
+    def test_file_cache_is_bounded(self):
+        with tempfile.TemporaryDirectory() as location:
+            response_cache = FileResponseCache(location, max_entries=2)
+            for key in ("a", "b", "c"):
+                response_cache.set(key, {"key": key})
+
+            self.assertEqual(len(os.listdir(location)), 2)
+            self.assertEqual(response_cache.get("c"), {"key": "c"})
+
+    def test_unrelated_writes_keep_versions(self):
+        keys = [
+            VERSION_KEY_PREFIX + model._meta.label_lower
+            for model in (SlowQuery, ShowDailySales)
+        ]
+        caches["default"].delete_many(keys)
+
+        SlowQuery.objects.create(
+            fingerprint="select 1", sql="select 1", view="test"
+        )
+        ShowDailySales.objects.create(
+            astronomy_show=sample_astronomy_show(), day=date.today()
+        )
+
+        self.assertEqual(caches["default"].get_many(keys), {})
+
+    def test_process_local_version_cache_fails_with_several_workers(self):
+        with self.settings(PLANETARIUM_WORKER_PROCESSES=1):
+            self.assertEqual(check_version_cache(None), [])
+        with self.settings(PLANETARIUM_WORKER_PROCESSES=4):
+            self.assertEqual(
+                [error.id for error in check_version_cache(None)],
+                ["planetarium.E001"]
+            )
+        with self.settings(
+                PLANETARIUM_WORKER_PROCESSES=4,
+                CACHES={"default": {
+                    "BACKEND": "django.core.cache.backends.redis.RedisCache",
+                    "LOCATION": "redis://localhost:6379/0",
+                }},
+        ):
+            self.assertEqual(check_version_cache(None), [])
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "password",
+        )
+        self.client.force_authenticate(self.user)
+        self.show_session = sample_show_session(
+            astronomy_show=sample_astronomy_show()
+        )
+        self.session_url = reverse(
+            "planetarium:showsession-detail", args=[self.show_session.id]
+        )
+
+    def test_matching_etag_returns_304_without_queries(self):
+        etag = self.client.get(self.session_url)["ETag"]
+
+        with self.assertNumQueries(0):
+            res = self.client.get(
+                self.session_url, HTTP_IF_NONE_MATCH=etag
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], etag)
+        self.assertFalse(res.content)
+
+    def test_if_modified_since_returns_304(self):
+        last_modified = self.client.get(SHOW_SESSION_URL)["Last-Modified"]
+
+        res = self.client.get(
+            SHOW_SESSION_URL, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_session_etag_changes_when_tickets_are_sold(self):
+        detail_etag = self.client.get(self.session_url)["ETag"]
+        list_etag = self.client.get(SHOW_SESSION_URL)["ETag"]
+
+        self.client.post(
+            RESERVATION_URL,
+            {"tickets": [
+                {"row": 1, "seat": 1, "show_session": self.show_session.id}
+            ]},
+            format="json"
+        )
+        detail = self.client.get(
+            self.session_url, HTTP_IF_NONE_MATCH=detail_etag
+        )
+        session_list = self.client.get(
+            SHOW_SESSION_URL, HTTP_IF_NONE_MATCH=list_etag
+        )
+
+        self.assertEqual(detail.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            detail.data["taken_places"], [{"row": 1, "seat": 1}]
+        )
+        self.assertEqual(session_list.status_code, status.HTTP_200_OK)
+
+    def test_other_session_keeps_its_etag(self):
+        other_session = sample_show_session(
+            astronomy_show=self.show_session.astronomy_show
+        )
+        other_url = reverse(
+            "planetarium:showsession-detail", args=[other_session.id]
+        )
+        etag = self.client.get(other_url)["ETag"]
+
+        Ticket.objects.create(
+            row=1, seat=1,
+            show_session=self.show_session,
+            reservation=Reservation.objects.create(user=self.user)
+        )
+        res = self.client.get(other_url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_reservation_etag_is_per_user(self):
+        etag = self.client.get(RESERVATION_URL)["ETag"]
+        other_user = get_user_model().objects.create_user(
+            "other@test.com",
+            "password",
+        )
+        self.client.force_authenticate(other_user)
+
+        res = self.client.get(RESERVATION_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "password",
+        )
+        self.client.force_authenticate(self.user)
+        astronomy_show = sample_astronomy_show()
+        self.show_sessions = [
+            sample_show_session(
+                astronomy_show=astronomy_show,
+                show_time=f"2024-11-{day:02} 12:00:00"
+            )
+            for day in (1, 2, 2, 2, 3)
+        ]
+
+    def get_ids(self, url, params=None):
+        res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [row["id"] for row in res.data["results"]], res.data
+
+    def test_walk_sessions_forward_and_back(self):
+        expected = [
+            show_session.id for show_session in sorted(
+                ShowSession.objects.all(),
+                key=lambda show_session: (show_session.show_time,
+                                          show_session.id),
+                reverse=True
+            )
+        ]
+
+        first_ids, first = self.get_ids(SHOW_SESSION_URL, {"page_size": 2})
+        second_ids, second = self.get_ids(first["next"])
+        third_ids, third = self.get_ids(second["next"])
+        back_ids, _ = self.get_ids(third["previous"])
+
+        self.assertIsNone(first["previous"])
+        self.assertEqual(first_ids + second_ids + third_ids, expected)
+        self.assertIsNone(third["next"])
+        self.assertEqual(back_ids, second_ids)
+
+    def test_sessions_page_runs_no_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(SHOW_SESSION_URL, {"page_size": 2})
+
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("COUNT(", queries[0]["sql"].upper())
+
+    def test_invalid_cursor(self):
+        res = self.client.get(SHOW_SESSION_URL, {"cursor": "garbage"})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_reservations_are_paginated_by_creation(self):
+        for seat in range(1, 13):
+            Ticket.objects.create(
+                row=1, seat=seat,
+                show_session=self.show_sessions[0],
+                reservation=Reservation.objects.create(user=self.user)
+            )
+
+        first_ids, first = self.get_ids(RESERVATION_URL)
+        second_ids, second = self.get_ids(first["next"])
+
+        self.assertEqual(len(first_ids), 10)
+        self.assertEqual(
+            first_ids + second_ids,
+            list(
+                Reservation.objects.order_by(
+                    "-created_at", "-id"
+                ).values_list("id", flat=True)
+            )
+        )
+        self.assertIsNone(second["next"])
+
+
+class ShowSessionScheduleFilterTest(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "password",
+        )
+        self.client.force_authenticate(self.user)
+        astronomy_show = sample_astronomy_show()
+        self.early = sample_show_session(
+            astronomy_show=astronomy_show,
+            show_time="2024-11-01 00:00:00"
+        )
+        self.late = sample_show_session(
+            astronomy_show=astronomy_show,
+            show_time="2024-11-01 23:59:59"
+        )
+        self.next_day = sample_show_session(
+            astronomy_show=astronomy_show,
+            show_time="2024-11-02 00:00:00"
+        )
+        self.future = sample_show_session(
+            astronomy_show=astronomy_show,
+            show_time="2999-01-01 12:00:00"
+        )
+
+    def get_ids(self, params):
+        res = self.client.get(SHOW_SESSION_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return {row["id"] for row in res.data["results"]}
+
+    def test_filter_by_date_covers_whole_day(self):
+        self.assertEqual(
+            self.get_ids({"date": "2024-11-01"}),
+            {self.early.id, self.late.id}
+        )
+
+    def test_filter_by_date_range_is_inclusive(self):
+        self.assertEqual(
+            self.get_ids({"date_from": "2024-11-01", "date_to": "2024-11-02"}),
+            {self.early.id, self.late.id, self.next_day.id}
+        )
+
+    def test_filter_by_planetarium_dome(self):
+        self.assertEqual(
+            self.get_ids(
+                {"planetarium_dome": self.late.planetarium_dome_id}
+            ),
+            {self.late.id}
+        )
+
+    def test_filter_upcoming(self):
+        self.assertEqual(self.get_ids({"upcoming": "true"}), {self.future.id})
+
+    def test_invalid_date_is_bad_request(self):
+        res = self.client.get(SHOW_SESSION_URL, {"date_from": "01.11.2024"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("date_from", res.data)
+
+    def test_invalid_id_is_bad_request(self):
+        for name in ("astronomy_show", "planetarium_dome"):
+            res = self.client.get(SHOW_SESSION_URL, {name: "abc"})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(name, res.data)
+
+
+class AstronomyShowSearchTest(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "password",
+        )
+        self.client.force_authenticate(self.user)
+
+    def search(self, query):
+        res = self.client.get(PLANETARIUM_URL, {"search": query})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [row["title"] for row in res.data]
+
+    def test_title_match_ranks_above_description_match(self):
+        sample_astronomy_show(
+            title="Journey to Saturn",
+            description="A tour of the ringed planets"
+        )
+        sample_astronomy_show(
+            title="Rings",
+            description="Saturn and its moons"
+        )
+        sample_astronomy_show(title="Mars", description="The red planet")
+
+        self.assertEqual(self.search("saturn"), ["Journey to Saturn", "Rings"])
+
+    def test_prefix_and_multiple_words(self):
+        sample_astronomy_show(title="Black holes", description="Gravity")
+        sample_astronomy_show(title="Black dwarfs", description="Stars")
+
+        self.assertEqual(self.search("bla hol"), ["Black holes"])
+
+    def test_show_theme_names_are_searchable(self):
+        astronomy_show = sample_astronomy_show(title="Deep field")
+        show_theme = ShowTheme.objects.create(name="Galaxies")
+        astronomy_show.show_theme.add(show_theme)
+
+        self.assertEqual(self.search("galax"), ["Deep field"])
+
+        show_theme.name = "Nebulae"
+        show_theme.save()
+        self.assertEqual(self.search("galax"), [])
+        self.assertEqual(self.search("nebula"), ["Deep field"])
+
+        astronomy_show.show_theme.clear()
+        self.assertEqual(self.search("nebula"), [])
+
+    def test_updated_and_deleted_shows_are_reindexed(self):
+        astronomy_show = sample_astronomy_show(title="Comets")
+        astronomy_show.title = "Asteroids"
+        astronomy_show.save()
+
+        self.assertEqual(self.search("comet"), [])
+        self.assertEqual(self.search("asteroid"), ["Asteroids"])
+
+        astronomy_show.delete()
+        self.assertEqual(self.search("asteroid"), [])
+
+    def test_rebuild_search_index(self):
+        sample_astronomy_show(title="Pulsars")
+
+        call_command("rebuild_search_index", stdout=StringIO())
+
+        self.assertEqual(self.search("pulsar"), ["Pulsars"])
+
+    def test_postgres_keeps_a_weighted_gin_indexed_vector(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("needs PostgreSQL")
+        astronomy_show = sample_astronomy_show(
+            title="Quasars", description="Bright galactic cores"
+        )
+        table = AstronomyShow._meta.db_table
+
+        with connection.cursor() as cursor:
+            indexes = connection.introspection.get_constraints(cursor, table)
+            cursor.execute(
+                f"SELECT search_vector::text FROM {table} WHERE id = %s",
+                [astronomy_show.id],
+            )
+            vector = cursor.fetchone()[0]
+
+        self.assertEqual(
+            indexes["astronomyshow_search_gin"]["columns"], ["search_vector"]
+        )
+        self.assertEqual(indexes["astronomyshow_search_gin"]["type"], "gin")
+        self.assertIn("'quasar':1A", vector)
+        self.assertIn("'galact", vector)
+
+
+class SeedAndBenchCommandTest(TestCase):
+    def test_seed_keeps_counters_consistent(self):
+        call_command(
+            "seed_planetarium",
+            domes=2,
+            themes=3,
+            shows=4,
+            sessions=10,
+            users=5,
+            tickets=200,
+            batch_size=7,
+            stdout=StringIO(),
+        )
+
+        self.assertEqual(ShowSession.objects.count(), 10)
+        self.assertGreater(Ticket.objects.count(), 0)
+        for show_session in ShowSession.objects.all():
+            self.assertEqual(
+                show_session.tickets_sold, show_session.tickets.count()
+            )
+        out = StringIO()
+        call_command("reconcile_tickets_sold", dry_run=True, stdout=out)
+        self.assertIn("0 show session(s) drifted", out.getvalue())
+
+    def test_bench_writes_comparable_report(self):
+        call_command(
+            "seed_planetarium",
+            domes=1, themes=1, shows=2, sessions=3, users=2, tickets=20,
+            stdout=StringIO(),
+        )
+        with tempfile.TemporaryDirectory() as location:
+            report_path = os.path.join(location, "bench.json")
+            call_command(
+                "bench_api",
+                requests=3,
+                warmup=0,
+                output=report_path,
+                stdout=StringIO(),
+                stderr=StringIO(),
+            )
+            with open(report_path) as report_file:
+                report = json.load(report_file)
+            out = StringIO()
+            call_command(
+                "bench_api",
+                requests=3,
+                warmup=0,
+                compare=report_path,
+                threshold=1000,
+                stdout=out,
+                stderr=StringIO(),
+            )
+
+        endpoints = report["endpoints"]
+        self.assertEqual(endpoints["showsession-list"]["status"], 200)
+        self.assertEqual(endpoints["showsession-detail"]["status"], 200)
+        self.assertEqual(endpoints["reservation-list"]["status"], 200)
+        self.assertLessEqual(
+            endpoints["showsession-list"]["p50_ms"],
+            endpoints["showsession-list"]["p99_ms"],
+        )
+        self.assertIn("showsession-list", out.getvalue())
+
+
+class MetricsTest(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_superuser(
+            "admin@planetarium.com", "password"
+        )
+        self.user = get_user_model().objects.create_user(
+            "test@test.com", "password"
+        )
+        self.metrics_url = reverse("planetarium:metrics")
+
+    def scrape(self):
+        self.client.force_authenticate(self.admin)
+        res = self.client.get(self.metrics_url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res["Content-Type"].startswith("text/plain"))
+        return res.content.decode()
+
+    def test_requests_are_counted_per_view_action(self):
+        with self.settings(PLANETARIUM_METRICS={"DIRECTORY": None}):
+            self.client.force_authenticate(self.user)
+            sample_show_session(astronomy_show=sample_astronomy_show())
+            self.client.get(SHOW_SESSION_URL)
+            self.client.get(SHOW_SESSION_URL)
+            self.client.post(RESERVATION_URL, {"tickets": []}, format="json")
+
+            metrics = self.scrape()
+
+        labels = 'view="showsession-list",method="GET",status="2xx"'
+        self.assertIn(
+            f"planetarium_http_requests_total{{{labels}}} 2", metrics
+        )
+        self.assertIn(
+            f"planetarium_http_request_duration_seconds_count{{{labels}}} 2",
+            metrics
+        )
+        self.assertIn(
+            f"planetarium_http_request_duration_seconds_bucket{{{labels},"
+            f'le="+Inf"}} 2',
+            metrics
+        )
+        self.assertIn(f"planetarium_db_queries_total{{{labels}}} 2", metrics)
+        self.assertIn(
+            'view="reservation-create",method="POST",status="4xx"', metrics
+        )
+
+    def test_metrics_are_staff_only(self):
+        res = self.client.get(self.metrics_url)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.force_authenticate(self.user)
+        res = self.client.get(self.metrics_url)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_processes_are_summed_from_directory(self):
+        with tempfile.TemporaryDirectory() as location:
+            other = MetricsRegistry(
+                DEFAULT_METRICS["BUCKETS"], directory=location
+            )
+            other.observe("showtheme-list", "GET", 200, 0.002, 1, 0.001)
+            other.flush()
+            with self.settings(PLANETARIUM_METRICS={"DIRECTORY": location}):
+                self.client.force_authenticate(self.user)
+                self.client.get(reverse("planetarium:showtheme-list"))
+
+                metrics = self.scrape()
+
+        self.assertIn(
+            'planetarium_http_requests_total{view="showtheme-list",'
+            'method="GET",status="2xx"} 2',
+            metrics
+        )
+
+    def test_exited_processes_are_folded_into_one_total(self):
+        buckets = DEFAULT_METRICS["BUCKETS"]
+        with tempfile.TemporaryDirectory() as location:
+            exited = MetricsRegistry(buckets, directory=location)
+            exited.observe("showtheme-list", "GET", 200, 0.002, 1, 0.001)
+            exited.close()
+            killed = MetricsRegistry(buckets, directory=location)
+            killed.observe("showtheme-list", "GET", 200, 0.002, 1, 0.001)
+            killed.flush()
+            # a pid no process has: the one of a reaped child
+            child = subprocess.Popen([sys.executable, "-c", "pass"])
+            child.wait()
+            os.rename(
+                killed.path,
+                os.path.join(location, f"metrics-{child.pid}-0.json")
+            )
+            registry = MetricsRegistry(buckets, directory=location)
+            registry.observe("showtheme-list", "GET", 200, 0.002, 1, 0.001)
+
+            for _ in range(2):
+                series = registry.collect()
+                self.assertEqual(
+                    series[("showtheme-list", "GET", "2xx")][0], 3
+                )
+            self.assertEqual(
+                sorted(os.listdir(location)),
+                sorted([
+                    "metrics-exited.json",
+                    "metrics.lock",
+                    os.path.basename(registry.path),
+                ])
+            )
+
+
+class RequestProfilingTest(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_superuser(
+            "admin@planetarium.com", "password"
+        )
+        self.user = get_user_model().objects.create_user(
+            "test@test.com", "password"
+        )
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings_override = self.settings(
+            PLANETARIUM_PROFILING={
+                "DIRECTORY": self.directory.name, "MAX_PROFILES": 2
+            }
+        )
+        self.settings_override.enable()
+        sample_show_session(astronomy_show=sample_astronomy_show())
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        self.directory.cleanup()
+
+    def get_token(self):
+        self.client.force_authenticate(self.admin)
+        res = self.client.post(reverse("planetarium:profile-token"))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    @staticmethod
+    def profile_header(token):
+        return {
+            "HTTP_" + token["header"].upper().replace("-", "_"):
+                token["token"]
+        }
+
+    def test_signed_header_profiles_one_request(self):
+        token = self.get_token()
+
+        res = self.client.get(SHOW_SESSION_URL, **self.profile_header(token))
+        self.assertIn("X-Profile-Id", res)
+        self.assertNotIn("X-Profile-Id", self.client.get(SHOW_SESSION_URL))
+
+        profile_id = res["X-Profile-Id"]
+        profiles = self.client.get(reverse("planetarium:profile-list"))
+        self.assertEqual(
+            [profile["id"] for profile in profiles.data], [profile_id]
+        )
+        with self.assertNumQueries(0):
+            profile = self.client.get(
+                reverse("planetarium:profile-detail", args=[profile_id])
+            ).data
+        self.assertEqual(profile["trigger"], "token")
+        self.assertEqual(profile["view"], "planetarium:showsession-list")
+        self.assertEqual(profile["queries_count"], len(profile["queries"]))
+        self.assertIn("planetarium_showsession", profile["queries"][0]["sql"])
+        self.assertTrue(profile["functions"])
+
+        download = self.client.get(
+            reverse("planetarium:profile-download", args=[profile_id])
+        )
+        self.assertEqual(download.status_code, status.HTTP_200_OK)
+        with tempfile.NamedTemporaryFile(suffix=".prof") as prof_file:
+            prof_file.write(b"".join(download.streaming_content))
+            prof_file.flush()
+            self.assertTrue(pstats.Stats(prof_file.name).stats)
+
+    def test_invalid_token_is_ignored(self):
+        self.client.force_authenticate(self.admin)
+
+        res = self.client.get(
+            SHOW_SESSION_URL, HTTP_X_PLANETARIUM_PROFILE="forged:token"
+        )
+
+        self.assertNotIn("X-Profile-Id", res)
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_token_profiles_only_its_owner_while_staff(self):
+        token = self.get_token()
+        header = self.profile_header(token)
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.admin)}"
+        )
+        self.assertIn("X-Profile-Id", client.get(SHOW_SESSION_URL, **header))
+
+        self.assertNotIn(
+            "X-Profile-Id", APIClient().get(SHOW_SESSION_URL, **header)
+        )
+        self.client.force_authenticate(self.user)
+        self.assertNotIn(
+            "X-Profile-Id", self.client.get(SHOW_SESSION_URL, **header)
+        )
+        self.assertNotIn(
+            "X-Profile-Id",
+            client.get(SHOW_SESSION_URL, {"_profile": token["token"]})
+        )
+
+        self.admin.is_staff = False
+        self.admin.save()
+        self.assertNotIn(
+            "X-Profile-Id", client.get(SHOW_SESSION_URL, **header)
+        )
+
+    def test_only_staff_get_tokens_and_profiles(self):
+        self.client.force_authenticate(self.user)
+
+        res = self.client.post(reverse("planetarium:profile-token"))
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        res = self.client.get(reverse("planetarium:profile-list"))
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_sampled_profiles_are_kept_in_a_bounded_ring(self):
+        with self.settings(
+                PLANETARIUM_PROFILING={
+                    "DIRECTORY": self.directory.name,
+                    "MAX_PROFILES": 2,
+                    "SAMPLE_RATE": 1.0,
+                }
+        ):
+            self.client.force_authenticate(self.user)
+            profile_ids = [
+                self.client.get(SHOW_SESSION_URL)["X-Profile-Id"]
+                for _ in range(3)
+            ]
+
+        self.client.force_authenticate(self.admin)
+        profiles = self.client.get(reverse("planetarium:profile-list")).data
+        self.assertEqual(
+            [profile["id"] for profile in profiles],
+            list(reversed(profile_ids[1:]))
+        )
+        self.assertEqual(len(os.listdir(self.directory.name)), 4)
+        res = self.client.get(
+            reverse("planetarium:profile-detail", args=[profile_ids[0]])
+        )
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SlowQueryCaptureTest(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com", "password"
+        )
+        self.client.force_authenticate(self.user)
+        sample_show_session(astronomy_show=sample_astronomy_show())
+
+    def test_view_queries_are_recorded_once_per_shape(self):
+        with self.settings(PLANETARIUM_SLOW_QUERIES={"THRESHOLD_MS": 0}):
+            self.client.get(SHOW_SESSION_URL)
+            recorded = SlowQuery.objects.count()
+            self.client.get(SHOW_SESSION_URL)
+
+        self.assertTrue(recorded)
+        self.assertEqual(SlowQuery.objects.count(), recorded)
+        slow_query = SlowQuery.objects.get(
+            sql__contains="planetarium_showsession"
+        )
+        self.assertEqual(slow_query.view, "showsession-list")
+        self.assertEqual(slow_query.count, 2)
+        self.assertTrue(slow_query.explain)
+        self.assertNotIn("EXPLAIN failed", slow_query.explain)
+        self.assertIn("planetarium/views.py", slow_query.stack)
+
+    def test_fast_queries_and_other_apps_are_ignored(self):
+        self.client.get(SHOW_SESSION_URL)
+        with self.settings(PLANETARIUM_SLOW_QUERIES={"THRESHOLD_MS": 0}):
+            self.client.get(reverse("user:manage"))
+
+        self.assertFalse(SlowQuery.objects.exists())
+
+    def test_fingerprint_ignores_literals_and_list_lengths(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s) AND x = 'a'"),
+            fingerprint("SELECT * FROM t WHERE id IN (%s) AND x = 'b'"),
+        )
+        self.assertNotEqual(
+            fingerprint("SELECT * FROM t WHERE id = %s"),
+            fingerprint("SELECT * FROM u WHERE id = %s"),
+        )
+
+
+class FastSerializationTest(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com", "password"
+        )
+        self.client.force_authenticate(self.user)
+        stars = ShowTheme.objects.create(name="Stars")
+        planets = ShowTheme.objects.create(name="Planets \u2028 & moons")
+        shows = [
+            sample_astronomy_show(title="Zodiac"),
+            sample_astronomy_show(
+                title="Ünïcode \u2029 sky", description="Nebula <b>"
+            ),
+            sample_astronomy_show(title="Black holes"),
+        ]
+        shows[0].show_theme.add(planets, stars)
+        shows[1].show_theme.add(stars)
+        shows[2].image = "uploads/astronomizes/black-holes.jpg"
+        shows[2].image_variants = {
+            "thumbnail": {
+                "jpeg": "uploads/astronomizes/variants/black-holes.jpg",
+            },
+        }
+        shows[2].save()
+        dome = PlanetariumDome.objects.create(
+            name="Grand", rows=3, seats_in_row=4
+        )
+        for index in range(5):
+            sample_show_session(
+                astronomy_show=shows[index % 3],
+                planetarium_dome=dome,
+                show_time=timezone.now().replace(microsecond=index * 1000)
+                + timedelta(days=index),
+            )
+        hold_seats(
+            ShowSession.objects.first().id,
+            self.user,
+            [{"row": 1, "seat": 1}, {"row": 1, "seat": 2}]
+        )
+
+    def get(self, fast, url, params=None):
+        get_response_cache().clear()
+        with self.settings(PLANETARIUM_FAST_SERIALIZATION=fast):
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res
+
+    def assert_same_bytes(self, url, params=None):
+        slow = self.get(False, url, params)
+        fast = self.get(True, url, params)
+        self.assertEqual(fast.content, slow.content)
+        return json.loads(fast.content)
+
+    def test_show_session_pages_match_the_serializer(self):
+        url = SHOW_SESSION_URL + "?page_size=2"
+        pages = 0
+        while url:
+            page = self.assert_same_bytes(url)
+            url = page["next"]
+            pages += 1
+
+        self.assertEqual(pages, 3)
+
+    def test_astronomy_show_lists_match_the_serializer(self):
+        theme_id = ShowTheme.objects.get(name="Stars").id
+        for params in (
+                None,
+                {"title": "sky"},
+                {"show_theme": str(theme_id)},
+                {"search": "black"},
+        ):
+            with self.subTest(params):
+                self.assert_same_bytes(PLANETARIUM_URL, params)
+
+        shows = self.assert_same_bytes(PLANETARIUM_URL)
+        self.assertEqual(
+            shows[0]["image"],
+            "http://testserver/media/uploads/astronomizes/black-holes.jpg"
+        )
+
+    def test_unsupported_serializers_are_not_compiled(self):
+        self.assertIsNone(
+            get_compiled_serializer(AstronomyShowDetailSerializer)
+        )
+        self.assertIsNotNone(
+            get_compiled_serializer(AstronomyShowListSerializer)
+        )
+        compiled = get_compiled_serializer(ShowSessionListSerializer)
+        self.assertEqual(
+            compiled.fetch,
+            ["id", "show_time", "astronomy_show__title",
+             "astronomy_show__image", "astronomy_show__image_variants",
+             "planetarium_dome__name"]
+        )
+
+
+class FastJSONRendererTest(TestCase):
+    def test_output_matches_the_drf_renderer(self):
+        data = {
+            "text": 'line\u2028paragraph\u2029 \x00\x1f\t"ünï/\\',
+            "moment": timezone.now().replace(microsecond=123456),
+            "naive": datetime(2024, 1, 2, 3, 4, 5),
+            "day": date(2024, 1, 2),
+            "duration": timedelta(minutes=90),
+            "price": Decimal("10.50"),
+            "uuid": uuid.UUID(int=1),
+            "lazy": gettext_lazy("Not found."),
+            "error": ErrorDetail("Invalid", code="invalid"),
+            "numbers": (1, -2, 3.5, 10 ** 18, True, None),
+            7: OrderedDict([("nested", [{}, []])]),
+        }
+
+        self.assertEqual(
+            FastJSONRenderer().render(data), JSONRenderer().render(data)
+        )
+        self.assertEqual(
+            FastJSONRenderer().render(data, "application/json; indent=4"),
+            JSONRenderer().render(data, "application/json; indent=4"),
+        )
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+
+
+class QueryPlanningTest(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com", "password"
+        )
+        self.client.force_authenticate(self.user)
+        stars = ShowTheme.objects.create(name="Stars")
+        for index in range(3):
+            astronomy_show = sample_astronomy_show(title=f"Show {index}")
+            astronomy_show.show_theme.add(stars)
+            show_session = sample_show_session(astronomy_show=astronomy_show)
+            reservation = Reservation.objects.create(user=self.user)
+            for seat in range(1, 3):
+                Ticket.objects.create(
+                    row=1,
+                    seat=seat + index * 2,
+                    show_session=show_session,
+                    reservation=reservation,
+                )
+
+    def get(self, planned, url):
+        get_response_cache().clear()
+        with self.settings(
+                PLANETARIUM_QUERY_PLANNING=planned,
+                PLANETARIUM_FAST_SERIALIZATION=False,
+        ), CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res, [query["sql"] for query in queries.captured_queries]
+
+    def test_plan_follows_nested_serializers(self):
+        plan = get_query_plan(ReservationListSerializer)
+        tickets = plan.prefetch["tickets"]
+
+        self.assertEqual(plan.fields, {"id", "created_at"})
+        self.assertEqual(plan.select, set())
+        self.assertEqual(list(plan.prefetch), ["tickets"])
+        self.assertEqual(
+            tickets.select,
+            {
+                "show_session",
+                "show_session__astronomy_show",
+                "show_session__planetarium_dome",
+            }
+        )
+        self.assertIn("reservation", tickets.fields)
+        self.assertIn("show_session__tickets_sold", tickets.fields)
+        self.assertIn("show_session__astronomy_show__image", tickets.fields)
+        self.assertNotIn(
+            "show_session__astronomy_show__description", tickets.fields
+        )
+        self.assertIsNone(get_query_plan(SeatMapSerializer))
+
+    def test_list_only_loads_serialized_columns(self):
+        planned, queries = self.get(True, PLANETARIUM_URL)
+        unplanned, _ = self.get(False, PLANETARIUM_URL)
+
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn("description", queries[0])
+        self.assertIn("description", self.get(True, detail_url(
+            AstronomyShow.objects.first().id
+        ))[1][0])
+        self.assertEqual(planned.content, unplanned.content)
+
+    def test_reservation_list_prefetches_nested_tickets(self):
+        planned, queries = self.get(True, RESERVATION_URL)
+        unplanned, _ = self.get(False, RESERVATION_URL)
+
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn("description", queries[1])
+        self.assertEqual(planned.content, unplanned.content)
+        self.assertEqual(len(planned.data["results"]), 3)
+
+    def test_writes_load_every_column(self):
+        plan = get_query_plan(ReservationListSerializer)
+        queryset = plan.apply(Reservation.objects.all(), defer=False)
+
+        self.assertEqual(queryset.query.deferred_loading, (frozenset(), True))
+        self.assertFalse(
+            plan.apply(Reservation.objects.all()).query.deferred_loading[1]
+        )
+
+
+@override_settings(
+    PLANETARIUM_IMAGE_VARIANTS={
+        "SIZES": {"thumbnail": 32, "medium": 64},
+        "WORKERS": 0,
+    }
+)
+class ImageVariantTest(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_superuser(
+            "admin@planetarium.com",
+            "admin-password",
+        )
+        self.client.force_authenticate(self.user)
+        self.astronomy_show = sample_astronomy_show()
+        sample_show_session(astronomy_show=self.astronomy_show)
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = self.settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def upload(self, size=(200, 100), mode="RGB"):
+        with tempfile.NamedTemporaryFile(suffix=".png") as ntf:
+            Image.new(mode, size).save(ntf, format="PNG")
+            ntf.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(
+                    image_upload_url(self.astronomy_show.id),
+                    {"image": ntf},
+                    format="multipart",
+                )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.astronomy_show.refresh_from_db()
+        return res
+
+    def test_upload_renders_variants_after_responding(self):
+        res = self.upload()
+        variants = self.astronomy_show.image_variants
+
+        self.assertEqual(res.data["image_variants"], {})
+        self.assertEqual(set(variants), {"thumbnail", "medium"})
+        self.assertLessEqual({"jpeg", "webp"}, set(variants["thumbnail"]))
+        for variant, width in (("thumbnail", 32), ("medium", 64)):
+            for name in variants[variant].values():
+                with default_storage.open(name) as image:
+                    self.assertEqual(
+                        Image.open(image).size, (width, width // 2)
+                    )
+
+    def test_lists_expose_thumbnail_and_detail_every_variant(self):
+        self.upload(mode="RGBA")
+        thumbnail = {
+            image_format: f"http://testserver{default_storage.url(name)}"
+            for image_format, name in
+            self.astronomy_show.image_variants["thumbnail"].items()
+        }
+
+        shows = self.client.get(PLANETARIUM_URL)
+        sessions = self.client.get(SHOW_SESSION_URL)
+        detail = self.client.get(detail_url(self.astronomy_show.id))
+
+        self.assertEqual(shows.data[0]["image_thumbnail"], thumbnail)
+        self.assertEqual(
+            sessions.data["results"][0]["astronomy_show_thumbnail"],
+            thumbnail
+        )
+        self.assertEqual(detail.data["image_variants"]["thumbnail"], thumbnail)
+        self.assertIn("medium", detail.data["image_variants"])
+        self.assertTrue(detail.data["image"].endswith(".png"))
+
+    def test_thumbnail_is_null_until_rendered(self):
+        self.assertIsNone(
+            self.client.get(PLANETARIUM_URL).data[0]["image_thumbnail"]
+        )
+
+    def test_new_upload_replaces_variants(self):
+        self.upload()
+        stale = self.astronomy_show.image_variants
+        self.upload()
+
+        for formats in stale.values():
+            for name in formats.values():
+                self.assertFalse(default_storage.exists(name))
+        self.assertNotEqual(self.astronomy_show.image_variants, stale)
+
+    def test_small_images_are_not_scaled_up(self):
+        rendered = render_variants(
+            self.png((10, 10)), {"thumbnail": 32}, ("jpeg",), 80
+        )
+
+        self.assertEqual(
+            Image.open(BytesIO(rendered["thumbnail"]["jpeg"])).size,
+            (10, 10)
+        )
+
+    def test_variants_render_in_worker_processes(self):
+        with self.settings(PLANETARIUM_IMAGE_VARIANTS={"WORKERS": 1}):
+            rendered = get_image_executors()[1].submit(
+                render_variants,
+                self.png((100, 50)),
+                {"thumbnail": 20},
+                ("webp",),
+                80,
+            ).result()
+
+        self.assertEqual(
+            Image.open(BytesIO(rendered["thumbnail"]["webp"])).size,
+            (20, 10)
+        )
+
+    def test_command_renders_missing_variants(self):
+        self.upload()
+        AstronomyShow.objects.update(image_variants={})
+
+        call_command("generate_image_variants", stdout=StringIO())
+
+        self.astronomy_show.refresh_from_db()
+        self.assertIn("thumbnail", self.astronomy_show.image_variants)
+
+    @staticmethod
+    def png(size):
+        output = BytesIO()
+        Image.new("RGB", size).save(output, format="PNG")
+        return output.getvalue()
+
+
+class MediaServingTest(TestCase):
+    hashed_name = (
+        "uploads/astronomizes/moon - 0b6a7d1e-4c2f-4a8e-9d3b-1f2e3d4c5b6a.jpg"
+    )
+
+    def setUp(self) -> None:
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = self.settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        os.makedirs(os.path.join(media_root, "uploads/astronomizes"))
+        for name in (self.hashed_name, "poster.jpg"):
+            with open(os.path.join(media_root, name), "wb") as file:
+                file.write(b"0123456789")
+
+    def get(self, name, **headers):
+        return self.client.get(f"/media/{name}", **headers)
+
+    def test_hashed_names_are_served_immutable(self):
+        res = self.get(self.hashed_name)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(res.streaming_content), b"0123456789")
+        self.assertEqual(res["Content-Type"], "image/jpeg")
+        self.assertEqual(res["Accept-Ranges"], "bytes")
+        self.assertIn("immutable", res["Cache-Control"])
+        self.assertIn("max-age=31536000", res["Cache-Control"])
+
+        res = self.get("poster.jpg")
+        self.assertNotIn("immutable", res["Cache-Control"])
+        self.assertIn("max-age=3600", res["Cache-Control"])
+
+    def test_byte_ranges(self):
+        for header, content, content_range in (
+                ("bytes=2-5", b"2345", "bytes 2-5/10"),
+                ("bytes=7-", b"789", "bytes 7-9/10"),
+                ("bytes=-3", b"789", "bytes 7-9/10"),
+                ("bytes=8-100", b"89", "bytes 8-9/10"),
+        ):
+            with self.subTest(header=header):
+                res = self.get(self.hashed_name, HTTP_RANGE=header)
+
+                self.assertEqual(res.status_code, 206)
+                self.assertEqual(b"".join(res.streaming_content), content)
+                self.assertEqual(res["Content-Range"], content_range)
+                self.assertEqual(res["Content-Length"], str(len(content)))
+
+    def test_unusable_ranges(self):
+        res = self.get(self.hashed_name, HTTP_RANGE="bytes=10-")
+        self.assertEqual(res.status_code, 416)
+        self.assertEqual(res["Content-Range"], "bytes */10")
+
+        for headers in (
+                {"HTTP_RANGE": "bytes=0-1,4-5"},
+                {"HTTP_RANGE": "bytes=0-1", "HTTP_IF_RANGE": '"stale"'},
+        ):
+            with self.subTest(headers=headers):
+                res = self.get(self.hashed_name, **headers)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertEqual(
+                    b"".join(res.streaming_content), b"0123456789"
+                )
+
+        etag = self.get(self.hashed_name)["ETag"]
+        res = self.get(
+            self.hashed_name, HTTP_RANGE="bytes=0-1", HTTP_IF_RANGE=etag
+        )
+        self.assertEqual(res.status_code, 206)
+
+    def test_conditional_requests(self):
+        etag = self.get(self.hashed_name)["ETag"]
+
+        res = self.get(self.hashed_name, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIn("immutable", res["Cache-Control"])
+
+    def test_only_regular_files_under_media_root(self):
+        for name in ("../etc/passwd", "uploads/astronomizes", "missing.jpg"):
+            with self.subTest(name=name):
+                self.assertEqual(
+                    self.get(name).status_code, status.HTTP_404_NOT_FOUND
+                )
+        self.assertEqual(
+            self.client.post("/media/poster.jpg").status_code,
+            status.HTTP_405_METHOD_NOT_ALLOWED
+        )
+
+    def test_proxy_backends(self):
+        with self.settings(PLANETARIUM_MEDIA={"BACKEND": "x-accel"}):
+            res = self.get(self.hashed_name)
+        self.assertEqual(
+            res["X-Accel-Redirect"],
+            "/protected-media/uploads/astronomizes/"
+            "moon%20-%200b6a7d1e-4c2f-4a8e-9d3b-1f2e3d4c5b6a.jpg"
+        )
+        self.assertEqual(res.content, b"")
+        self.assertIn("immutable", res["Cache-Control"])
+
+        with self.settings(PLANETARIUM_MEDIA={"BACKEND": "x-sendfile"}):
+            res = self.get("poster.jpg")
+        self.assertEqual(
+            res["X-Sendfile"],
+            os.path.join(default_storage.location, "poster.jpg")
+        )
+
+    def test_file_range_keeps_the_descriptor(self):
+        with open(default_storage.path("poster.jpg"), "rb") as file:
+            file_range = FileRange(file, 3, 4)
+
+            self.assertEqual(file_range.fileno(), file.fileno())
+            self.assertEqual(os.lseek(file.fileno(), 0, os.SEEK_CUR), 3)
+            self.assertEqual(file_range.read(3), b"345")
+            self.assertEqual(file_range.read(), b"6")
+            self.assertEqual(file_range.read(), b"")
+
+
+class TicketExportTest(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_superuser(
+            "admin@planetarium.com",
+            "admin-password",
+        )
+        self.client.force_authenticate(self.user)
+        self.moon = sample_astronomy_show(title='Moon, "full"')
+        self.sun = sample_astronomy_show(title="Sun")
+        self.sessions = [
+            sample_show_session(
+                astronomy_show=self.moon, show_time="2024-11-01 12:00:00"
+            ),
+            sample_show_session(
+                astronomy_show=self.sun, show_time="2024-11-03 18:30:00"
+            ),
+        ]
+        reservation = Reservation.objects.create(user=self.user)
+        for index, show_session in enumerate(self.sessions * 3):
+            Ticket.objects.create(
+                row=1,
+                seat=index + 1,
+                show_session=show_session,
+                reservation=reservation,
+            )
+
+    def export(self, export_format, params=None):
+        url = reverse("planetarium:ticket-export", args=[export_format])
+        res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        return b"".join(res.streaming_content).decode(), res
+
+    def test_csv_export(self):
+        content, res = self.export("csv")
+        rows = list(csv.DictReader(StringIO(content)))
+
+        self.assertEqual(res["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn("attachment", res["Content-Disposition"])
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(
+            list(rows[0]), [column for column, _ in TICKET_COLUMNS]
+        )
+        self.assertEqual(rows[0]["astronomy_show_title"], 'Moon, "full"')
+        self.assertEqual(rows[0]["show_time"], "2024-11-01 12:00:00")
+        self.assertEqual(rows[0]["user_email"], "admin@planetarium.com")
+        self.assertEqual(
+            [int(row["ticket_id"]) for row in rows],
+            sorted(Ticket.objects.values_list("id", flat=True))
+        )
+
+    def test_ndjson_export(self):
+        content, res = self.export("ndjson")
+        rows = [json.loads(line) for line in content.splitlines()]
+
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[1]["astronomy_show_title"], "Sun")
+        self.assertEqual(rows[1]["show_time"], "2024-11-03T18:30:00")
+        self.assertEqual(rows[1]["seat"], 2)
+
+    def test_filters(self):
+        for params, count in (
+                ({"date_from": "2024-11-02"}, 3),
+                ({"date_to": "2024-11-01"}, 3),
+                ({"date_from": "2024-11-01", "date_to": "2024-11-03"}, 6),
+                ({"astronomy_show": self.sun.id}, 3),
+                ({"show_session": self.sessions[0].id}, 3),
+                ({"reserved_to": "2000-01-01"}, 0),
+        ):
+            with self.subTest(params=params):
+                content, _ = self.export("ndjson", params)
+                self.assertEqual(len(content.splitlines()), count)
+
+        url = reverse("planetarium:ticket-export", args=["csv"])
+        for params in ({"date_from": "01.11.2024"}, {"show_session": "x"}):
+            with self.subTest(params=params):
+                res = self.client.get(url, params)
+                self.assertEqual(
+                    res.status_code, status.HTTP_400_BAD_REQUEST
+                )
+
+    def test_empty_csv_export_has_header(self):
+        content, _ = self.export("csv", {"reserved_to": "2000-01-01"})
+
+        self.assertEqual(
+            content.strip(), ",".join(column for column, _ in TICKET_COLUMNS)
+        )
+
+    def test_rows_are_streamed_in_chunks(self):
+        with self.settings(PLANETARIUM_EXPORT={"CHUNK_SIZE": 4}):
+            url = reverse("planetarium:ticket-export", args=["ndjson"])
+            res = self.client.get(url)
+            with self.assertNumQueries(1):
+                chunks = list(res.streaming_content)
+
+        self.assertEqual(
+            [chunk.count(b"\n") for chunk in chunks], [4, 2]
+        )
+        self.assertEqual(
+            len(list(csv_chunks(iter([(1,)] * 5), chunk_size=2))), 3
+        )
+
+    def test_staff_only_and_known_formats(self):
+        url = reverse("planetarium:ticket-export", args=["xlsx"])
+        self.assertEqual(
+            self.client.get(url).status_code, status.HTTP_404_NOT_FOUND
+        )
+        self.client.force_authenticate(
+            get_user_model().objects.create_user("test@test.com", "password")
+        )
+        url = reverse("planetarium:ticket-export", args=["csv"])
+        self.assertEqual(
+            self.client.get(url).status_code, status.HTTP_403_FORBIDDEN
+        )
+
+
+SCHEDULE_IMPORT_URL = reverse("planetarium:showsession-import")
+
+
+class ScheduleImportTest(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_superuser(
+            "admin@planetarium.com",
+            "admin-password",
+        )
+        self.client.force_authenticate(self.user)
+        self.moon = sample_astronomy_show(title="Moon")
+        self.sun = sample_astronomy_show(title="Sun")
+        self.dome = PlanetariumDome.objects.create(
+            name="Grand", rows=10, seats_in_row=10
+        )
+        self.existing = ShowSession.objects.create(
+            astronomy_show=self.moon,
+            planetarium_dome=self.dome,
+            show_time=datetime(2025, 1, 1, 10),
+        )
+
+    def post(self, sessions, **params):
+        return self.client.post(
+            SCHEDULE_IMPORT_URL,
+            {"sessions": sessions, **params},
+            format="json",
+        )
+
+    def sessions(self, count, day=2):
+        return [
+            {
+                "show_time": f"2025-01-{day:02d}T{hour % 24:02d}:00:00",
+                "astronomy_show": self.sun.id if hour % 2 else "Moon",
+                "planetarium_dome": "Grand",
+            }
+            for hour in range(count)
+        ]
+
+    def test_import_creates_sessions(self):
+        res = self.post(self.sessions(3))
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data, {"created": 3, "errors": []})
+        self.assertEqual(
+            list(
+                ShowSession.objects.filter(
+                    show_time__date=date(2025, 1, 2)
+                ).order_by("show_time").values_list(
+                    "astronomy_show__title", flat=True
+                )
+            ),
+            ["Moon", "Sun", "Moon"]
+        )
+
+    def test_queries_do_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as few:
+            self.post(self.sessions(3, day=2))
+        with CaptureQueriesContext(connection) as many:
+            self.post(self.sessions(24, day=3))
+
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(ShowSession.objects.count(), 28)
+
+    def test_rows_are_validated_together(self):
+        PlanetariumDome.objects.create(name="Twin", rows=5, seats_in_row=5)
+        PlanetariumDome.objects.create(name="Twin", rows=5, seats_in_row=5)
+        sessions = [
+            {"show_time": "2025-01-02T10:00", "astronomy_show": "Moon",
+             "planetarium_dome": self.dome.id},
+            {"show_time": "2025-01-02 10:00", "astronomy_show": "Sun",
+             "planetarium_dome": "Grand"},
+            {"show_time": "2025-01-01T10:00:00", "astronomy_show": "Sun",
+             "planetarium_dome": "Grand"},
+            {"show_time": "tomorrow", "astronomy_show": "Comets",
+             "planetarium_dome": "Twin"},
+            {"astronomy_show": 0},
+        ]
+
+        res = self.post(sessions)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["created"], 0)
+        errors = {
+            error["row"]: error["errors"] for error in res.data["errors"]
+        }
+        self.assertEqual(set(errors), {2, 3, 4, 5})
+        self.assertEqual(errors[2], {"show_time": ["Duplicate of row 1."]})
+        self.assertIn("already has a session", errors[3]["show_time"][0])
+        self.assertEqual(set(errors[4]), {"show_time"})
+        self.assertEqual(
+            errors[5],
+            {
+                "show_time": ["This field is required."],
+                "planetarium_dome": ["This field is required."],
+            }
+        )
+        self.assertEqual(ShowSession.objects.count(), 1)
+
+        res = self.post([
+            {"show_time": "2025-01-05T10:00", "astronomy_show": "Comets",
+             "planetarium_dome": "Twin"}
+        ])
+        self.assertEqual(
+            res.data["errors"][0]["errors"],
+            {
+                "astronomy_show": ["No astronomy show Comets."],
+                "planetarium_dome": [
+                    "More than one planetarium dome is named Twin; "
+                    "use its id."
+                ],
+            }
+        )
+
+    def test_partial_and_dry_run(self):
+        sessions = self.sessions(2) + [
+            {"show_time": "2025-01-02T00:00", "astronomy_show": "Moon",
+             "planetarium_dome": "Grand"}
+        ]
+
+        res = self.post(sessions, dry_run=True, partial=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["created"], 2)
+        self.assertEqual(ShowSession.objects.count(), 1)
+
+        res = self.post(sessions, partial=True)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["created"], 2)
+        self.assertEqual(res.data["errors"][0]["row"], 3)
+        self.assertEqual(ShowSession.objects.count(), 3)
+
+    def test_duplicates_are_found_across_batches(self):
+        sessions = self.sessions(3) + self.sessions(1)
+
+        result = ScheduleImport(batch_size=2).run(sessions).result
+
+        self.assertEqual(result["created"], 0)
+        self.assertEqual(
+            result["errors"],
+            [{"row": 4, "errors": {"show_time": ["Duplicate of row 1."]}}]
+        )
+
+    def reject_overlaps_in_database(self):
+        """Make the database reject overlaps as the constraint does."""
+        if connection.vendor == "postgresql":
+            return
+        if connection.vendor != "sqlite":
+            self.skipTest("needs the overlap constraint")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                CREATE TEMP TRIGGER {OVERLAP_CONSTRAINT}
+                BEFORE INSERT ON planetarium_showsession
+                WHEN EXISTS (
+                    SELECT 1 FROM planetarium_showsession AS session
+                    WHERE session.planetarium_dome_id
+                        = NEW.planetarium_dome_id
+                    AND session.show_time < NEW.ends_at
+                    AND session.ends_at > NEW.show_time
+                )
+                BEGIN SELECT RAISE(ABORT, '{OVERLAP_CONSTRAINT}'); END
+                """
+            )
+        self.addCleanup(
+            connection.cursor().execute,
+            f"DROP TRIGGER IF EXISTS {OVERLAP_CONSTRAINT}",
+        )
+
+    def test_slot_taken_after_the_check_is_a_row_error(self):
+        class StaleScheduleImport(ScheduleImport):
+            # as if the existing session was created after the first check
+            checked = False
+
+            def taken_sessions(self, resolved, durations):
+                if self.checked:
+                    return super().taken_sessions(resolved, durations)
+                self.checked = True
+                return IntervalIndex()
+
+        self.reject_overlaps_in_database()
+        sessions = [
+            {"show_time": "2025-01-01T12:00", "astronomy_show": "Sun",
+             "planetarium_dome": "Grand"},
+            {"show_time": "2025-01-01T10:30", "astronomy_show": "Sun",
+             "planetarium_dome": "Grand"},
+        ]
+        overlap_error = {
+            "row": 2, "errors": {"show_time": [OVERLAP_MESSAGE]}
+        }
+
+        result = StaleScheduleImport().run(sessions).result
+        self.assertEqual(result, {"created": 0, "errors": [overlap_error]})
+        self.assertEqual(ShowSession.objects.count(), 1)
+
+        result = StaleScheduleImport(partial=True).run(sessions).result
+        self.assertEqual(result, {"created": 1, "errors": [overlap_error]})
+        self.assertEqual(ShowSession.objects.count(), 2)
+
+    def test_csv_upload(self):
+        content = (
+            "show_time,astronomy_show,planetarium_dome\n"
+            f"2025-02-01 18:00,Sun,{self.dome.id}\n"
+            "2025-02-01 20:00,Moon,Grand\n"
+        )
+        with tempfile.NamedTemporaryFile(suffix=".csv") as ntf:
+            ntf.write(content.encode())
+            ntf.seek(0)
+            res = self.client.post(
+                SCHEDULE_IMPORT_URL, {"file": ntf}, format="multipart"
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["created"], 2)
+
+        with tempfile.NamedTemporaryFile(suffix=".xml") as ntf:
+            res = self.client.post(
+                SCHEDULE_IMPORT_URL, {"file": ntf}, format="multipart"
+            )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("file", res.data)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(
+            get_user_model().objects.create_user("test@test.com", "password")
+        )
+
+        res = self.post(self.sessions(1))
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_import_schedule_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as ntf:
+            json.dump(self.sessions(5), ntf)
+            ntf.flush()
+            out = StringIO()
+            call_command("import_schedule", ntf.name, stdout=out)
+            self.assertIn("Created 5 show sessions", out.getvalue())
+
+            err = StringIO()
+            with self.assertRaises(CommandError):
+                call_command(
+                    "import_schedule", ntf.name, stdout=out, stderr=err
+                )
+        self.assertIn(
+            "row 1: show_time: Planetarium dome already has a session",
+            err.getvalue()
+        )
+        self.assertEqual(ShowSession.objects.count(), 6)
+
+
+class ScheduleOverlapTest(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_superuser(
+            "admin@planetarium.com",
+            "admin-password",
+        )
+        self.client.force_authenticate(self.user)
+        self.moon = sample_astronomy_show(title="Moon", duration=90)
+        self.sun = sample_astronomy_show(title="Sun", duration=30)
+        self.dome = PlanetariumDome.objects.create(
+            name="Grand", rows=10, seats_in_row=10
+        )
+        self.existing = ShowSession.objects.create(
+            astronomy_show=self.moon,
+            planetarium_dome=self.dome,
+            show_time=datetime(2025, 1, 1, 10),
+        )
+
+    def post_session(self, show_time, astronomy_show=None, dome=None):
+        return self.client.post(
+            SHOW_SESSION_URL,
+            {
+                "show_time": show_time,
+                "astronomy_show": (astronomy_show or self.sun).id,
+                "planetarium_dome": (dome or self.dome).id,
+            },
+        )
+
+    def test_ends_at_follows_show_duration(self):
+        self.assertEqual(self.existing.ends_at, datetime(2025, 1, 1, 11, 30))
+
+        self.existing.show_time = datetime(2025, 1, 1, 12)
+        self.existing.save(update_fields=["show_time"])
+        self.existing.refresh_from_db()
+
+        self.assertEqual(self.existing.ends_at, datetime(2025, 1, 1, 13, 30))
+
+    def test_overlapping_session_rejected(self):
+        for show_time in ("2025-01-01T09:45:00", "2025-01-01T11:00:00"):
+            res = self.post_session(show_time)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("already has a session", res.data["show_time"][0])
+
+    def test_adjacent_and_other_dome_sessions_allowed(self):
+        other_dome = PlanetariumDome.objects.create(
+            name="Small", rows=5, seats_in_row=5
+        )
+
+        before = self.post_session("2025-01-01T09:30:00")
+        after = self.post_session("2025-01-01T11:30:00")
+        elsewhere = self.post_session("2025-01-01T10:00:00", dome=other_dome)
+
+        for res in (before, after, elsewhere):
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(after.data["ends_at"], "2025-01-01T12:00:00")
+
+    def test_update_ignores_the_session_itself(self):
+        url = reverse(
+            "planetarium:showsession-detail", args=[self.existing.id]
+        )
+
+        res = self.client.patch(url, {"show_time": "2025-01-01T10:30:00"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["ends_at"], "2025-01-01T12:00:00")
+
+    def test_import_rejects_overlaps(self):
+        res = self.client.post(
+            SCHEDULE_IMPORT_URL,
+            {
+                "sessions": [
+                    {"show_time": "2025-01-01T11:00", "astronomy_show": "Sun",
+                     "planetarium_dome": "Grand"},
+                    {"show_time": "2025-01-01T12:00", "astronomy_show": "Moon",
+                     "planetarium_dome": "Grand"},
+                    {"show_time": "2025-01-01T13:00", "astronomy_show": "Sun",
+                     "planetarium_dome": "Grand"},
+                    {"show_time": "2025-01-01T13:30", "astronomy_show": "Sun",
+                     "planetarium_dome": "Grand"},
+                ],
+                "partial": True,
+            },
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["created"], 2)
+        self.assertEqual(
+            res.data["errors"],
+            [
+                {"row": 1, "errors": {"show_time": [
+                    "Planetarium dome already has a session at this time."
+                ]}},
+                {"row": 3, "errors": {"show_time": [
+                    "Overlaps the session of row 2."
+                ]}},
+            ]
+        )
+
+    def test_constraint_violation_is_reported_as_overlap(self):
+        with self.assertRaises(ValidationError) as context:
+            with overlap_constraint_errors():
+                raise IntegrityError(
+                    f"conflicting key value violates exclusion constraint "
+                    f'"{OVERLAP_CONSTRAINT}"'
+                )
+        self.assertEqual(
+            context.exception.detail,
+            {"show_time": [ErrorDetail(OVERLAP_MESSAGE, code="invalid")]}
+        )
+        with self.assertRaises(IntegrityError):
+            with overlap_constraint_errors():
+                raise IntegrityError("duplicate key value")
+
+    def test_interval_index(self):
+        index = IntervalIndex()
+        index.add(1, datetime(2025, 1, 1, 8), datetime(2025, 1, 1, 20), "day")
+        index.add(1, datetime(2025, 1, 1, 10), datetime(2025, 1, 1, 11), "a")
+        index.add(1, datetime(2025, 1, 1, 11), datetime(2025, 1, 1, 12), "b")
+        index.add(2, datetime(2025, 1, 1, 10), datetime(2025, 1, 1, 11), "c")
+
+        self.assertEqual(len(index), 4)
+        self.assertEqual(
+            sorted(index.overlapping(
+                1, datetime(2025, 1, 1, 10, 30), datetime(2025, 1, 1, 11, 30)
+            )),
+            ["a", "b", "day"]
+        )
+        self.assertEqual(
+            index.overlapping(
+                1, datetime(2025, 1, 1, 20), datetime(2025, 1, 1, 21)
+            ),
+            []
+        )
+        self.assertEqual(
+            index.overlapping(
+                3, datetime(2025, 1, 1, 10), datetime(2025, 1, 1, 11)
+            ),
+            []
+        )
+
+    def test_check_schedule_command(self):
+        if connection.vendor == "postgresql":
+            self.skipTest("the exclusion constraint rejects overlaps")
+        # bulk_create skips the serializer's validation
+        clash = ShowSession.objects.bulk_create([
+            ShowSession(
+                astronomy_show=self.sun,
+                planetarium_dome=self.dome,
+                show_time=datetime(2025, 1, 1, 11),
+                ends_at=datetime(2025, 1, 1, 11, 30),
+            )
+        ])[0]
+        out = StringIO()
+
+        call_command("check_schedule", stdout=out)
+        with self.assertRaises(CommandError):
+            call_command("check_schedule", "--install", stdout=StringIO())
+
+        self.assertIn(
+            f"Show sessions {self.existing.id} and {clash.id} overlap",
+            out.getvalue()
+        )
+        self.assertIn("1 overlap(s)", out.getvalue())
+
+
+class BestAvailableSeatsTest(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "password",
+        )
+        self.client.force_authenticate(self.user)
+        self.show_session = sample_show_session(
+            astronomy_show=sample_astronomy_show(),
+            planetarium_dome=PlanetariumDome.objects.create(
+                name="Small", rows=5, seats_in_row=8
+            ),
+        )
+        self.url = best_available_url(self.show_session.id)
+
+    def book(self, *places):
+        reservation = Reservation.objects.create(user=self.user)
+        for row, seat in places:
+            Ticket.objects.create(
+                row=row,
+                seat=seat,
+                show_session=self.show_session,
+                reservation=reservation,
+            )
+
+    def test_best_block(self):
+        seat_map = SeatMap(5, 8)
+        seat_map.mark_many([(3, 4), (3, 5), (2, 1)])
+
+        self.assertEqual(seat_map.best_block(2), (2, 4))
+        self.assertEqual(seat_map.best_block(3, rows=(3, 3)), (3, 1))
+        self.assertEqual(seat_map.best_block(8), (4, 1))
+        self.assertEqual(seat_map.best_block(2, centre=False), (1, 1))
+        self.assertEqual(
+            seat_map.best_block(2, rows=(2, None), centre=False), (2, 2)
+        )
+        self.assertIsNone(seat_map.best_block(9))
+
+    def test_returns_centre_block_without_holding(self):
+        self.book((3, 3), (3, 4), (3, 5))
+
+        res = self.client.post(self.url, {"party_size": 4})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data["seats"],
+            [{"row": 2, "seat": seat} for seat in range(3, 7)]
+        )
+        self.assertIsNone(res.data["hold"])
+        self.assertFalse(SeatHold.objects.exists())
+
+    def test_row_range_and_front_preference(self):
+        res = self.client.post(
+            self.url,
+            {"party_size": 2, "row_from": 4, "centre": False},
+        )
+
+        self.assertEqual(
+            res.data["seats"],
+            [{"row": 4, "seat": 1}, {"row": 4, "seat": 2}]
+        )
+
+    def test_hold_chosen_seats(self):
+        with self.assertNumQueries(8):
+            res = self.client.post(self.url, {"party_size": 3, "hold": True})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        seat_hold = SeatHold.objects.get(pk=res.data["hold"]["id"])
+        self.assertEqual(seat_hold.held_places, res.data["seats"])
+        self.assertEqual(res.data["hold"]["seats"], res.data["seats"])
+
+        again = self.client.post(self.url, {"party_size": 3, "hold": True})
+
+        self.assertEqual(again.status_code, status.HTTP_201_CREATED)
+        self.assertNotEqual(again.data["seats"], res.data["seats"])
+
+    def test_no_block_available(self):
+        self.book(*((row, 4) for row in range(1, 6)))
+
+        res = self.client.post(self.url, {"party_size": 5, "hold": True})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("No 5 adjacent seats", res.data["party_size"][0])
+        self.assertFalse(SeatHold.objects.exists())
+
+    def test_invalid_preferences(self):
+        for payload in (
+                {"party_size": 0},
+                {"party_size": 51},
+                {"party_size": 2, "row_from": 4, "row_to": 2},
+        ):
+            res = self.client.post(self.url, payload)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AnalyticsTest(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_superuser(
+            "admin@planetarium.com",
+            "admin-password",
+        )
+        self.client.force_authenticate(self.user)
+        self.stars = ShowTheme.objects.create(name="Stars")
+        self.planets = ShowTheme.objects.create(name="Planets")
+        self.moon = sample_astronomy_show(title="Moon")
+        self.moon.show_theme.add(self.stars)
+        self.mars = sample_astronomy_show(title="Mars")
+        self.mars.show_theme.add(self.stars, self.planets)
+        self.big = PlanetariumDome.objects.create(
+            name="Big", rows=5, seats_in_row=8
+        )
+        self.small = PlanetariumDome.objects.create(
+            name="Small", rows=4, seats_in_row=5
+        )
+        self.start = datetime.combine(
+            timezone.now().date() + timedelta(days=10), datetime.min.time()
+        ).replace(hour=12)
+        self.first = ShowSession.objects.create(
+            astronomy_show=self.moon,
+            planetarium_dome=self.big,
+            show_time=self.start,
+        )
+        self.second = ShowSession.objects.create(
+            astronomy_show=self.mars,
+            planetarium_dome=self.big,
+            show_time=self.start + timedelta(hours=3),
+        )
+        self.third = ShowSession.objects.create(
+            astronomy_show=self.mars,
+            planetarium_dome=self.small,
+            show_time=self.start + timedelta(days=1),
+        )
+
+    def reserve(self, show_session, *places):
+        res = self.client.post(
+            RESERVATION_URL,
+            {
+                "tickets": [
+                    {"row": row, "seat": seat, "show_session": show_session.id}
+                    for row, seat in places
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res.data["id"]
+
+    @staticmethod
+    def rollups():
+        rollups = {
+            model.__name__: sorted(
+                model.objects.exclude(sessions=0).values_list(
+                    f"{field}_id", "day", "sessions", "seats", "tickets_sold"
+                )
+            )
+            for model, field, _ in ROLLUPS.values()
+        }
+        rollups["ShowSellThrough"] = sorted(
+            ShowSellThrough.objects.exclude(tickets_sold=0).values_list(
+                "astronomy_show_id", "days_before", "tickets_sold"
+            )
+        )
+        return rollups
+
+    def assertMatchesRebuild(self):
+        incremental = self.rollups()
+        rebuild_rollups()
+        self.assertEqual(incremental, self.rollups())
+
+    def test_sales_update_rollups(self):
+        self.reserve(self.first, (1, 1), (1, 2), (1, 3))
+        Ticket.objects.create(
+            row=1,
+            seat=1,
+            show_session=self.second,
+            reservation=Reservation.objects.create(user=self.user),
+        )
+        day = self.start.date()
+
+        self.assertEqual(
+            ShowDailySales.objects.filter(
+                astronomy_show=self.moon, day=day
+            ).values_list("sessions", "seats", "tickets_sold").get(),
+            (1, 40, 3)
+        )
+        self.assertEqual(
+            ThemeDailySales.objects.filter(
+                show_theme=self.stars, day=day
+            ).values_list("sessions", "seats", "tickets_sold").get(),
+            (2, 80, 4)
+        )
+        self.assertEqual(
+            DomeDailySales.objects.filter(
+                planetarium_dome=self.big, day=day
+            ).values_list("sessions", "seats", "tickets_sold").get(),
+            (2, 80, 4)
+        )
+        self.assertEqual(
+            ShowSellThrough.objects.get(
+                astronomy_show=self.moon
+            ).days_before,
+            10
+        )
+        self.assertMatchesRebuild()
+
+    def test_schedule_and_catalog_changes_match_rebuild(self):
+        reservation_id = self.reserve(self.first, (1, 1), (1, 2))
+        self.reserve(self.first, (2, 1))
+        self.reserve(self.third, (1, 1), (1, 2))
+        Reservation.objects.get(pk=reservation_id).delete()
+
+        res = self.client.patch(
+            reverse("planetarium:showsession-detail", args=[self.first.id]),
+            {
+                "show_time": self.start + timedelta(days=1, hours=3),
+                "planetarium_dome": self.small.id,
+            },
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.second.delete()
+        self.client.post(
+            SHOW_SESSION_URL,
+            {
+                "show_time": self.start + timedelta(days=2),
+                "astronomy_show": self.moon.id,
+                "planetarium_dome": self.big.id,
+            },
+        )
+        self.moon.show_theme.add(self.planets)
+        self.mars.show_theme.remove(self.stars)
+        self.small.rows = 6
+        self.small.save()
+
+        self.assertMatchesRebuild()
+
+    @override_settings(PLANETARIUM_ANALYTICS={"ENABLED": False})
+    def test_rebuild_command_catches_up(self):
+        self.reserve(self.first, (1, 1))
+
+        self.assertFalse(ShowSellThrough.objects.exists())
+        call_command("rebuild_analytics", stdout=StringIO())
+
+        self.assertEqual(
+            ShowSellThrough.objects.values_list(
+                "astronomy_show_id", "tickets_sold"
+            ).get(),
+            (self.moon.id, 1)
+        )
+        self.assertEqual(ShowDailySales.objects.count(), 3)
+
+    def test_fill_rate_and_top_shows(self):
+        rebuild_rollups()
+        self.reserve(self.first, *((1, seat) for seat in range(1, 5)))
+        self.reserve(self.third, *((1, seat) for seat in range(1, 6)))
+
+        res = self.client.get(
+            reverse("planetarium:analytics-fill-rate"),
+            {"group_by": "dome"},
+        )
+        self.assertEqual(
+            [
+                (row["name"], row["seats"], row["fill_rate"])
+                for row in res.data
+            ],
+            [("Big", 80, 0.05), ("Small", 20, 0.25)]
+        )
+
+        res = self.client.get(
+            reverse("planetarium:analytics-fill-rate"),
+            {"group_by": "theme", "by_day": "true",
+             "date_from": str(self.start.date() + timedelta(days=1))},
+        )
+        self.assertEqual(
+            [(row["name"], row["tickets_sold"]) for row in res.data],
+            [("Planets", 5), ("Stars", 5)]
+        )
+
+        res = self.client.get(
+            reverse("planetarium:analytics-top-shows"),
+            {"order": "fill_rate", "limit": 1},
+        )
+        self.assertEqual(
+            [(row["name"], row["sessions"]) for row in res.data],
+            [("Moon", 1)]
+        )
+
+    def test_sell_through_curve(self):
+        self.reserve(self.first, (1, 1), (1, 2))
+        self.reserve(self.second, (1, 1))
+
+        res = self.client.get(
+            reverse("planetarium:analytics-sell-through"),
+            {"astronomy_show": f"{self.moon.id}"},
+        )
+
+        self.assertEqual(res.data["seats"], 40)
+        self.assertEqual(
+            res.data["curve"],
+            [{
+                "days_before": 10,
+                "tickets_sold": 2,
+                "cumulative_tickets_sold": 2,
+                "sell_through": 0.05,
+            }]
+        )
+
+    def test_staff_only_and_invalid_params(self):
+        for params in (
+                {"group_by": "planet"},
+                {"date_from": "01.10.2024"},
+        ):
+            res = self.client.get(
+                reverse("planetarium:analytics-fill-rate"), params
+            )
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.get(
+            reverse("planetarium:analytics-top-shows"), {"limit": "0"}
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(
+            get_user_model().objects.create_user("test@test.com", "password")
+        )
+        res = self.client.get(reverse("planetarium:analytics-sell-through"))
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
@@ -6,7 +6,12 @@ from planetarium.views import (
     AstronomyShowViewSet,
     ShowSessionViewSet,
     PlanetariumDomeViewSet,
-    ReservationViewSet
+    ReservationViewSet,
+    SeatHoldViewSet,
+    ProfileViewSet,
+    AnalyticsViewSet,
+    MetricsView,
+    TicketExportView
 )
 
 router = routers.DefaultRouter()
@@ -17,7 +22,18 @@ router.register("astronomy_show", AstronomyShowViewSet)
 router.register("show_session", ShowSessionViewSet)
 router.register("planetarium_dome", PlanetariumDomeViewSet)
 router.register("reservation", ReservationViewSet)
+router.register("seat_hold", SeatHoldViewSet)
+router.register("profiles", ProfileViewSet, basename="profile")
+router.register("analytics", AnalyticsViewSet, basename="analytics")
 
-urlpatterns = [path("", include(router.urls))]
+urlpatterns = [
+    path("metrics/", MetricsView.as_view(), name="metrics"),
+    path(
+        "exports/tickets.<str:export_format>",
+        TicketExportView.as_view(),
+        name="ticket-export",
+    ),
+    path("", include(router.urls)),
+]
 
 app_name = "planetarium"
@@ -1,23 +1,52 @@
-from datetime import datetime
+import os
+import time
+from datetime import datetime, timedelta
 
-from django.db.models import F, Count
+from django.db import transaction
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet
 
+from planetarium import analytics
+from planetarium.cache import (
+    CachedListModelMixin,
+    CachedRetrieveModelMixin,
+    expiry_watermark,
+)
+from planetarium.conditional import ConditionalGetMixin
+from planetarium.exports import EXPORT_FORMATS, ticket_rows
+from planetarium.fast_serializers import FastListModelMixin
+from planetarium.holds import (
+    best_available_places,
+    hold_best_available,
+    hold_expiry_name,
+)
+from planetarium.images import enqueue_image_variants
+from planetarium.metrics import CONTENT_TYPE, get_metrics_registry
 from planetarium.models import (
     PlanetariumDome,
     ShowTheme,
     AstronomyShow,
     ShowSession,
     Reservation,
+    SeatHold,
+    Ticket,
+)
+from planetarium.pagination import (
+    ReservationPagination,
+    ShowSessionPagination,
 )
 from planetarium.permissions import IsAdminOrAuthenticatedReadOnly
+from planetarium.profiling import get_profile_store, issue_profile_token
+from planetarium.query_planning import QueryPlanMixin
 
 from planetarium.serializers import (
     PlanetariumDomeSerializer,
@@ -30,11 +59,35 @@ from planetarium.serializers import (
     ShowSessionListSerializer,
     ShowSessionDetailSerializer,
     ReservationSerializer,
-    ReservationListSerializer
+    ReservationListSerializer,
+    SeatHoldSerializer,
+    SeatMapSerializer,
+    ProfileSummarySerializer,
+    ProfileSerializer,
+    ProfileTokenSerializer,
+    ScheduleImportSerializer,
+    ScheduleImportResultSerializer,
+    BestAvailableSerializer,
+    BestAvailableResultSerializer,
+    FillRateSerializer,
+    SellThroughSerializer
 )
+from planetarium.schedule_import import (
+    ScheduleImportError,
+    import_schedule,
+    read_schedule,
+)
+from planetarium.scheduling import overlap_constraint_errors
+from planetarium.search import search_astronomy_shows
+from planetarium.seat_map import SeatMap
+
+
+HOLD_ETAG_SECONDS = 5
 
 
 class ShowThemeViewSet(
+    ConditionalGetMixin,
+    CachedListModelMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     GenericViewSet
@@ -42,9 +95,13 @@ class ShowThemeViewSet(
     queryset = ShowTheme.objects.all()
     serializer_class = ShowThemeSerializer
     permission_classes = (IsAdminOrAuthenticatedReadOnly,)
+    cache_models = (ShowTheme,)
+    etag_models = (ShowTheme,)
 
 
 class PlanetariumDomeViewSet(
+    ConditionalGetMixin,
+    CachedListModelMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     GenericViewSet
@@ -52,17 +109,26 @@ class PlanetariumDomeViewSet(
     queryset = PlanetariumDome.objects.all()
     serializer_class = PlanetariumDomeSerializer
     permission_classes = (IsAdminOrAuthenticatedReadOnly,)
+    cache_models = (PlanetariumDome,)
+    etag_models = (PlanetariumDome,)
 
 
 class AstronomyShowViewSet(
+    ConditionalGetMixin,
+    CachedListModelMixin,
+    CachedRetrieveModelMixin,
+    FastListModelMixin,
+    QueryPlanMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     GenericViewSet
 ):
-    queryset = AstronomyShow.objects.prefetch_related("show_theme")
+    queryset = AstronomyShow.objects.all()
     serializer_class = AstronomyShowSerializer
     permission_classes = (IsAdminOrAuthenticatedReadOnly,)
+    cache_models = (AstronomyShow, ShowTheme)
+    etag_models = (AstronomyShow, ShowTheme)
 
     @staticmethod
     def _params_to_ints(qs):
@@ -71,13 +137,16 @@ class AstronomyShowViewSet(
     def get_queryset(self):
         title = self.request.query_params.get("title")
         show_theme = self.request.query_params.get("show_theme")
-        queryset = self.queryset
+        search = self.request.query_params.get("search")
+        queryset = super().get_queryset()
 
         if title:
             queryset = queryset.filter(title__icontains=title)
         if show_theme:
             show_theme_ids = self._params_to_ints(show_theme)
             queryset = queryset.filter(show_theme__id__in=show_theme_ids)
+        if search:
+            queryset = search_astronomy_shows(queryset, search)
 
         return queryset.distinct()
 
@@ -98,10 +167,14 @@ class AstronomyShowViewSet(
     )
     def upload_image(self, request, pk=None):
         astronomy_show = self.get_object()
+        stale_variants = astronomy_show.image_variants
         serializer = self.get_serializer(astronomy_show, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
+            # variants are rendered in the background; until then the
+            # lists fall back to no thumbnail
+            serializer.save(image_variants={})
+            enqueue_image_variants(serializer.instance, stale_variants)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -123,38 +196,121 @@ class AstronomyShowViewSet(
                         "(ex. ?title=fiction)"
                 )
             ),
+            OpenApiParameter(
+                "search",
+                type=OpenApiTypes.STR,
+                description=(
+                        "Full-text search over title, show themes and "
+                        "description, best matches first; words match "
+                        "as prefixes (ex. ?search=black hol)"
+                )
+            ),
         ]
     )
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
 
-class ShowSessionViewSet(viewsets.ModelViewSet):
-    queryset = (
-        ShowSession.objects.all().select_related(
-            "astronomy_show", "planetarium_dome"
-        ).annotate(
-            tickets_available=(
-                    F("planetarium_dome__rows")
-                    * F("planetarium_dome__seats_in_row")
-                    - Count("ticket")
-            )
-        )
-    )
+class ShowSessionViewSet(
+    ConditionalGetMixin,
+    FastListModelMixin,
+    QueryPlanMixin,
+    viewsets.ModelViewSet
+):
+    # seat_map reads the dome outside of any serializer
+    queryset = ShowSession.objects.select_related("planetarium_dome")
     serializer_class = ShowSessionSerializer
+    pagination_class = ShowSessionPagination
     permission_classes = (IsAdminOrAuthenticatedReadOnly,)
 
+    def get_etag_targets(self):
+        if self.detail:
+            return [
+                ShowSession,
+                AstronomyShow,
+                ShowTheme,
+                PlanetariumDome,
+                (ShowSession, self.kwargs[self.lookup_field]),
+            ]
+        return [ShowSession, AstronomyShow, PlanetariumDome, Ticket, SeatHold]
+
+    def get_etag_parts(self, request):
+        parts = super().get_etag_parts(request)
+        if request.query_params.get("upcoming"):
+            parts.append(timezone.now().strftime("%Y-%m-%dT%H:%M"))
+        # seat holds expire without any write, so while one may still be
+        # active the tag also rolls over every few seconds
+        held_until = expiry_watermark(
+            hold_expiry_name(
+                self.kwargs[self.lookup_field] if self.detail else None
+            )
+        )
+        now = time.time()
+        if held_until and now < held_until + HOLD_ETAG_SECONDS:
+            parts.append(str(int(now // HOLD_ETAG_SECONDS)))
+        return parts
+
+    @staticmethod
+    def _param_to_date(param_name, value):
+        try:
+            return datetime.strptime(value, "%Y-%m-%d")
+        except ValueError:
+            raise ValidationError(
+                {param_name: "Date must be in YYYY-MM-DD format"}
+            )
+
+    @staticmethod
+    def _param_to_int(param_name, value):
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({param_name: "Must be an integer"})
+
     def get_queryset(self):
         date = self.request.query_params.get("date")
+        date_from = self.request.query_params.get("date_from")
+        date_to = self.request.query_params.get("date_to")
+        upcoming = self.request.query_params.get("upcoming")
         astronomy_show_id_str = self.request.query_params.get("astronomy_show")
-        queryset = self.queryset
+        planetarium_dome_id_str = self.request.query_params.get(
+            "planetarium_dome"
+        )
+        # annotated per request: the subquery compares holds with the
+        # current time
+        queryset = super().get_queryset().annotate(
+            seats_held=ShowSession.seats_held_subquery()
+        )
 
         if date:
-            date = datetime.strptime(date, "%Y-%m-%d").date()
-            queryset = queryset.filter(show_time__date=date)
+            day_start = self._param_to_date("date", date)
+            queryset = queryset.filter(
+                show_time__gte=day_start,
+                show_time__lt=day_start + timedelta(days=1),
+            )
+        if date_from:
+            queryset = queryset.filter(
+                show_time__gte=self._param_to_date("date_from", date_from)
+            )
+        if date_to:
+            queryset = queryset.filter(
+                show_time__lt=(
+                    self._param_to_date("date_to", date_to)
+                    + timedelta(days=1)
+                )
+            )
+        if upcoming and upcoming.lower() in ("1", "true", "yes"):
+            queryset = queryset.filter(show_time__gte=timezone.now())
         if astronomy_show_id_str:
             queryset = queryset.filter(
-                astronomy_show_id=int(astronomy_show_id_str)
+                astronomy_show_id=self._param_to_int(
+                    "astronomy_show", astronomy_show_id_str
+                )
+            )
+        if planetarium_dome_id_str:
+            queryset = queryset.filter(
+                planetarium_dome_id=self._param_to_int(
+                    "planetarium_dome", planetarium_dome_id_str
+                )
             )
         return queryset
 
@@ -163,8 +319,110 @@ class ShowSessionViewSet(viewsets.ModelViewSet):
             return ShowSessionListSerializer
         if self.action == "retrieve":
             return ShowSessionDetailSerializer
+        if self.action == "seat_map":
+            return SeatMapSerializer
+        if self.action == "import_schedule":
+            return ScheduleImportSerializer
+        if self.action == "best_available":
+            return BestAvailableSerializer
         return ShowSessionSerializer
 
+    def perform_create(self, serializer):
+        with overlap_constraint_errors():
+            serializer.save()
+
+    def perform_update(self, serializer):
+        with overlap_constraint_errors():
+            serializer.save()
+
+    @action(
+        methods=["GET"],
+        detail=True,
+        url_path="seat-map",
+    )
+    def seat_map(self, request, pk=None):
+        show_session = self.get_object()
+        serializer = self.get_serializer(
+            SeatMap.for_show_session(show_session)
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @extend_schema(responses=BestAvailableResultSerializer)
+    @action(
+        methods=["POST"],
+        detail=True,
+        url_path="best-available",
+        url_name="best-available",
+        permission_classes=[IsAuthenticated],
+    )
+    def best_available(self, request, pk=None):
+        """Best block of adjacent free seats for a party, optionally held."""
+        show_session = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        rows = (data.get("row_from"), data.get("row_to"))
+        if data["hold"]:
+            seat_hold = hold_best_available(
+                show_session.id,
+                request.user,
+                data["party_size"],
+                rows,
+                data["centre"],
+            )
+            result = {"seats": seat_hold.held_places, "hold": seat_hold}
+            response_status = status.HTTP_201_CREATED
+        else:
+            result = {
+                "seats": best_available_places(
+                    SeatMap.for_show_session(show_session),
+                    data["party_size"],
+                    rows,
+                    data["centre"],
+                ),
+                "hold": None,
+            }
+            response_status = status.HTTP_200_OK
+        return Response(
+            BestAvailableResultSerializer(result).data,
+            status=response_status
+        )
+
+    @extend_schema(responses=ScheduleImportResultSerializer)
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="import",
+        url_name="import",
+        permission_classes=[IsAdminUser],
+    )
+    def import_schedule(self, request):
+        """Create many sessions at once, reporting errors per row."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        rows = data.get("sessions")
+        if rows is None:
+            upload = data["file"]
+            file_format = os.path.splitext(upload.name)[1].lstrip(".")
+            try:
+                rows = read_schedule(upload.file, file_format.lower())
+            except ScheduleImportError as error:
+                raise ValidationError({"file": [str(error)]})
+        result = import_schedule(
+            rows, partial=data["partial"], dry_run=data["dry_run"]
+        )
+        if result["errors"] and not result["created"]:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif data["dry_run"]:
+            response_status = status.HTTP_200_OK
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response(
+            ScheduleImportResultSerializer(result).data,
+            status=response_status
+        )
+
     @extend_schema(
         parameters=[
             OpenApiParameter(
@@ -183,32 +441,68 @@ class ShowSessionViewSet(viewsets.ModelViewSet):
                         "(ex. ?date=2022-10-23)"
                 ),
             ),
+            OpenApiParameter(
+                "date_from",
+                type=OpenApiTypes.DATE,
+                description=(
+                        "Sessions on or after this date "
+                        "(ex. ?date_from=2022-10-01)"
+                ),
+            ),
+            OpenApiParameter(
+                "date_to",
+                type=OpenApiTypes.DATE,
+                description=(
+                        "Sessions on or before this date "
+                        "(ex. ?date_to=2022-10-31)"
+                ),
+            ),
+            OpenApiParameter(
+                "planetarium_dome",
+                type=OpenApiTypes.INT,
+                description=(
+                        "Filter by planetarium dome id "
+                        "(ex. ?planetarium_dome=3)"
+                ),
+            ),
+            OpenApiParameter(
+                "upcoming",
+                type=OpenApiTypes.BOOL,
+                description=(
+                        "Only sessions that have not started yet "
+                        "(ex. ?upcoming=true)"
+                ),
+            ),
         ]
     )
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
 
-class ReservationPagination(PageNumberPagination):
-    page_size = 10
-    max_page_size = 100
-
-
 class ReservationViewSet(
+    ConditionalGetMixin,
+    QueryPlanMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     GenericViewSet
 ):
-    queryset = Reservation.objects.prefetch_related(
-        "ticket_set__show_session__astronomy_show",
-        "ticket_set__show_session__planetarium_dome"
-    )
+    queryset = Reservation.objects.all()
     serializer_class = ReservationSerializer
     pagination_class = ReservationPagination
     permission_classes = (IsAuthenticated,)
+    etag_models = (
+        Reservation,
+        Ticket,
+        ShowSession,
+        AstronomyShow,
+        PlanetariumDome,
+    )
+
+    def get_etag_parts(self, request):
+        return super().get_etag_parts(request) + [str(request.user.pk)]
 
     def get_queryset(self):
-        return Reservation.objects.filter(user=self.request.user)
+        return super().get_queryset().filter(user=self.request.user)
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -217,3 +511,351 @@ class ReservationViewSet(
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+
+
+class SeatHoldViewSet(
+    QueryPlanMixin,
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    GenericViewSet
+):
+    # confirm reads the held places through ReservationSerializer
+    queryset = SeatHold.objects.select_related(
+        "show_session__planetarium_dome"
+    )
+    serializer_class = SeatHoldSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return super().get_queryset().filter(
+            user=self.request.user,
+            expires_at__gt=timezone.now()
+        )
+
+    def get_serializer_class(self):
+        if self.action == "confirm":
+            return ReservationSerializer
+        return SeatHoldSerializer
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    @extend_schema(request=None, responses=ReservationSerializer)
+    @action(methods=["POST"], detail=True)
+    def confirm(self, request, pk=None):
+        with transaction.atomic():
+            seat_hold = self.get_object()
+            tickets = [
+                {
+                    "row": place["row"],
+                    "seat": place["seat"],
+                    "show_session": seat_hold.show_session_id
+                }
+                for place in seat_hold.held_places
+            ]
+            seat_hold.delete()
+            serializer = self.get_serializer(data={"tickets": tickets})
+            serializer.is_valid(raise_exception=True)
+            serializer.save(user=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class TicketExportView(APIView):
+    """Every matching ticket with its reservation and show session."""
+
+    permission_classes = (IsAdminUser,)
+    # one export streams for minutes and finance pulls several in a row
+    throttle_classes = ()
+
+    @staticmethod
+    def _date_param(params, name):
+        value = params.get(name)
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, "%Y-%m-%d")
+        except ValueError:
+            raise ValidationError({name: "Date must be in YYYY-MM-DD format"})
+
+    @staticmethod
+    def _int_param(params, name):
+        value = params.get(name)
+        if not value:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({name: "Must be an integer"})
+
+    def get_queryset(self):
+        params = self.request.query_params
+        queryset = Ticket.objects.all()
+        for name, lookup in (
+                ("date_from", "show_session__show_time__gte"),
+                ("reserved_from", "reservation__created_at__gte"),
+        ):
+            value = self._date_param(params, name)
+            if value is not None:
+                queryset = queryset.filter(**{lookup: value})
+        for name, lookup in (
+                ("date_to", "show_session__show_time__lt"),
+                ("reserved_to", "reservation__created_at__lt"),
+        ):
+            value = self._date_param(params, name)
+            if value is not None:
+                queryset = queryset.filter(
+                    **{lookup: value + timedelta(days=1)}
+                )
+        for name, lookup in (
+                ("show_session", "show_session_id"),
+                ("astronomy_show", "show_session__astronomy_show_id"),
+                ("planetarium_dome", "show_session__planetarium_dome_id"),
+        ):
+            value = self._int_param(params, name)
+            if value is not None:
+                queryset = queryset.filter(**{lookup: value})
+        return queryset
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "export_format",
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.PATH,
+                enum=list(EXPORT_FORMATS),
+            ),
+            *[
+                OpenApiParameter(
+                    name,
+                    type=OpenApiTypes.DATE,
+                    description=description,
+                )
+                for name, description in (
+                    ("date_from", "Sessions on or after this date"),
+                    ("date_to", "Sessions on or before this date"),
+                    ("reserved_from", "Reserved on or after this date"),
+                    ("reserved_to", "Reserved on or before this date"),
+                )
+            ],
+            *[
+                OpenApiParameter(name, type=OpenApiTypes.INT)
+                for name in (
+                    "show_session", "astronomy_show", "planetarium_dome"
+                )
+            ],
+        ],
+        responses={
+            (200, "text/csv"): OpenApiTypes.STR,
+            (200, "application/x-ndjson"): OpenApiTypes.STR,
+        },
+    )
+    def get(self, request, export_format):
+        try:
+            chunks, content_type = EXPORT_FORMATS[export_format]
+        except KeyError:
+            raise NotFound(f"Unknown export format {export_format}")
+        rows = ticket_rows(self.get_queryset())
+        response = StreamingHttpResponse(
+            chunks(rows), content_type=content_type
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="tickets-'
+            f'{timezone.now():%Y%m%d-%H%M%S}.{export_format}"'
+        )
+        return response
+
+
+class MetricsView(APIView):
+    permission_classes = (IsAdminUser,)
+    # scraped every few seconds, which the user throttle would block
+    throttle_classes = ()
+
+    @extend_schema(responses={(200, "text/plain"): OpenApiTypes.STR})
+    def get(self, request):
+        return HttpResponse(
+            get_metrics_registry().render(), content_type=CONTENT_TYPE
+        )
+
+
+ANALYTICS_DATE_PARAMETERS = [
+    OpenApiParameter(
+        "date_from",
+        type=OpenApiTypes.DATE,
+        description="Sessions on or after this date",
+    ),
+    OpenApiParameter(
+        "date_to",
+        type=OpenApiTypes.DATE,
+        description="Sessions on or before this date",
+    ),
+]
+TOP_SHOWS_ORDERS = ("tickets_sold", "fill_rate")
+
+
+class AnalyticsViewSet(viewsets.ViewSet):
+    """Occupancy figures read from the sales rollups."""
+
+    permission_classes = (IsAdminUser,)
+
+    @staticmethod
+    def _date_param(params, name):
+        value = params.get(name)
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, "%Y-%m-%d").date()
+        except ValueError:
+            raise ValidationError(
+                {name: ["Date must be in YYYY-MM-DD format"]}
+            )
+
+    @staticmethod
+    def _choice_param(params, name, choices, default):
+        value = params.get(name) or default
+        if value not in choices:
+            raise ValidationError(
+                {name: [f"Must be one of {', '.join(choices)}"]}
+            )
+        return value
+
+    def _dates(self):
+        params = self.request.query_params
+        return (
+            self._date_param(params, "date_from"),
+            self._date_param(params, "date_to"),
+        )
+
+    @extend_schema(
+        parameters=[
+            *ANALYTICS_DATE_PARAMETERS,
+            OpenApiParameter(
+                "group_by",
+                type=OpenApiTypes.STR,
+                enum=list(analytics.ROLLUPS),
+                description="Totals per show (default), dome or theme",
+            ),
+            OpenApiParameter(
+                "by_day",
+                type=OpenApiTypes.BOOL,
+                description="One row per day of each group (ex. ?by_day=true)",
+            ),
+        ],
+        responses=FillRateSerializer(many=True),
+    )
+    @action(methods=["GET"], detail=False, url_path="fill-rate")
+    def fill_rate(self, request):
+        params = request.query_params
+        group_by = self._choice_param(
+            params, "group_by", analytics.ROLLUPS, "show"
+        )
+        rows = analytics.fill_rates(
+            group_by,
+            *self._dates(),
+            by_day=params.get("by_day") in ("true", "1"),
+        )
+        return Response(FillRateSerializer(rows, many=True).data)
+
+    @extend_schema(
+        parameters=[
+            *ANALYTICS_DATE_PARAMETERS,
+            OpenApiParameter(
+                "order",
+                type=OpenApiTypes.STR,
+                enum=list(TOP_SHOWS_ORDERS),
+                description="Rank by tickets sold (default) or fill rate",
+            ),
+            OpenApiParameter("limit", type=OpenApiTypes.INT),
+        ],
+        responses=FillRateSerializer(many=True),
+    )
+    @action(methods=["GET"], detail=False, url_path="top-shows")
+    def top_shows(self, request):
+        params = request.query_params
+        order = self._choice_param(
+            params, "order", TOP_SHOWS_ORDERS, "tickets_sold"
+        )
+        limit = params.get("limit")
+        if limit:
+            try:
+                limit = int(limit)
+            except ValueError:
+                raise ValidationError({"limit": ["Must be an integer"]})
+            if limit < 1:
+                raise ValidationError({"limit": ["Must be at least 1"]})
+        rows = analytics.top_shows(
+            *self._dates(), order=order, limit=limit or None
+        )
+        return Response(FillRateSerializer(rows, many=True).data)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "astronomy_show",
+                type=OpenApiTypes.STR,
+                description=(
+                        "Comma separated astronomy show ids, every show "
+                        "when left out (ex. ?astronomy_show=2,5)"
+                ),
+            ),
+        ],
+        responses=SellThroughSerializer,
+    )
+    @action(methods=["GET"], detail=False, url_path="sell-through")
+    def sell_through(self, request):
+        show_ids = request.query_params.get("astronomy_show")
+        if show_ids:
+            try:
+                show_ids = [int(pk) for pk in show_ids.split(",")]
+            except ValueError:
+                raise ValidationError(
+                    {"astronomy_show": ["Must be comma separated integers"]}
+                )
+        return Response(
+            SellThroughSerializer(
+                analytics.sell_through(show_ids or None)
+            ).data
+        )
+
+
+PROFILE_ID_PARAMETER = OpenApiParameter(
+    "id", OpenApiTypes.STR, OpenApiParameter.PATH
+)
+
+
+class ProfileViewSet(viewsets.ViewSet):
+    permission_classes = (IsAdminUser,)
+
+    @extend_schema(responses=ProfileSummarySerializer(many=True))
+    def list(self, request):
+        return Response(get_profile_store().list())
+
+    @extend_schema(
+        parameters=[PROFILE_ID_PARAMETER], responses=ProfileSerializer
+    )
+    def retrieve(self, request, pk=None):
+        try:
+            return Response(get_profile_store().get(pk))
+        except KeyError:
+            raise NotFound()
+
+    @extend_schema(
+        parameters=[PROFILE_ID_PARAMETER],
+        responses={(200, "application/octet-stream"): OpenApiTypes.BINARY}
+    )
+    @action(methods=["GET"], detail=True)
+    def download(self, request, pk=None):
+        try:
+            path = get_profile_store().path(pk, "prof")
+        except KeyError:
+            raise NotFound()
+        if not os.path.exists(path):
+            raise NotFound()
+        return FileResponse(
+            open(path, "rb"), as_attachment=True, filename=f"{pk}.prof"
+        )
+
+    @extend_schema(request=None, responses=ProfileTokenSerializer)
+    @action(methods=["POST"], detail=False)
+    def token(self, request):
+        return Response(issue_profile_token(request.user))
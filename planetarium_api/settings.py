@@ -51,11 +51,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "planetarium.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "planetarium.profiling.ProfilingMiddleware",
+    "planetarium.slow_queries.SlowQueryMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
@@ -97,6 +100,24 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+# the response cache keeps its model versions here, so every worker
+# process has to see the same cache once there is more than one
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["REDIS_URL"],
+    } if os.environ.get("REDIS_URL") else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# worker processes serving the API, as passed to gunicorn
+PLANETARIUM_WORKER_PROCESSES = int(os.environ.get("WEB_CONCURRENCY", 1))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -137,6 +158,13 @@ STATIC_URL = "static/"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = "/files/media/"
 
+# how MEDIA_URL is served: "django", or "x-accel" / "x-sendfile" when a
+# proxy with an internal location for MEDIA_ROOT sends the files
+PLANETARIUM_MEDIA = {
+    "BACKEND": os.environ.get("PLANETARIUM_MEDIA_BACKEND", "django"),
+    "ACCEL_PREFIX": "/protected-media/",
+}
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -145,6 +173,10 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_RENDERER_CLASSES": [
+        "planetarium.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
     "DEFAULT_THROTTLE_CLASSES": [
         "rest_framework.throttling.AnonRateThrottle",
         "rest_framework.throttling.UserRateThrottle",
@@ -155,6 +187,56 @@ REST_FRAMEWORK = {
     ),
 }
 
+PLANETARIUM_RESPONSE_CACHE = {
+    "BACKEND": "planetarium.cache.LocMemResponseCache",
+    "VERSION_CACHE": "default",
+    "OPTIONS": {"max_entries": 1000},
+}
+
+PLANETARIUM_SEAT_HOLD_TTL = timedelta(minutes=5)
+PLANETARIUM_SEAT_HOLD_MAX_SEATS = 50
+
+# list endpoints build rows from .values() instead of ModelSerializer
+# instances where their serializer allows it
+PLANETARIUM_FAST_SERIALIZATION = True
+
+# viewsets derive select_related/prefetch_related/only() from the
+# serializer of the current action
+PLANETARIUM_QUERY_PLANNING = True
+
+# resized JPEG/WebP/AVIF copies of uploaded show images, rendered in a
+# process pool after the upload request has returned
+PLANETARIUM_IMAGE_VARIANTS = {
+    "SIZES": {"thumbnail": 320, "medium": 960},
+    "WORKERS": int(os.environ.get("PLANETARIUM_IMAGE_WORKERS", 2)),
+}
+
+PLANETARIUM_BOOKING_ATTEMPTS = 5
+PLANETARIUM_BOOKING_BACKOFF = 0.02
+
+# per-process metrics files are summed from this directory when several
+# worker processes serve the API; those of exited workers are folded into
+# one total, so the directory must not be shared between hosts
+PLANETARIUM_METRICS = {
+    "DIRECTORY": os.environ.get("PLANETARIUM_METRICS_DIR"),
+    "FLUSH_INTERVAL": 5.0,
+}
+
+# staff opt in per request with a token from /api/planetarium/profiles/
+# token/; SAMPLE_RATE additionally profiles that share of all requests
+PLANETARIUM_PROFILING = {
+    "DIRECTORY": os.environ.get(
+        "PLANETARIUM_PROFILES_DIR", os.path.join(BASE_DIR, "profiles")
+    ),
+    "MAX_PROFILES": 50,
+    "SAMPLE_RATE": float(os.environ.get("PLANETARIUM_PROFILE_SAMPLE_RATE", 0)),
+}
+
+PLANETARIUM_SLOW_QUERIES = {
+    "THRESHOLD_MS": float(os.environ.get("PLANETARIUM_SLOW_QUERY_MS", 200)),
+    "ANALYZE": os.environ.get("PLANETARIUM_SLOW_QUERY_ANALYZE") == "True",
+}
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=15),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
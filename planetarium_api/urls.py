@@ -14,8 +14,6 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import (
@@ -24,6 +22,8 @@ from drf_spectacular.views import (
     SpectacularRedocView
 )
 
+from planetarium.media import media_urlpatterns
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path(
@@ -43,4 +43,4 @@ urlpatterns = [
     ),
     path("__debug__/", include("debug_toolbar.urls")),
 
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+] + media_urlpatterns()